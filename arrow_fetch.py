@@ -0,0 +1,200 @@
+"""
+Получение результатов аналитических запросов сразу в Arrow и NumPy
+
+Обычный путь (session.scalars(...).all()) создаёт объект Python на каждое
+значение каждой строки. Здесь запрос выполняется как
+COPY (SELECT ...) TO STDOUT в формате CSV, поток из psycopg2 через канал
+читается многопоточным парсером CSV pyarrow, и колонки сразу получают
+нативные типы по типам SQLAlchemy:
+- Integer / BigInteger / SmallInteger -> int32 / int64 / int16;
+- Numeric(p, s) -> decimal128(p, s), Float -> float64;
+- timestamptz -> timestamp[us, UTC] (сессия переводится в UTC на время COPY);
+- Boolean -> bool, Date -> date32;
+- строки -> словарные колонки (коды int32 + словарь).
+
+fetch_columns() превращает таблицу Arrow в columnar.Columns: словарные
+колонки становятся категориальными (коды + словарь), время - datetime64[us]
+в UTC, decimal - float64.
+
+Двоичный COPY (FORMAT binary) не используется: его поля переменной длины не
+разбираются векторно без собственного парсера на C, а CSV разбирает pyarrow.
+
+Запуск (сравнение с scalars().all()):
+    python arrow_fetch.py
+"""
+
+import os
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as csv
+from sqlalchemy import BigInteger, Boolean, Date, DateTime, Float, Integer, Numeric, SmallInteger, String, select
+from sqlalchemy.dialects import postgresql
+
+from columnar import Columns
+from database import Session, engine
+from models import Segments
+
+# Размер блока, который парсер CSV обрабатывает одним потоком
+BLOCK_SIZE = 8 << 20
+
+
+def arrow_type(sql_type):
+    """Тип Arrow для типа колонки SQLAlchemy"""
+    if isinstance(sql_type, SmallInteger):
+        return pa.int16()
+    if isinstance(sql_type, BigInteger):
+        return pa.int64()
+    if isinstance(sql_type, Integer):
+        return pa.int32()
+    if isinstance(sql_type, Float):
+        return pa.float64()
+    if isinstance(sql_type, Numeric):
+        if sql_type.precision is None:
+            return pa.float64()
+        return pa.decimal128(sql_type.precision, sql_type.scale or 0)
+    if isinstance(sql_type, DateTime):
+        return pa.timestamp("us", tz="UTC" if sql_type.timezone else None)
+    if isinstance(sql_type, Date):
+        return pa.date32()
+    if isinstance(sql_type, Boolean):
+        return pa.bool_()
+    if isinstance(sql_type, String):
+        return pa.dictionary(pa.int32(), pa.string())
+    # Прочие типы (interval, jsonb, массивы) остаются текстом
+    return pa.string()
+
+
+def result_schema(stmt):
+    """Схема Arrow результата запроса; выражения без метки получают имена col<номер>"""
+    fields = []
+    for i, (name, column) in enumerate(zip(stmt.selected_columns.keys(), stmt.selected_columns)):
+        if name.startswith("_no_label"):
+            name = f"col{i}"
+        fields.append(pa.field(name, arrow_type(column.type)))
+    return pa.schema(fields)
+
+
+def copy_sql(stmt, cursor):
+    """Текст COPY (SELECT ...) TO STDOUT с подставленными через драйвер параметрами"""
+    compiled = stmt.compile(dialect=postgresql.psycopg2.dialect(), compile_kwargs={"render_postcompile": True})
+    query = cursor.mogrify(str(compiled), compiled.params).decode()
+    return f"COPY ({query}) TO STDOUT WITH (FORMAT csv)"
+
+
+def _copy_to_pipe(cursor, sql, writer, errors):
+    try:
+        with os.fdopen(writer, "wb") as stream:
+            cursor.copy_expert(sql, stream)
+    except BaseException as e:
+        errors.append(e)
+
+
+def fetch_arrow(stmt, bind=engine):
+    """
+    Выполняет запрос через COPY и возвращает таблицу Arrow
+
+    Поток COPY передаётся парсеру через канал ОС, поэтому текст CSV целиком
+    в памяти не хранится.
+    """
+    schema = result_schema(stmt)
+    read_options = csv.ReadOptions(column_names=schema.names, block_size=BLOCK_SIZE)
+    convert_options = csv.ConvertOptions(
+        column_types=dict(zip(schema.names, schema.types)),
+        # В CSV PostgreSQL NULL - пустое поле без кавычек, пустая строка - ""
+        null_values=[""], strings_can_be_null=True, quoted_strings_can_be_null=False,
+        true_values=["t"], false_values=["f"],
+    )
+
+    with bind.connect() as connection:
+        # SET LOCAL действует до конца транзакции соединения
+        connection.exec_driver_sql("SET LOCAL TimeZone = 'UTC'")
+        connection.exec_driver_sql("SET LOCAL DateStyle = 'ISO'")
+        cursor = connection.connection.dbapi_connection.cursor()
+        try:
+            reader, writer = os.pipe()
+            errors = []
+            thread = threading.Thread(target=_copy_to_pipe, args=(cursor, copy_sql(stmt, cursor), writer, errors))
+            thread.start()
+            table = None
+            try:
+                with os.fdopen(reader, "rb") as stream:
+                    table = csv.read_csv(stream, read_options=read_options, convert_options=convert_options)
+            except pa.ArrowInvalid as e:
+                # Пустой результат COPY - пустой поток, который парсер CSV считает ошибкой
+                if "Empty CSV" not in str(e):
+                    raise
+            finally:
+                thread.join()
+        finally:
+            cursor.close()
+    if errors:
+        raise errors[0]
+    return table.cast(schema) if table is not None else schema.empty_table()
+
+
+def to_columns(table):
+    """Таблица Arrow -> columnar.Columns: коды категорий, datetime64 в UTC, float64 вместо decimal"""
+    arrays, categories = {}, {}
+    # Словари фрагментов объединяются, чтобы коды были общими для всей колонки
+    table = table.unify_dictionaries()
+    for name, column in zip(table.column_names, table.columns):
+        data_type = column.type
+        if pa.types.is_dictionary(data_type):
+            combined = column.combine_chunks()
+            arrays[name] = combined.indices.fill_null(-1).to_numpy(zero_copy_only=False).astype(np.int32)
+            categories[name] = combined.dictionary.to_pylist()
+        elif pa.types.is_decimal(data_type):
+            arrays[name] = pc.cast(column, pa.float64()).to_numpy()
+        elif pa.types.is_timestamp(data_type):
+            arrays[name] = column.cast(pa.timestamp(data_type.unit)).to_numpy()
+        else:
+            arrays[name] = column.to_numpy()
+    return Columns(arrays, categories)
+
+
+def fetch_columns(stmt, bind=engine):
+    """Выполняет запрос через COPY и возвращает колонки NumPy"""
+    return to_columns(fetch_arrow(stmt, bind))
+
+
+def _measure(fetch):
+    """Время и пиковая память: объекты Python (tracemalloc) плюс буферы Arrow"""
+    tracemalloc.start()
+    arrow_before = pa.total_allocated_bytes()
+    started = time.perf_counter()
+    result = fetch()
+    elapsed = time.perf_counter() - started
+    python_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, python_peak + pa.total_allocated_bytes() - arrow_before
+
+
+def main():
+    """Сравнение scalars().all() и COPY -> Arrow на таблице segments"""
+    try:
+        with Session() as session:
+            rows, orm_time, orm_memory = _measure(lambda: session.scalars(select(Segments)).all())
+        count = len(rows)
+        del rows
+
+        stmt = select(Segments.ticket_no, Segments.flight_id, Segments.fare_conditions, Segments.price)
+        table, arrow_time, arrow_memory = _measure(lambda: fetch_arrow(stmt))
+    except Exception as e:
+        print(f"Ошибка при выполнении запроса: {e}")
+        return
+
+    print(f"Сегментов: {count} / {table.num_rows}")
+    print(f"{'Способ':<20} {'Время, с':>10} {'Память, МБ':>12}")
+    print(f"{'scalars().all()':<20} {orm_time:>10.2f} {orm_memory / 2**20:>12.1f}")
+    print(f"{'COPY -> Arrow':<20} {arrow_time:>10.2f} {arrow_memory / 2**20:>12.1f}")
+    print(f"Ускорение: {orm_time / arrow_time:.1f}x, экономия памяти: {orm_memory / max(arrow_memory, 1):.1f}x")
+    print(f"\n{table.schema}")
+
+
+if __name__ == "__main__":
+    main()
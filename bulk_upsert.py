@@ -0,0 +1,311 @@
+"""
+Пакетная запись посадочных талонов и сегментов с исходом по каждой строке
+
+Запись по одной строке через ORM медленная, а при параллельной посадке
+нарушения boarding_passes_flight_id_seat_no_key и
+boarding_passes_flight_id_boarding_no_key прерывают всю транзакцию.
+bulk_upsert() записывает пачку (до сотен тысяч строк) в транзакции
+вызывающего:
+
+1. строки передаются одним COPY во временную таблицу-копию целевой;
+2. строки, которые нарушили бы ограничения таблицы, помечаются заранее -
+   проверки строятся по ограничениям модели, исход строки - имя ограничения:
+   сначала CHECK, внешние ключи и уникальные ключи с существующими строками
+   (каждая строка отдельно), затем уникальные ключи между строками пачки -
+   среди последних прошедших проверки строк каждого первичного ключа
+   записывается более ранняя;
+3. из прошедших все проверки строк с одним первичным ключом применяется
+   последняя, более ранние получают исход duplicate;
+4. остальные строки вливаются одним
+   INSERT ... ON CONFLICT (первичный ключ) DO UPDATE, строки без изменений не
+   перезаписываются; xmax = 0 в RETURNING отличает вставку от обновления.
+
+Исходы строк (в порядке входных строк): inserted, updated, unchanged,
+duplicate (строка прошла проверки, но применяется более поздняя строка с тем
+же первичным ключом) или имя нарушенного ограничения. Если последняя строка
+ключа отклонена, применяется предыдущая прошедшая проверки.
+
+Конфликт с существующей строкой проверяется по её состоянию до записи:
+обмен местами двух талонов в одной пачке даёт конфликт - его записывают в
+два вызова. Параллельная запись в ту же таблицу между проверкой и вставкой
+может всё же нарушить уникальный ключ; lock=True исключает это блокировкой
+SHARE ROW EXCLUSIVE (чтение таблицы не блокируется).
+
+Запуск (перезапись существующих талонов, по умолчанию с откатом):
+    python bulk_upsert.py --rows 100000
+"""
+
+import argparse
+import io
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from sqlalchemy import CheckConstraint, ForeignKeyConstraint, UniqueConstraint, select, text
+
+from database import Session, engine
+from models import BoardingPasses, Segments
+
+DEFAULT_ROWS = 100_000
+DEFAULT_ORM_ROWS = 1_000
+# Экранирование текстового формата COPY; NULL передаётся как \N
+COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+@dataclass
+class UpsertResult:
+    """Исходы строк пачки в порядке входных строк"""
+
+    outcomes: list
+
+    @property
+    def counts(self):
+        return Counter(self.outcomes)
+
+    def rejected(self):
+        """Номера строк, которые не записаны из-за ограничений, и имена ограничений"""
+        return [(i, outcome) for i, outcome in enumerate(self.outcomes)
+                if outcome not in ("inserted", "updated", "unchanged", "duplicate")]
+
+
+def _copy_line(row_no, row):
+    values = [str(row_no)]
+    values.extend("\\N" if value is None else str(value).translate(COPY_ESCAPES) for value in row)
+    return "\t".join(values) + "\n"
+
+
+def _columns(columns, alias=None):
+    prefix = f"{alias}." if alias else ""
+    return ", ".join(prefix + column.name for column in columns)
+
+
+def _matches(columns, left, right):
+    return " AND ".join(f"{left}.{column.name} = {right}.{column.name}" for column in columns)
+
+
+def validation_statements(table, stage):
+    """
+    Пометка строк временной таблицы, нарушающих ограничения table независимо от других строк пачки
+
+    Returns:
+        list: Пары (имя ограничения, SQL UPDATE временной таблицы)
+    """
+    key = list(table.primary_key.columns)
+    constraints = sorted(table.constraints, key=lambda constraint: constraint.name or "")
+    statements = []
+    for constraint in constraints:
+        if isinstance(constraint, CheckConstraint):
+            # Условие CHECK ссылается на колонки без таблицы - во временной таблице те же имена
+            statements.append((constraint.name, f"""
+                UPDATE {stage} SET outcome = :outcome
+                WHERE outcome IS NULL AND NOT ({constraint.sqltext})"""))
+    for constraint in constraints:
+        if isinstance(constraint, ForeignKeyConstraint):
+            elements = constraint.elements
+            referred = elements[0].column.table.fullname
+            present = " AND ".join(f"s.{element.parent.name} IS NOT NULL" for element in elements)
+            condition = " AND ".join(f"r.{element.column.name} = s.{element.parent.name}" for element in elements)
+            statements.append((constraint.name, f"""
+                UPDATE {stage} s SET outcome = :outcome
+                WHERE s.outcome IS NULL AND {present}
+                  AND NOT EXISTS (SELECT 1 FROM {referred} r WHERE {condition})"""))
+    for constraint in constraints:
+        if isinstance(constraint, UniqueConstraint):
+            columns = list(constraint.columns)
+            statements.append((constraint.name, f"""
+                UPDATE {stage} s SET outcome = :outcome
+                FROM {table.fullname} t
+                WHERE s.outcome IS NULL AND {_matches(columns, "t", "s")}
+                  AND ({_columns(key, "t")}) <> ({_columns(key, "s")})"""))
+    return statements
+
+
+def batch_unique_statement(table, stage):
+    """
+    Один проход проверки уникальных ключей между строками пачки
+
+    Кандидаты - последние непомеченные строки каждого первичного ключа. Строка,
+    первая по row_no во всех своих уникальных ключах, будет записана; строки с
+    тем же уникальным ключом после неё помечаются именем ограничения. Проход
+    повторяется, пока он что-то помечает: отклонённый кандидат уступает место
+    предыдущей строке своего первичного ключа, а среди оставшихся кандидатов
+    конфликтов не остаётся.
+
+    Returns:
+        str | None: SQL UPDATE временной таблицы или None, если уникальных ключей нет
+    """
+    key = list(table.primary_key.columns)
+    constraints = sorted(
+        (constraint for constraint in table.constraints if isinstance(constraint, UniqueConstraint)),
+        key=lambda constraint: constraint.name or "")
+    if not constraints:
+        return None
+    firsts, cases, conditions = [], [], []
+    for i, constraint in enumerate(constraints):
+        columns = list(constraint.columns)
+        present = " AND ".join(f"{column.name} IS NOT NULL" for column in columns)
+        firsts.append(f"CASE WHEN {present} THEN min(row_no) OVER (PARTITION BY {_columns(columns)}) END AS first_{i}")
+        condition = (f"r.first_{i} <> r.row_no"
+                     f" AND EXISTS (SELECT 1 FROM ranked f WHERE f.row_no = r.first_{i} AND f.clear)")
+        cases.append(f"WHEN {condition} THEN '{constraint.name}'")
+        conditions.append(f"({condition})")
+    clear = " AND ".join(f"coalesce(first_{i}, row_no) = row_no" for i in range(len(constraints)))
+    return f"""
+        WITH candidates AS (
+            SELECT * FROM (
+                SELECT *, max(row_no) OVER (PARTITION BY {_columns(key)}) AS last
+                FROM {stage} WHERE outcome IS NULL
+            ) c WHERE row_no = last
+        ), firsts AS (
+            SELECT row_no, {", ".join(firsts)} FROM candidates
+        ), ranked AS (
+            SELECT *, {clear} AS clear FROM firsts
+        )
+        UPDATE {stage} s SET outcome = CASE {" ".join(cases)} END
+        FROM ranked r
+        WHERE r.row_no = s.row_no AND ({" OR ".join(conditions)})"""
+
+
+def merge_statement(table, stage):
+    """INSERT ... ON CONFLICT DO UPDATE непомеченных строк с записью исхода во временную таблицу"""
+    key = list(table.primary_key.columns)
+    columns = list(table.columns)
+    values = [column for column in columns if column not in key]
+    assignments = ", ".join(f"{column.name} = excluded.{column.name}" for column in values)
+    return f"""
+        WITH merged AS (
+            INSERT INTO {table.fullname} AS t ({_columns(columns)})
+            SELECT {_columns(columns)} FROM {stage} WHERE outcome IS NULL
+            ON CONFLICT ({_columns(key)}) DO UPDATE SET {assignments}
+            WHERE ({_columns(values, "t")}) IS DISTINCT FROM ({_columns(values, "excluded")})
+            RETURNING {_columns(key, "t")}, (t.xmax = 0) AS inserted
+        )
+        UPDATE {stage} s SET outcome = CASE WHEN m.inserted THEN 'inserted' ELSE 'updated' END
+        FROM merged m WHERE {_matches(key, "m", "s")} AND s.outcome IS NULL"""
+
+
+def bulk_upsert(connection, model, rows, lock=False):
+    """
+    Вставляет или обновляет строки таблицы модели пачкой
+
+    Args:
+        connection: Синхронное соединение SQLAlchemy (psycopg2); запись идёт в его транзакции
+        model: Класс модели (BoardingPasses, Segments, ...)
+        rows: Кортежи значений в порядке колонок таблицы модели (подходят и строки fast_lookup)
+        lock (bool): Заблокировать таблицу от параллельной записи до конца транзакции
+
+    Returns:
+        UpsertResult: Исход каждой строки
+    """
+    table = model.__table__
+    stage = f"{table.name}_stage"
+    key = list(table.primary_key.columns)
+
+    # Копия колонок целевой таблицы (с NOT NULL, но без ключей и проверок)
+    connection.exec_driver_sql(f"CREATE TEMP TABLE {stage} (LIKE {table.fullname}) ON COMMIT DROP")
+    connection.exec_driver_sql(f"ALTER TABLE {stage} ADD COLUMN row_no integer, ADD COLUMN outcome text")
+    buffer = io.StringIO("".join(_copy_line(row_no, row) for row_no, row in enumerate(rows)))
+    cursor = connection.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {stage} (row_no, {_columns(table.columns)}) FROM STDIN", buffer)
+    finally:
+        cursor.close()
+    connection.exec_driver_sql(f"ANALYZE {stage}")
+
+    if lock:
+        connection.exec_driver_sql(f"LOCK TABLE {table.fullname} IN SHARE ROW EXCLUSIVE MODE")
+    for name, statement in validation_statements(table, stage):
+        connection.execute(text(statement), {"outcome": name})
+    statement = batch_unique_statement(table, stage)
+    if statement is not None:
+        # Пока проход что-то помечает, среди кандидатов остаются конфликты
+        while connection.execute(text(statement)).rowcount:
+            pass
+    connection.execute(text(f"""
+        UPDATE {stage} s SET outcome = 'duplicate'
+        FROM (
+            SELECT row_no, max(row_no) OVER (PARTITION BY {_columns(key)}) AS last
+            FROM {stage} WHERE outcome IS NULL
+        ) d
+        WHERE d.row_no = s.row_no AND d.row_no < d.last"""))
+    connection.execute(text(merge_statement(table, stage)))
+
+    outcomes = connection.execute(text(
+        f"SELECT coalesce(outcome, 'unchanged') FROM {stage} ORDER BY row_no")).scalars().all()
+    connection.exec_driver_sql(f"DROP TABLE {stage}")
+    return UpsertResult(outcomes)
+
+
+def upsert_boarding_passes(connection, rows, lock=False):
+    """bulk_upsert() для boarding_passes: (ticket_no, flight_id, seat_no, boarding_no, boarding_time)"""
+    return bulk_upsert(connection, BoardingPasses, rows, lock)
+
+
+def upsert_segments(connection, rows, lock=False):
+    """bulk_upsert() для segments: (ticket_no, flight_id, fare_conditions, price)"""
+    return bulk_upsert(connection, Segments, rows, lock)
+
+
+def sample_boarding_passes(connection, count):
+    """Существующие талоны; у каждого второго новое время посадки, у последнего - занятое место"""
+    columns = list(BoardingPasses.__table__.columns)
+    rows = [list(row) for row in connection.execute(select(*columns).limit(count)).all()]
+    now = datetime.now(timezone.utc)
+    for row in rows[::2]:
+        row[4] = now
+    if rows:
+        last = rows[-1]
+        taken = next((row for row in rows[:-1] if row[1] == last[1]), None)
+        if taken is not None:
+            last[2] = taken[2]
+    return [tuple(row) for row in rows]
+
+
+def orm_rows_per_second(rows):
+    """Запись талонов по одному через Session.merge() (с откатом)"""
+    columns = [column.name for column in BoardingPasses.__table__.columns]
+    with Session() as session:
+        started = time.perf_counter()
+        for row in rows:
+            session.merge(BoardingPasses(**dict(zip(columns, row))))
+            session.flush()
+        elapsed = time.perf_counter() - started
+        session.rollback()
+    return len(rows) / elapsed if rows else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетная запись посадочных талонов")
+    parser.add_argument("--rows", type=int, default=DEFAULT_ROWS, help="Строк в пачке")
+    parser.add_argument("--orm-rows", type=int, default=DEFAULT_ORM_ROWS, help="Строк для замера записи через ORM")
+    parser.add_argument("--lock", action="store_true", help="Блокировать таблицу от параллельной записи")
+    parser.add_argument("--commit", action="store_true", help="Фиксировать запись (по умолчанию - откат)")
+    args = parser.parse_args()
+
+    try:
+        with engine.connect() as connection:
+            rows = sample_boarding_passes(connection, args.rows)
+            started = time.perf_counter()
+            result = upsert_boarding_passes(connection, rows, args.lock)
+            elapsed = time.perf_counter() - started
+            if args.commit:
+                connection.commit()
+            else:
+                connection.rollback()
+        orm_rate = orm_rows_per_second(rows[:args.orm_rows])
+    except Exception as e:
+        print(f"Ошибка при выполнении запроса: {e}")
+        return
+
+    print(f"Строк: {len(rows)}, {'с фиксацией' if args.commit else 'с откатом транзакции'}")
+    for outcome, count in result.counts.most_common():
+        print(f"  {outcome:<45} {count:>8}")
+    rate = len(rows) / elapsed if elapsed else 0.0
+    print(f"\nbulk_upsert: {elapsed:.2f} с, {rate:.0f} строк/с")
+    if orm_rate:
+        print(f"ORM merge(): {orm_rate:.0f} строк/с, ускорение {rate / orm_rate:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Колоночная аналитика выручки на NumPy
+
+Segments (flight_id, fare_conditions, price) и Flights (flight_id, route_no,
+scheduled_departure) загружаются серверным курсором в колоночные массивы
+NumPy: строки кодируются категориями (коды + словарь), цены хранятся целыми
+копейками (int64) без потери точности, время - datetime64[s] в UTC.
+Группировки выполняются векторно (bincount / argsort + reduceat), а массивы
+кэшируются в .npy и открываются через memory map для повторного анализа.
+"""
+
+import json
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import BigInteger, cast, extract, select
+
+from database import engine
+from models import Flights, Segments
+
+DEFAULT_BATCH_SIZE = 50_000
+DEFAULT_CACHE_DIR = Path(".cache") / "columnar"
+
+CATEGORIES_FILE = "categories.json"
+
+# Результат группировки: ключи групп, выручка в копейках и количество сегментов
+GroupResult = namedtuple("GroupResult", ["keys", "revenue_cents", "counts"])
+
+
+class CategoryEncoder:
+    """Кодирует строки в целочисленные коды, пополняя словарь по мере загрузки"""
+
+    def __init__(self, categories=None):
+        self.categories = list(categories or [])
+        self._codes = {value: code for code, value in enumerate(self.categories)}
+
+    def encode(self, values, dtype=np.int32):
+        """Векторно кодирует массив строк: словарь обновляется только по уникальным значениям"""
+        uniques, inverse = np.unique(np.asarray(values, dtype=object), return_inverse=True)
+        mapping = np.empty(len(uniques), dtype=dtype)
+        for i, value in enumerate(uniques):
+            code = self._codes.get(value)
+            if code is None:
+                code = self._codes[value] = len(self.categories)
+                self.categories.append(value)
+            mapping[i] = code
+        return mapping[inverse]
+
+
+class Columns:
+    """Набор колонок одинаковой длины и словари категориальных колонок"""
+
+    def __init__(self, arrays, categories=None):
+        lengths = {len(array) for array in arrays.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"Колонки разной длины: { {k: len(v) for k, v in arrays.items()} }")
+        self.arrays = arrays
+        self.categories = categories or {}
+
+    def __len__(self):
+        return len(next(iter(self.arrays.values()))) if self.arrays else 0
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def decode(self, name, codes=None):
+        """Возвращает строковые значения категориальной колонки (или заданных кодов)"""
+        categories = np.asarray(self.categories[name], dtype=object)
+        return categories[self.arrays[name] if codes is None else codes]
+
+    def save(self, directory):
+        """Сохраняет каждую колонку в отдельный .npy и словари категорий в JSON"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name, array in self.arrays.items():
+            np.save(directory / f"{name}.npy", array)
+        with open(directory / CATEGORIES_FILE, "w", encoding="utf-8") as f:
+            json.dump(self.categories, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        """Открывает сохранённые колонки; при mmap_mode данные не читаются в память целиком"""
+        directory = Path(directory)
+        with open(directory / CATEGORIES_FILE, encoding="utf-8") as f:
+            categories = json.load(f)
+        arrays = {path.stem: np.load(path, mmap_mode=mmap_mode) for path in sorted(directory.glob("*.npy"))}
+        return cls(arrays, categories)
+
+
+def load_columns(stmt, spec, bind=engine, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Загружает результат запроса в колонки пачками
+
+    Args:
+        stmt: Запрос, колонки которого идут в порядке spec
+        spec (list): Пары (имя, dtype); dtype=None - категориальная строковая колонка,
+            строковый dtype фиксированной ширины (например, "S6") - строки как байты
+        bind: Движок SQLAlchemy
+        batch_size (int): Размер пачки серверного курсора
+    """
+    encoders = {name: CategoryEncoder() for name, dtype in spec if dtype is None}
+    chunks = {name: [] for name, _ in spec}
+
+    with bind.connect() as connection:
+        result = connection.execution_options(stream_results=True).execute(stmt)
+        for batch in result.partitions(batch_size):
+            for (name, dtype), values in zip(spec, zip(*batch)):
+                if dtype is None:
+                    chunks[name].append(encoders[name].encode(values))
+                elif np.dtype(dtype).kind == "S":
+                    chunks[name].append(np.array(values, dtype=dtype))
+                else:
+                    chunks[name].append(np.fromiter(values, dtype=dtype, count=len(values)))
+
+    arrays = {
+        name: np.concatenate(chunks[name]) if chunks[name] else np.empty(0, dtype=dtype or np.int32)
+        for name, dtype in spec
+    }
+    return Columns(arrays, {name: encoder.categories for name, encoder in encoders.items()})
+
+
+def load_segments(bind=engine, batch_size=DEFAULT_BATCH_SIZE):
+    """Загружает segments: flight_id, fare_conditions (коды), price (копейки)"""
+    stmt = select(
+        Segments.flight_id,
+        Segments.fare_conditions,
+        cast(Segments.price * 100, BigInteger),
+    )
+    spec = [("flight_id", np.int32), ("fare_conditions", None), ("price_cents", np.int64)]
+    return load_columns(stmt, spec, bind, batch_size)
+
+
+def load_flights(bind=engine, batch_size=DEFAULT_BATCH_SIZE):
+    """Загружает flights: flight_id, route_no (коды), scheduled_departure (секунды UTC)"""
+    stmt = select(
+        Flights.flight_id,
+        Flights.route_no,
+        cast(extract("epoch", Flights.scheduled_departure), BigInteger),
+    )
+    spec = [("flight_id", np.int32), ("route_no", None), ("scheduled_departure", np.int64)]
+    columns = load_columns(stmt, spec, bind, batch_size)
+    columns.arrays["scheduled_departure"] = columns["scheduled_departure"].astype("datetime64[s]")
+    return columns
+
+
+def load_cached(name, loader, cache_dir=DEFAULT_CACHE_DIR, refresh=False):
+    """Возвращает колонки из кэша .npy (через memory map) или загружает и кэширует их"""
+    directory = Path(cache_dir) / name
+    if refresh or not (directory / CATEGORIES_FILE).exists():
+        loader().save(directory)
+    return Columns.load(directory)
+
+
+def group_sum(codes, values):
+    """
+    Точная сумма values по группам codes через argsort + reduceat
+
+    Returns:
+        tuple: (ключи групп по возрастанию, суммы, количества)
+    """
+    if len(codes) == 0:
+        return np.empty(0, dtype=codes.dtype), np.empty(0, dtype=values.dtype), np.empty(0, dtype=np.int64)
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    sums = np.add.reduceat(values[order], starts)
+    counts = np.diff(np.r_[starts, len(sorted_codes)])
+    return sorted_codes[starts], sums, counts
+
+
+def dense_group_sum(codes, values, size):
+    """Сумма по плотным кодам 0..size-1 через bincount (для небольших словарей)"""
+    counts = np.bincount(codes, minlength=size)
+    # Сумма копеек точна в float64, пока не превышает 2**53
+    sums = np.bincount(codes, weights=values, minlength=size).round().astype(np.int64)
+    return np.arange(size), sums, counts
+
+
+class RevenueAnalytics:
+    """Векторные отчёты о выручке по сегментам с привязкой к рейсам"""
+
+    def __init__(self, segments, flights):
+        self.segments = segments
+        self.flights = flights
+
+        # Плотная таблица flight_id -> номер строки flights (flight_id - identity)
+        flight_ids = np.asarray(flights["flight_id"])
+        segment_flight_ids = np.asarray(segments["flight_id"])
+        size = max(np.max(flight_ids, initial=0), np.max(segment_flight_ids, initial=0)) + 1
+        lookup = np.full(size, -1, dtype=np.int64)
+        lookup[flight_ids] = np.arange(len(flight_ids))
+        self.flight_row = lookup[segment_flight_ids]
+        self.matched = self.flight_row >= 0
+
+    def per_flight(self):
+        """Выручка по рейсам (ключ - flight_id)"""
+        return GroupResult(*group_sum(np.asarray(self.segments["flight_id"]), np.asarray(self.segments["price_cents"])))
+
+    def per_fare_conditions(self):
+        """Выручка по классам обслуживания (ключ - название класса)"""
+        size = len(self.segments.categories["fare_conditions"])
+        codes, sums, counts = dense_group_sum(np.asarray(self.segments["fare_conditions"]),
+                                              np.asarray(self.segments["price_cents"]), size)
+        return GroupResult(self.segments.decode("fare_conditions", codes), sums, counts)
+
+    def per_route(self):
+        """Выручка по маршрутам (ключ - route_no)"""
+        rows = self.flight_row[self.matched]
+        route_codes = np.asarray(self.flights["route_no"])[rows]
+        size = len(self.flights.categories["route_no"])
+        codes, sums, counts = dense_group_sum(route_codes, np.asarray(self.segments["price_cents"])[self.matched], size)
+        present = counts > 0
+        return GroupResult(self.flights.decode("route_no", codes[present]), sums[present], counts[present])
+
+    def per_day(self):
+        """Выручка по дням планового вылета в UTC (ключ - datetime64[D])"""
+        rows = self.flight_row[self.matched]
+        days = np.asarray(self.flights["scheduled_departure"]).astype("datetime64[D]")[rows]
+        keys, sums, counts = group_sum(days.view(np.int64), np.asarray(self.segments["price_cents"])[self.matched])
+        return GroupResult(keys.view("datetime64[D]"), sums, counts)
+
+
+def print_top(title, result, limit=10):
+    """Печатает первые группы отчёта по убыванию выручки"""
+    print(f"\n{title}:")
+    print(f"{'Ключ':<20} {'Выручка':>18} {'Сегментов':>12}")
+    print("-" * 52)
+    for i in np.argsort(result.revenue_cents)[::-1][:limit]:
+        print(f"{str(result.keys[i]):<20} {result.revenue_cents[i] / 100:>18.2f} {result.counts[i]:>12}")
+
+
+def main():
+    """Загрузка (или чтение из кэша) колонок и отчёты о выручке"""
+    try:
+        segments = load_cached("segments", load_segments)
+        flights = load_cached("flights", load_flights)
+    except Exception as e:
+        print(f"Ошибка при выполнении запроса: {e}")
+        return
+
+    analytics = RevenueAnalytics(segments, flights)
+    print(f"Сегментов: {len(segments)}, рейсов: {len(flights)}")
+    print_top("Выручка по классам обслуживания", analytics.per_fare_conditions())
+    print_top("Топ-10 маршрутов по выручке", analytics.per_route())
+    print_top("Топ-10 рейсов по выручке", analytics.per_flight())
+    print_top("Топ-10 дней по выручке", analytics.per_day())
+
+
+if __name__ == "__main__":
+    main()
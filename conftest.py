@@ -0,0 +1,11 @@
+"""
+Общая настройка pytest проекта
+
+Фикстуры баз данных (db_session, db_async_session, клоны шаблона) подключаются
+из db_fixtures; тесты лежат в tests/. Каталоги учебных курсов со своими
+тестами и зависимостями в прогон проекта не входят.
+"""
+
+pytest_plugins = ["db_fixtures"]
+
+collect_ignore = ["automation_course", "course_automation_pytest_playwright"]
@@ -1,17 +1,8 @@
-from config import db
-
-# Получить строку подключения
-connection_string = db.database_url
-
-# Использование SQLAlchemy
-from sqlalchemy import create_engine
 from datetime import datetime
 
-from sqlalchemy.orm import sessionmaker
+from database import Session
 from models import Flights
 
-engine = create_engine(db.database_url)
-Session = sessionmaker(bind=engine)
 session = Session()
 
 # Пример запроса к таблице Flights
@@ -0,0 +1,243 @@
+"""
+Проверка согласованности данных бронирований
+
+Проверки выполняются множественными SQL-запросами, которые возвращают только
+нарушения, и запускаются параллельно по шардам ключей (см. parallel_scan):
+- сумма бронирования bookings.total_amount равна сумме segments.price по его билетам;
+- фактические времена рейса удовлетворяют flight_actual_check;
+- у сегментов есть билет и рейс, у посадочных талонов - сегмент;
+- маршруты выполнимы назначенным самолётом по дальности и скорости
+  (векторная проверка на клиенте, см. route_feasibility).
+
+Режим --verify проверяет суммы бронирований и времена рейсов векторно по
+файлам, выгруженным заранее через --export, без обращения к базе.
+
+Запуск:
+    python consistency_check.py
+    python consistency_check.py --export .cache/consistency
+    python consistency_check.py --verify .cache/consistency
+"""
+
+import argparse
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import BigInteger, Float, and_, cast, exists, extract, func, literal, or_, select
+
+from columnar import Columns, dense_group_sum, load_columns
+from models import BoardingPasses, Bookings, Flights, Segments, Tickets
+from parallel_scan import key_shards, parallel_scan
+from route_feasibility import COLUMNS as ROUTE_COLUMNS, check_routes
+
+SHARDS_PER_WORKER = 4
+
+
+@dataclass(frozen=True)
+class Check:
+    """
+    Проверка: запрос нарушений для шарда и колонка, по которой делятся шарды
+
+    Проверки, которые выполняются не запросом, а на клиенте, задают run -
+    функцию без аргументов, возвращающую список нарушений.
+    """
+
+    name: str
+    description: str
+    key: object
+    query: object
+    columns: tuple
+    run: object = None
+
+
+def booking_total_mismatches(shard):
+    """Бронирования, сумма которых не совпадает с суммой цен сегментов"""
+    segments_total = func.coalesce(func.sum(Segments.price), 0)
+    return (
+        select(Bookings.book_ref, Bookings.total_amount, segments_total.label("segments_total"))
+        # Условие шарда повторяется в соединении с tickets, чтобы не читать все билеты в каждом шарде
+        .outerjoin(Tickets, and_(Tickets.book_ref == Bookings.book_ref, shard.where(Tickets.book_ref)))
+        .outerjoin(Segments, Segments.ticket_no == Tickets.ticket_no)
+        .where(shard.where(Bookings.book_ref))
+        .group_by(Bookings.book_ref, Bookings.total_amount)
+        .having(Bookings.total_amount != segments_total)
+    )
+
+
+def flight_actual_violations(shard):
+    """Рейсы, нарушающие семантику flight_actual_check"""
+    return (
+        select(Flights.flight_id, Flights.status, Flights.actual_departure, Flights.actual_arrival)
+        .where(shard.where(Flights.flight_id))
+        .where(Flights.actual_arrival.is_not(None))
+        .where(or_(Flights.actual_departure.is_(None), Flights.actual_arrival <= Flights.actual_departure))
+    )
+
+
+def orphaned_segments(shard):
+    """Сегменты без билета или без рейса"""
+    ticket_exists = exists().where(Tickets.ticket_no == Segments.ticket_no)
+    flight_exists = exists().where(Flights.flight_id == Segments.flight_id)
+    return (
+        select(Segments.ticket_no, Segments.flight_id, ~ticket_exists, ~flight_exists)
+        .where(shard.where(Segments.flight_id))
+        .where(or_(~ticket_exists, ~flight_exists))
+    )
+
+
+def orphaned_boarding_passes(shard):
+    """Посадочные талоны без соответствующего сегмента"""
+    segments = Segments.__table__
+    passes = BoardingPasses.__table__
+    segment_exists = (
+        exists()
+        .where(segments.c.ticket_no == passes.c.ticket_no)
+        .where(segments.c.flight_id == passes.c.flight_id)
+    )
+    return (
+        select(passes.c.ticket_no, passes.c.flight_id, passes.c.seat_no)
+        .where(shard.where(passes.c.flight_id))
+        .where(~segment_exists)
+    )
+
+
+CHECKS = [
+    Check("booking_total", "Сумма бронирования не равна сумме сегментов",
+          Bookings.book_ref, booking_total_mismatches, ("book_ref", "total_amount", "segments_total")),
+    Check("flight_actual", "Нарушена семантика flight_actual_check",
+          Flights.flight_id, flight_actual_violations, ("flight_id", "status", "actual_departure", "actual_arrival")),
+    Check("orphaned_segments", "Сегменты без билета или рейса",
+          Segments.flight_id, orphaned_segments, ("ticket_no", "flight_id", "no_ticket", "no_flight")),
+    Check("orphaned_boarding_passes", "Посадочные талоны без сегмента",
+          BoardingPasses.__table__.c.flight_id, orphaned_boarding_passes, ("ticket_no", "flight_id", "seat_no")),
+    Check("route_feasibility", "Маршрут не выполним назначенным самолётом",
+          None, None, ROUTE_COLUMNS, run=check_routes),
+]
+
+
+def rows_to_tuples(batch):
+    return [tuple(row) for row in batch]
+
+
+def extend_list(accumulator, partial):
+    accumulator.extend(partial)
+    return accumulator
+
+
+def run_check(check, workers=None):
+    """Запускает проверку параллельно по шардам и возвращает список нарушений"""
+    if check.run is not None:
+        return check.run()
+    workers = workers or os.cpu_count() or 1
+    shards = key_shards(check.key, workers * SHARDS_PER_WORKER)
+    return parallel_scan(check.query, None, shards, rows_to_tuples, extend_list, list, workers=workers)
+
+
+def print_violations(check, violations, elapsed):
+    """Печатает только нарушения; для прошедших проверок - одну строку"""
+    if not violations:
+        print(f"[OK]   {check.name}: нарушений нет ({elapsed:.1f} с)")
+        return
+    print(f"[FAIL] {check.name}: {check.description} - {len(violations)} ({elapsed:.1f} с)")
+    print("       " + "\t".join(check.columns))
+    for row in violations:
+        print("       " + "\t".join(str(value) for value in row))
+
+
+def run_all(checks=CHECKS, workers=None):
+    """Выполняет все проверки; возвращает общее количество нарушений"""
+    total = 0
+    for check in checks:
+        started = time.perf_counter()
+        violations = run_check(check, workers)
+        print_violations(check, violations, time.perf_counter() - started)
+        total += len(violations)
+    return total
+
+
+def _epoch_or_nan(column):
+    """Время в секундах UTC с NaN вместо NULL - для выгрузки в float64"""
+    return func.coalesce(cast(extract("epoch", column), Float), literal(float("nan"), Float))
+
+
+def export_for_verification(directory):
+    """Выгружает колонки, нужные векторной проверке, в .npy"""
+    directory = Path(directory)
+    bookings = load_columns(
+        select(Bookings.book_ref, cast(Bookings.total_amount * 100, BigInteger)),
+        [("book_ref", "S6"), ("total_cents", np.int64)],
+    )
+    # Побайтовая сортировка (не по правилам сортировки базы) - для бинарного поиска при проверке
+    order = np.argsort(bookings["book_ref"], kind="stable")
+    Columns({name: array[order] for name, array in bookings.arrays.items()}).save(directory / "bookings")
+    load_columns(
+        select(Tickets.book_ref, cast(Segments.price * 100, BigInteger))
+        .join(Tickets, Tickets.ticket_no == Segments.ticket_no),
+        [("book_ref", "S6"), ("price_cents", np.int64)],
+    ).save(directory / "segment_prices")
+    load_columns(
+        select(Flights.flight_id, _epoch_or_nan(Flights.actual_departure), _epoch_or_nan(Flights.actual_arrival)),
+        [("flight_id", np.int32), ("actual_departure", np.float64), ("actual_arrival", np.float64)],
+    ).save(directory / "flights")
+
+
+def verify_exported(directory):
+    """
+    Векторная проверка по выгруженным файлам
+
+    Returns:
+        dict: Имя проверки -> список нарушений
+    """
+    directory = Path(directory)
+    bookings = Columns.load(directory / "bookings")
+    prices = Columns.load(directory / "segment_prices")
+    flights = Columns.load(directory / "flights")
+
+    # Номера бронирований отсортированы при выгрузке - сегменты привязываются бинарным поиском
+    refs = np.asarray(bookings["book_ref"])
+    position = np.searchsorted(refs, prices["book_ref"])
+    position[position == len(refs)] = 0
+    matched = refs[position] == prices["book_ref"] if len(refs) else np.zeros(len(position), dtype=bool)
+    _, sums, _ = dense_group_sum(position[matched], np.asarray(prices["price_cents"])[matched], len(refs))
+    totals = np.asarray(bookings["total_cents"])
+    mismatched = np.flatnonzero(sums != totals)
+
+    departure = np.asarray(flights["actual_departure"])
+    arrival = np.asarray(flights["actual_arrival"])
+    with np.errstate(invalid="ignore"):
+        bad_flights = np.flatnonzero(~np.isnan(arrival) & (np.isnan(departure) | (arrival <= departure)))
+
+    return {
+        "booking_total": [(refs[i].decode(), int(totals[i]) / 100, int(sums[i]) / 100) for i in mismatched],
+        "flight_actual": [(int(flights["flight_id"][i]), float(departure[i]), float(arrival[i])) for i in bad_flights],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка согласованности данных бронирований")
+    parser.add_argument("--workers", type=int, default=None, help="Количество параллельных соединений")
+    parser.add_argument("--export", metavar="DIR", help="Выгрузить данные для векторной проверки")
+    parser.add_argument("--verify", metavar="DIR", help="Векторная проверка по выгруженным данным")
+    args = parser.parse_args()
+
+    try:
+        if args.export:
+            export_for_verification(args.export)
+            print(f"Данные для проверки выгружены в {args.export}")
+        elif args.verify:
+            for name, violations in verify_exported(args.verify).items():
+                print(f"[{'FAIL' if violations else 'OK'}] {name}: нарушений {len(violations)}")
+                for row in violations:
+                    print("       " + "\t".join(str(value) for value in row))
+        else:
+            total = run_all(workers=args.workers)
+            print(f"Всего нарушений: {total}")
+    except Exception as e:
+        print(f"Ошибка при выполнении проверки: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    main()
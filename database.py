@@ -0,0 +1,285 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from config import db
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+pool_logger = logging.getLogger("database.pool")
+
+# Строки подключения для синхронного (psycopg2) и асинхронного (asyncpg) драйверов
+database_url = db.database_url
+database_url_async = db.database_url.replace("postgresql://", "postgresql+asyncpg://")
+
+# Порог ожидания соединения из пула, после которого пишется предупреждение, с
+POOL_WAIT_WARNING_ENV = "DB_POOL_WAIT_WARNING"
+DEFAULT_POOL_WAIT_WARNING = 0.1
+# Период записи метрик пулов в журнал, с; если задан, запись включается при импорте
+POOL_LOG_INTERVAL_ENV = "DB_POOL_LOG_INTERVAL"
+# Сколько последних ожиданий учитывается в перцентилях
+POOL_WAIT_WINDOW = 1_000
+
+
+class PoolTelemetry:
+    """
+    Метрики пула соединений движка
+
+    Ожидание соединения измеряется в пуле TimedQueuePool (включает открытие
+    нового соединения, если пул его создаёт); остальное - по событиям пула:
+    время жизни соединений и время, на которое их берут.
+    """
+
+    def __init__(self, name, bind, wait_warning=DEFAULT_POOL_WAIT_WARNING):
+        self.name = name
+        self.bind = bind
+        self.wait_warning = wait_warning
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=POOL_WAIT_WINDOW)
+        self._wait_count = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._slow_waits = 0
+        self._hold_count = 0
+        self._hold_total = 0.0
+        # Момент открытия каждого живого соединения: id записи пула -> time.monotonic()
+        self._opened = {}
+
+        sync_bind = getattr(bind, "sync_engine", bind)
+        sync_bind.pool.telemetry = self
+        event.listen(sync_bind, "connect", self._on_connect)
+        event.listen(sync_bind, "close", self._on_close)
+        event.listen(sync_bind, "detach", self._on_close)
+        event.listen(sync_bind, "checkout", self._on_checkout)
+        event.listen(sync_bind, "checkin", self._on_checkin)
+
+    @property
+    def pool(self):
+        # После dispose() у движка новый пул - метрики всегда читаются с текущего
+        return getattr(self.bind, "sync_engine", self.bind).pool
+
+    def _on_connect(self, dbapi_connection, record):
+        with self._lock:
+            self._opened[id(record)] = time.monotonic()
+
+    def _on_close(self, dbapi_connection, record):
+        # Закрытое или отсоединённое от пула соединение больше не учитывается
+        with self._lock:
+            self._opened.pop(id(record), None)
+
+    def _on_checkout(self, dbapi_connection, record, proxy):
+        record.info["checked_out_at"] = time.monotonic()
+
+    def _on_checkin(self, dbapi_connection, record):
+        checked_out_at = record.info.pop("checked_out_at", None)
+        if checked_out_at is not None:
+            with self._lock:
+                self._hold_count += 1
+                self._hold_total += time.monotonic() - checked_out_at
+
+    def record_wait(self, seconds):
+        """Учитывает ожидание соединения; при превышении порога - предупреждение в журнал"""
+        with self._lock:
+            self._waits.append(seconds)
+            self._wait_count += 1
+            self._wait_total += seconds
+            self._wait_max = max(self._wait_max, seconds)
+            slow = seconds > self.wait_warning
+            if slow:
+                self._slow_waits += 1
+        if slow:
+            pool = self.pool
+            pool_logger.warning(
+                "%s: ожидание соединения %.0f мс (порог %.0f мс), занято %d из %d, переполнение %d",
+                self.name, seconds * 1000, self.wait_warning * 1000,
+                pool.checkedout(), pool.size(), max(pool.overflow(), 0),
+            )
+
+    def snapshot(self):
+        """Текущие метрики пула словарём"""
+        pool = self.pool
+        now = time.monotonic()
+        with self._lock:
+            waits = sorted(self._waits) or [0.0]
+            ages = [now - opened for opened in self._opened.values()]
+            return {
+                "pool": self.name,
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                # overflow() отрицателен, пока пул не заполнен до pool_size
+                "overflow": max(pool.overflow(), 0),
+                "connections": len(ages),
+                "oldest_connection_s": round(max(ages, default=0.0), 1),
+                "average_connection_age_s": round(sum(ages) / len(ages), 1) if ages else 0.0,
+                "waits": self._wait_count,
+                "wait_average_ms": round(self._wait_total / self._wait_count * 1000, 2) if self._wait_count else 0.0,
+                # 95-й перцентиль по ближайшему рангу
+                "wait_p95_ms": round(waits[math.ceil(len(waits) * 0.95) - 1] * 1000, 2),
+                "wait_max_ms": round(self._wait_max * 1000, 2),
+                "slow_waits": self._slow_waits,
+                "hold_average_ms": round(self._hold_total / self._hold_count * 1000, 2) if self._hold_count else 0.0,
+            }
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool, измеряющий ожидание соединения (переопределяет внутренний _do_get)"""
+
+    telemetry = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            if self.telemetry is not None:
+                self.telemetry.record_wait(time.perf_counter() - started)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.telemetry = self.telemetry
+        return pool
+
+
+class TimedAsyncAdaptedQueuePool(TimedQueuePool, AsyncAdaptedQueuePool):
+    """Вариант TimedQueuePool для асинхронного движка"""
+
+
+# Общие движки и фабрики сессий для всех скриптов проекта
+engine = create_engine(database_url, poolclass=TimedQueuePool)
+Session = sessionmaker(bind=engine)
+
+async_engine = create_async_engine(database_url_async, echo=False, poolclass=TimedAsyncAdaptedQueuePool)
+AsyncSessionLocal = sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+_wait_warning = float(os.environ.get(POOL_WAIT_WARNING_ENV, DEFAULT_POOL_WAIT_WARNING))
+pool_telemetry = {
+    "sync": PoolTelemetry("sync", engine, _wait_warning),
+    "async": PoolTelemetry("async", async_engine, _wait_warning),
+}
+
+
+def pool_snapshot():
+    """Метрики пулов общих движков"""
+    return [telemetry.snapshot() for telemetry in pool_telemetry.values()]
+
+
+def format_pool_snapshot(snapshot):
+    return " ".join(f"{key}={value}" for key, value in snapshot.items())
+
+
+def start_pool_logging(interval, telemetries=None):
+    """
+    Периодически пишет метрики пулов в журнал database.pool
+
+    Returns:
+        threading.Event: Установка события останавливает запись
+    """
+    stop = threading.Event()
+    telemetries = list(telemetries or pool_telemetry.values())
+
+    def run():
+        while not stop.wait(interval):
+            for telemetry in telemetries:
+                pool_logger.info(format_pool_snapshot(telemetry.snapshot()))
+
+    threading.Thread(target=run, name="pool-telemetry", daemon=True).start()
+    return stop
+
+
+if os.environ.get(POOL_LOG_INTERVAL_ENV):
+    pool_logging_stop = start_pool_logging(float(os.environ[POOL_LOG_INTERVAL_ENV]))
+
+# Путь журнала нагрузки; если задан, все запросы обоих движков записываются в него
+WORKLOAD_LOG_ENV = "WORKLOAD_LOG"
+
+
+class WorkloadRecorder:
+    """Записывает выполняемые через движок запросы в журнал JSON Lines"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if executemany and parameters:
+            parameters = parameters[0]
+        record = {
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "statement": statement,
+            "parameters": parameters,
+            "paramstyle": conn.dialect.paramstyle,
+        }
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def record_workload(path, engines=None):
+    """
+    Подключает запись запросов в журнал нагрузки для движков проекта
+
+    Args:
+        path (str): Файл журнала (дописывается)
+        engines (list): Синхронные или асинхронные движки; по умолчанию - оба общих
+
+    Returns:
+        WorkloadRecorder: Объект записи (для закрытия журнала)
+    """
+    recorder = WorkloadRecorder(path)
+    for bind in engines or (engine, async_engine):
+        # У асинхронного движка события висят на его синхронной части
+        event.listen(getattr(bind, "sync_engine", bind), "before_cursor_execute", recorder)
+    return recorder
+
+
+if os.environ.get(WORKLOAD_LOG_ENV):
+    workload_recorder = record_workload(os.environ[WORKLOAD_LOG_ENV])
+
+
+def explain_plan(connection, stmt, analyze=False, buffers=False, parameters=None):
+    """
+    Выполняет EXPLAIN (FORMAT JSON) для запроса и возвращает корневой узел плана
+
+    Args:
+        connection: Синхронное соединение SQLAlchemy
+        stmt: Запрос SQLAlchemy (select/update/...) или строка SQL драйвера
+        analyze (bool): Выполнить запрос и собрать фактические показатели
+        buffers (bool): Собрать статистику по буферам (имеет смысл вместе с analyze)
+        parameters (dict): Параметры строки SQL в стиле драйвера (%(name)s)
+    """
+    options = ["FORMAT JSON"]
+    if analyze:
+        options.insert(0, "ANALYZE")
+    if buffers:
+        options.insert(1 if analyze else 0, "BUFFERS")
+
+    if isinstance(stmt, str):
+        args = () if parameters is None else (parameters,)
+        result = connection.exec_driver_sql(f"EXPLAIN ({', '.join(options)}) {stmt}", *args)
+    else:
+        compiled = stmt.compile(bind=connection, compile_kwargs={"render_postcompile": True})
+        result = connection.exec_driver_sql(f"EXPLAIN ({', '.join(options)}) {compiled}", compiled.params)
+    document = result.scalar_one()
+    return document[0]
+
+
+def plan_nodes(plan):
+    """Обходит дерево плана EXPLAIN и возвращает все узлы в порядке обхода"""
+    stack = [plan.get("Plan", plan)]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(node.get("Plans", [])))
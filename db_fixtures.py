@@ -0,0 +1,269 @@
+"""
+Фикстуры pytest для изолированных тестов на копиях базы PostgreSQL
+
+Схема из models.py (и тестовые данные из фикстуры db_seed) создаётся один раз
+за сессию в шаблонной базе. Каждый тест получает собственный клон через
+CREATE DATABASE ... TEMPLATE из пула заранее созданных клонов: пока тест
+работает, фоновый поток готовит следующий клон, а использованный удаляется.
+Под pytest-xdist у каждого воркера свой шаблон и свой пул.
+
+Для тестов, которым не нужна отдельная база, есть фикстуры db_session и
+db_async_session: сессия привязана к внешней транзакции соединения, каждый
+session.commit() внутри теста фиксирует лишь SAVEPOINT, а после теста всё
+откатывается. Такие тесты могут параллельно писать в одну базу без очистки
+и повторного заполнения.
+
+Подключение в conftest.py:
+    pytest_plugins = ["db_fixtures"]
+
+Переменные окружения:
+    TEST_DB_POOL_SIZE - количество заранее созданных клонов (по умолчанию 4)
+"""
+
+import itertools
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+
+from database import database_url, database_url_async, engine
+from models import metadata
+
+SCHEMA = "bookings"
+# Таблицы метаданных, которые в демо-базе являются представлениями
+VIEWS = {"airplanes", "airports", "timetable"}
+
+DEFAULT_POOL_SIZE = 4
+MAINTENANCE_DB = "postgres"
+
+
+def database_available(bind=engine):
+    """Доступен ли сервер PostgreSQL - для pytest.mark.skipif тестов, которым нужна база"""
+    try:
+        with bind.connect():
+            return True
+    except OperationalError:
+        return False
+
+
+def database_url_for(name, url=database_url):
+    """Строка подключения к другой базе на том же сервере"""
+    return make_url(url).set(database=name).render_as_string(hide_password=False)
+
+
+def admin_engine(url=database_url):
+    """Движок служебной базы в режиме AUTOCOMMIT: CREATE/DROP DATABASE вне транзакции"""
+    return create_engine(database_url_for(MAINTENANCE_DB, url), isolation_level="AUTOCOMMIT", poolclass=NullPool)
+
+
+def drop_database(admin, name):
+    """Удаляет базу, принудительно закрывая соединения (PostgreSQL 13+)"""
+    with admin.connect() as connection:
+        is_template = connection.execute(
+            text("SELECT datistemplate FROM pg_database WHERE datname = :name"), {"name": name}
+        ).scalar()
+        if is_template:
+            # Шаблонную базу нельзя удалить, пока с неё не снят признак шаблона
+            connection.execute(text(f'ALTER DATABASE "{name}" WITH IS_TEMPLATE false'))
+        connection.execute(text(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)'))
+
+
+def drop_databases_like(admin, prefix):
+    """Удаляет базы, оставшиеся от прерванных прогонов"""
+    with admin.connect() as connection:
+        names = connection.execute(
+            text("SELECT datname FROM pg_database WHERE datname LIKE :pattern"), {"pattern": prefix.replace("_", "\\_") + "%"}
+        ).scalars().all()
+    for name in names:
+        drop_database(admin, name)
+
+
+def create_schema(bind):
+    """Создаёт схему bookings, расширение pg_trgm и таблицы из models.py (без представлений)"""
+    with bind.begin() as connection:
+        connection.execute(text(f"CREATE SCHEMA IF NOT EXISTS {SCHEMA}"))
+        # Операторный класс gin_trgm_ops индекса по tickets.passenger_name
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        tables = [table for table in metadata.sorted_tables if table.name not in VIEWS]
+        metadata.create_all(connection, tables=tables)
+
+
+def build_template(admin, name, seed=None, url=database_url):
+    """
+    Создаёт шаблонную базу со схемой и тестовыми данными
+
+    Args:
+        admin: Движок служебной базы из admin_engine()
+        name (str): Имя шаблонной базы
+        seed: Функция seed(connection) для заполнения данными или None
+        url (str): Строка подключения, по образцу которой строится подключение к шаблону
+    """
+    drop_database(admin, name)
+    with admin.connect() as connection:
+        connection.execute(text(f'CREATE DATABASE "{name}"'))
+
+    template_engine = create_engine(database_url_for(name, url), poolclass=NullPool)
+    try:
+        create_schema(template_engine)
+        if seed is not None:
+            with template_engine.begin() as connection:
+                seed(connection)
+    finally:
+        # У шаблона не должно остаться соединений, иначе клонирование завершится ошибкой
+        template_engine.dispose()
+
+    with admin.connect() as connection:
+        connection.execute(text(f'ALTER DATABASE "{name}" WITH IS_TEMPLATE true'))
+
+
+class ClonePool:
+    """Пул заранее созданных клонов шаблонной базы"""
+
+    def __init__(self, admin, template, prefix, size=DEFAULT_POOL_SIZE):
+        self.admin = admin
+        self.template = template
+        self.prefix = prefix
+        self._ready = queue.Queue()
+        self._counter = itertools.count()
+        # Один фоновый поток: клонирование одного шаблона параллельно не выполняется
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-clone")
+        for _ in range(size):
+            self._executor.submit(self._create_clone)
+
+    def _create_clone(self):
+        name = f"{self.prefix}{next(self._counter)}"
+        try:
+            with self.admin.connect() as connection:
+                connection.execute(text(f'CREATE DATABASE "{name}" TEMPLATE "{self.template}"'))
+        except Exception as e:
+            self._ready.put(e)
+        else:
+            self._ready.put(name)
+
+    def acquire(self):
+        """Выдаёт готовый клон и заказывает создание следующего"""
+        name = self._ready.get()
+        self._executor.submit(self._create_clone)
+        if isinstance(name, Exception):
+            raise name
+        return name
+
+    def release(self, name):
+        """Удаляет использованный клон в фоне"""
+        self._executor.submit(drop_database, self.admin, name)
+
+    def close(self):
+        """Дожидается фоновых операций и удаляет невыданные клоны"""
+        self._executor.shutdown(wait=True)
+        while not self._ready.empty():
+            name = self._ready.get_nowait()
+            if not isinstance(name, Exception):
+                drop_database(self.admin, name)
+
+
+def _database_prefix():
+    """Префикс имён баз: своя группа баз у каждого воркера xdist"""
+    worker_id = os.environ.get("PYTEST_XDIST_WORKER", "master")
+    return f"{make_url(database_url).database}_test_{worker_id}_"
+
+
+@pytest.fixture(scope="session")
+def db_seed():
+    """Заполнение шаблона данными; переопределите в conftest.py, вернув функцию seed(connection)"""
+    return None
+
+
+@pytest.fixture(scope="session")
+def db_admin_engine():
+    """Движок служебной базы для создания и удаления тестовых баз"""
+    admin = admin_engine()
+    yield admin
+    admin.dispose()
+
+
+@pytest.fixture(scope="session")
+def db_template(db_admin_engine, db_seed):
+    """Шаблонная база со схемой и данными, создаётся один раз за сессию (воркер)"""
+    prefix = _database_prefix()
+    drop_databases_like(db_admin_engine, prefix)
+    name = f"{prefix}template"
+    build_template(db_admin_engine, name, db_seed)
+    yield name
+    drop_database(db_admin_engine, name)
+
+
+@pytest.fixture(scope="session")
+def db_clone_pool(db_admin_engine, db_template):
+    """Пул клонов шаблона; размер задаётся переменной TEST_DB_POOL_SIZE"""
+    size = int(os.environ.get("TEST_DB_POOL_SIZE", DEFAULT_POOL_SIZE))
+    pool = ClonePool(db_admin_engine, db_template, f"{_database_prefix()}clone_", size)
+    yield pool
+    pool.close()
+
+
+@pytest.fixture
+def db_url(db_clone_pool):
+    """Строка подключения к чистому клону шаблона, своему для каждого теста"""
+    name = db_clone_pool.acquire()
+    yield database_url_for(name)
+    db_clone_pool.release(name)
+
+
+@pytest.fixture
+def db_engine(db_url):
+    """Движок, подключённый к клону; без пула соединений, чтобы клон можно было удалить"""
+    bind = create_engine(db_url, poolclass=NullPool)
+    yield bind
+    bind.dispose()
+
+
+@pytest.fixture(scope="session")
+def db_bind():
+    """Синхронный движок для db_session; по умолчанию - общий движок проекта"""
+    return engine
+
+
+@pytest.fixture(scope="session")
+def db_async_bind():
+    """
+    Асинхронный движок для db_async_session
+
+    Без пула соединений: pytest-asyncio создаёт свой цикл событий на каждый
+    тест, а соединения asyncpg привязаны к циклу, в котором открыты.
+    """
+    return create_async_engine(database_url_async, poolclass=NullPool)
+
+
+@pytest.fixture
+def db_session(db_bind):
+    """Сессия внутри внешней транзакции: commit() создаёт SAVEPOINT, в конце теста - откат"""
+    connection = db_bind.connect()
+    transaction = connection.begin()
+    session = Session(bind=connection, join_transaction_mode="create_savepoint")
+    try:
+        yield session
+    finally:
+        session.close()
+        transaction.rollback()
+        connection.close()
+
+
+@pytest_asyncio.fixture
+async def db_async_session(db_async_bind):
+    """Асинхронный вариант db_session"""
+    async with db_async_bind.connect() as connection:
+        transaction = await connection.begin()
+        session = AsyncSession(bind=connection, join_transaction_mode="create_savepoint", expire_on_commit=False)
+        try:
+            yield session
+        finally:
+            await session.close()
+            await transaction.rollback()
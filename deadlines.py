@@ -0,0 +1,221 @@
+"""
+Дедлайны запросов: statement_timeout, отмена на сервере и передача бюджета
+
+Дедлайн задаётся контекстным менеджером deadline(seconds) и хранится в
+contextvar, поэтому действует на все запросы внутри блока, включая вложенные
+функции и задачи asyncio, созданные в нём. Вложенный deadline() может только
+сократить оставшийся бюджет, но не продлить его.
+
+Каждый запрос через execute() / stream():
+- получает SET LOCAL statement_timeout по оставшемуся бюджету - сервер сам
+  прервёт запрос, даже если клиент завис; после запроса прежнее значение
+  восстанавливается, и следующие запросы той же транзакции (в том числе без
+  дедлайна) не наследуют чужой бюджет;
+- при отмене задачи asyncio (Ctrl-C, asyncio.timeout, cancel()) отменяется и
+  на сервере через pg_cancel_backend с отдельного соединения, а соединение
+  запроса выбрасывается из пула;
+- при истечении бюджета завершается исключением DeadlineExceeded.
+"""
+
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# SQLSTATE query_canceled: statement_timeout или pg_cancel_backend
+QUERY_CANCELED = "57014"
+# Запас клиентского таймаута сверх statement_timeout: сервер должен успеть прервать запрос сам
+CLIENT_GRACE_SECONDS = 1.0
+DEFAULT_PARTITION_SIZE = 1_000
+
+_deadline = ContextVar("deadline", default=None)
+
+# Прежнее значение читается в том же запросе, до установки нового
+SET_STATEMENT_TIMEOUT = text(
+    "SELECT current_setting('statement_timeout'), set_config('statement_timeout', :ms, true)")
+RESTORE_STATEMENT_TIMEOUT = text("SELECT set_config('statement_timeout', :previous, true)")
+
+
+class DeadlineExceeded(TimeoutError):
+    """Бюджет времени исчерпан"""
+
+
+@contextmanager
+def deadline(seconds):
+    """Ограничивает время всех запросов внутри блока; None - без ограничения"""
+    if seconds is None:
+        yield
+        return
+    current = _deadline.get()
+    new = time.monotonic() + seconds
+    token = _deadline.set(new if current is None else min(current, new))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def _expires(timeout):
+    """Момент истечения (time.monotonic()) с учётом текущего дедлайна и timeout или None"""
+    current = _deadline.get()
+    if timeout is None:
+        return current
+    new = time.monotonic() + timeout
+    return new if current is None else min(current, new)
+
+
+def _left(expires):
+    """Оставшийся до expires бюджет или None; если бюджет исчерпан - DeadlineExceeded"""
+    if expires is None:
+        return None
+    left = expires - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceeded("Бюджет времени запроса исчерпан")
+    return left
+
+
+def remaining():
+    """Оставшийся бюджет в секундах или None; если бюджет исчерпан - DeadlineExceeded"""
+    return _left(_deadline.get())
+
+
+def _timeout_ms(budget):
+    return str(max(1, int(budget * 1000)))
+
+
+@contextmanager
+def statement_timeout(connection):
+    """
+    statement_timeout по оставшемуся бюджету для запросов блока синхронного соединения
+
+    После блока восстанавливается прежнее значение; если запрос блока
+    завершился ошибкой, транзакция прервана, и значение вернёт её откат.
+
+    Yields:
+        float | None: Оставшийся бюджет
+    """
+    budget = remaining()
+    if budget is None:
+        yield None
+        return
+    previous = connection.execute(SET_STATEMENT_TIMEOUT, {"ms": _timeout_ms(budget)}).scalar()
+    yield budget
+    connection.execute(RESTORE_STATEMENT_TIMEOUT, {"previous": previous})
+
+
+def _is_query_canceled(error):
+    return getattr(error.orig, "sqlstate", None) == QUERY_CANCELED or \
+        getattr(error.orig, "pgcode", None) == QUERY_CANCELED
+
+
+async def _prepare(target, expires):
+    """
+    Соединение запроса: statement_timeout по бюджету до expires и PID серверного процесса для отмены
+
+    Returns:
+        tuple: (соединение, бюджет или None, PID, прежний statement_timeout или None)
+    """
+    connection = await target.connection() if isinstance(target, AsyncSession) else target
+    budget = _left(expires)
+    previous = None
+    if budget is not None:
+        previous = (await connection.execute(SET_STATEMENT_TIMEOUT, {"ms": _timeout_ms(budget)})).scalar()
+    pid = connection.info.get("backend_pid")
+    if pid is None:
+        pid = connection.info["backend_pid"] = await connection.scalar(select(func.pg_backend_pid()))
+    return connection, budget, pid, previous
+
+
+async def _restore(connection, previous):
+    """Возвращает statement_timeout, который действовал до _prepare()"""
+    if previous is not None:
+        await connection.execute(RESTORE_STATEMENT_TIMEOUT, {"previous": previous})
+
+
+async def cancel_backend(connection, pid):
+    """Отменяет запрос серверного процесса pid с отдельного соединения и выбрасывает соединение запроса"""
+    async with connection.engine.connect() as control:
+        await control.execute(select(func.pg_cancel_backend(pid)))
+    # Состояние протокола после отмены не определено - соединение в пул не возвращается
+    await connection.invalidate()
+
+
+async def _cancel_quietly(connection, pid):
+    try:
+        await asyncio.shield(cancel_backend(connection, pid))
+    except Exception:
+        pass
+
+
+async def execute(target, stmt, params=None, timeout=None):
+    """
+    Выполняет запрос с учётом дедлайна
+
+    Args:
+        target: AsyncSession или AsyncConnection
+        stmt: Запрос SQLAlchemy
+        params: Параметры запроса
+        timeout (float): Дополнительное ограничение для этого запроса, с
+    """
+    with deadline(timeout):
+        connection, budget, pid, previous = await _prepare(target, _deadline.get())
+        try:
+            async with asyncio.timeout(None if budget is None else budget + CLIENT_GRACE_SECONDS):
+                result = await target.execute(stmt, params)
+        except (asyncio.CancelledError, TimeoutError):
+            await _cancel_quietly(connection, pid)
+            if budget is not None and _deadline.get() <= time.monotonic():
+                raise DeadlineExceeded("Бюджет времени запроса исчерпан") from None
+            raise
+        except DBAPIError as e:
+            if _is_query_canceled(e):
+                raise DeadlineExceeded("Запрос прерван по statement_timeout") from e
+            raise
+        # Результат execute() уже выбран целиком - ограничение больше не нужно
+        await _restore(connection, previous)
+        return result
+
+
+async def scalar(target, stmt, params=None, timeout=None):
+    """execute() с возвратом первого значения первой строки"""
+    return (await execute(target, stmt, params, timeout)).scalar()
+
+
+async def stream(target, stmt, params=None, timeout=None, partition_size=DEFAULT_PARTITION_SIZE):
+    """
+    Потоково выполняет запрос с учётом дедлайна и выдаёт строки
+
+    Бюджет проверяется перед каждой порцией строк; каждая выборка порции из
+    серверного курсора ограничена statement_timeout. Дедлайн вычисляется при
+    запуске и не устанавливается в контексте: код, получающий строки между
+    порциями, timeout этого запроса не ограничивает.
+    """
+    expires = _expires(timeout)
+    connection, _, pid, previous = await _prepare(target, expires)
+    result = None
+    failed = False
+    try:
+        result = await target.stream(stmt, params)
+        async for partition in result.partitions(partition_size):
+            for row in partition:
+                yield row
+            _left(expires)
+    except asyncio.CancelledError:
+        await _cancel_quietly(connection, pid)
+        raise
+    except DBAPIError as e:
+        # Транзакция прервана - statement_timeout вернёт её откат
+        failed = True
+        if _is_query_canceled(e):
+            raise DeadlineExceeded("Запрос прерван по statement_timeout") from e
+        raise
+    finally:
+        if not connection.invalidated:
+            if result is not None:
+                await result.close()
+            if not failed:
+                await _restore(connection, previous)
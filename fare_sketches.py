@@ -0,0 +1,320 @@
+"""
+Квантили и гистограммы цен сегментов на потоковых скетчах KLL
+
+Segments.price сканируется параллельно по шардам flight_id (см.
+parallel_scan), и для каждой пары (fare_conditions, route_no) цены
+складываются в скетч KLL. Память скетча ограничена (примерно 3k значений при
+любом объёме данных), ошибка ранга - порядка 1/k. Скетчи шардов
+объединяются слиянием, а общий набор сохраняется в .npz вместе с моментом,
+до которого учтены бронирования: ежедневное обновление сканирует только
+сегменты бронирований, оформленных после этого момента (окно TimeWindow),
+и сливает их со старыми скетчами. Полная сортировка таблицы segments не
+нужна ни при первом расчёте, ни при обновлениях.
+
+Изменения цен в уже учтённых бронированиях при обновлении не видны - для
+них нужен полный пересчёт (--rebuild).
+
+Запуск:
+    python fare_sketches.py --rebuild     # полный расчёт
+    python fare_sketches.py               # учесть новые бронирования и показать отчёт
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import BigInteger, cast, select
+
+from models import Bookings, Flights, Segments, Tickets
+from parallel_scan import key_shards, parallel_scan
+from time_range import TimeWindow, in_window
+
+DEFAULT_K = 200
+MIN_CAPACITY = 2
+# Коэффициент уменьшения ёмкости уровней KLL сверху вниз
+CAPACITY_DECAY = 2 / 3
+
+DEFAULT_STORE = Path(".cache") / "fare_sketches.npz"
+QUANTILES = (0.5, 0.9, 0.99)
+SHARDS_PER_WORKER = 4
+
+
+class KLLSketch:
+    """
+    Скетч квантилей KLL
+
+    Уровень h хранит значения с весом 2^h. Переполненный уровень сортируется,
+    и каждое второе значение (со случайным сдвигом) переходит на уровень выше
+    с удвоенным весом; при нечётном размере одно значение остаётся на месте,
+    поэтому сумма весов всегда равна количеству добавленных значений.
+
+    Сдвиг выбирает собственный генератор скетча: у общего модуля random
+    состояние одинаково во всех рабочих процессах, созданных fork, и скетчи
+    шардов сжимались бы одинаково. Без seed генератор инициализируется из
+    os.urandom.
+    """
+
+    def __init__(self, k=DEFAULT_K, seed=None):
+        self.k = k
+        self._random = random.Random(seed)
+        self.levels = [np.empty(0)]
+        self.n = 0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def __len__(self):
+        return self.n
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(MIN_CAPACITY, int(np.ceil(self.k * CAPACITY_DECAY ** depth)))
+
+    def _compress(self):
+        compacted = True
+        while compacted:
+            compacted = False
+            for level in range(len(self.levels)):
+                items = self.levels[level]
+                if len(items) <= self._capacity(level):
+                    continue
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                rest = len(items) % 2
+                self.levels[level] = items[len(items) - rest:]
+                promoted = items[self._random.getrandbits(1):len(items) - rest:2]
+                self.levels[level + 1] = np.concatenate((self.levels[level + 1], promoted))
+                compacted = True
+
+    def update(self, values):
+        """Добавляет массив значений"""
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return self
+        self.n += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.levels[0] = np.concatenate((self.levels[0], values))
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """Сливает другой скетч в этот; результат эквивалентен скетчу объединённых данных"""
+        if other.n == 0:
+            return self
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate((self.levels[level], items))
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def _sorted(self):
+        """Значения по возрастанию и накопленные веса"""
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2 ** level, dtype=np.int64)
+                                  for level, items in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        return values[order], np.cumsum(weights[order])
+
+    def quantiles(self, qs):
+        """Оценки квантилей qs (доли от 0 до 1)"""
+        if self.n == 0:
+            return np.full(len(qs), np.nan)
+        values, cumulative = self._sorted()
+        ranks = np.asarray(qs, dtype=np.float64) * cumulative[-1]
+        positions = np.minimum(np.searchsorted(cumulative, ranks, side="left"), len(values) - 1)
+        result = values[positions]
+        # Крайние квантили известны точно
+        result[np.asarray(qs) <= 0] = self.min
+        result[np.asarray(qs) >= 1] = self.max
+        return result
+
+    def cdf(self, points):
+        """Доля значений, не превышающих каждую из points"""
+        if self.n == 0:
+            return np.full(len(points), np.nan)
+        values, cumulative = self._sorted()
+        positions = np.searchsorted(values, np.asarray(points, dtype=np.float64), side="right")
+        return np.concatenate(([0], cumulative))[positions] / cumulative[-1]
+
+    def histogram(self, bins=10):
+        """
+        Гистограмма с равными интервалами от min до max
+
+        Returns:
+            tuple: (оценки количества значений в интервалах, границы интервалов)
+        """
+        edges = np.linspace(self.min, self.max, bins + 1)
+        fractions = self.cdf(edges)
+        fractions[0] = 0.0
+        return np.diff(fractions) * self.n, edges
+
+
+def segment_prices(until, since=None):
+    """
+    Цены сегментов (в копейках) с классом обслуживания и маршрутом
+
+    Args:
+        until (datetime): Учитываются бронирования, оформленные раньше этого момента
+        since (datetime): ... и не раньше этого; None - без нижней границы
+    """
+    if since is None:
+        booked = Bookings.book_date < until
+    else:
+        booked = in_window(Bookings.book_date, TimeWindow(since, until))
+    return (
+        select(Segments.fare_conditions, Flights.route_no, cast(Segments.price * 100, BigInteger))
+        .join(Flights, Flights.flight_id == Segments.flight_id)
+        .join(Tickets, Tickets.ticket_no == Segments.ticket_no)
+        .join(Bookings, Bookings.book_ref == Tickets.book_ref)
+        .where(booked)
+    )
+
+
+def sketch_batch(batch, k=DEFAULT_K):
+    """Скетчи по (fare_conditions, route_no) для пачки строк (fare_conditions, route_no, цена)"""
+    groups = {}
+    for fare_conditions, route_no, price in batch:
+        groups.setdefault((fare_conditions, route_no), []).append(price)
+    return {key: KLLSketch(k).update(prices) for key, prices in groups.items()}
+
+
+def merge_sketches(accumulator, partial):
+    for key, sketch in partial.items():
+        if key in accumulator:
+            accumulator[key].merge(sketch)
+        else:
+            accumulator[key] = sketch
+    return accumulator
+
+
+def scan_sketches(until, since=None, workers=None):
+    """Параллельно строит скетчи цен по сегментам бронирований из [since, until)"""
+    workers = workers or os.cpu_count() or 1
+    shards = key_shards(Segments.flight_id, workers * SHARDS_PER_WORKER)
+    return parallel_scan(segment_prices(until, since), Segments.flight_id, shards,
+                         sketch_batch, merge_sketches, dict, workers=workers)
+
+
+class SketchStore:
+    """Скетчи цен по (fare_conditions, route_no) и момент, до которого учтены бронирования"""
+
+    def __init__(self, sketches=None, covered_until=None, k=DEFAULT_K):
+        self.sketches = sketches or {}
+        self.covered_until = covered_until
+        self.k = k
+
+    def refresh(self, until=None, workers=None):
+        """Учитывает бронирования от covered_until до until (по умолчанию - сейчас)"""
+        until = until or datetime.now(timezone.utc)
+        if self.covered_until is not None and self.covered_until >= until:
+            return 0
+        partial = scan_sketches(until, self.covered_until, workers)
+        merge_sketches(self.sketches, partial)
+        self.covered_until = until
+        return sum(sketch.n for sketch in partial.values())
+
+    def by_fare_conditions(self):
+        """Скетчи по классу обслуживания - слияние скетчей всех маршрутов"""
+        merged = {}
+        for (fare_conditions, _), sketch in self.sketches.items():
+            merged.setdefault(fare_conditions, KLLSketch(self.k)).merge(sketch)
+        return merged
+
+    def save(self, path=DEFAULT_STORE):
+        """Сохраняет скетчи атомарно: запись во временный файл и замена"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        entries, values = [], []
+        for (fare_conditions, route_no), sketch in self.sketches.items():
+            entries.append([fare_conditions, route_no, sketch.n, sketch.min, sketch.max,
+                            [len(items) for items in sketch.levels]])
+            values.extend(sketch.levels)
+        meta = {
+            "k": self.k,
+            "covered_until": self.covered_until.isoformat() if self.covered_until else None,
+            "sketches": entries,
+        }
+        temporary = path.with_name(path.name + ".tmp")
+        with open(temporary, "wb") as f:
+            np.savez(f, meta=np.array(json.dumps(meta, ensure_ascii=False)),
+                     values=np.concatenate(values) if values else np.empty(0))
+        os.replace(temporary, path)
+        return path
+
+    @classmethod
+    def load(cls, path=DEFAULT_STORE):
+        """Загружает сохранённые скетчи; если файла нет - пустой набор"""
+        path = Path(path)
+        if not path.exists():
+            return cls()
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            values = data["values"]
+        sketches = {}
+        offset = 0
+        for fare_conditions, route_no, n, low, high, sizes in meta["sketches"]:
+            sketch = KLLSketch(meta["k"])
+            sketch.n, sketch.min, sketch.max = n, low, high
+            sketch.levels = []
+            for size in sizes:
+                sketch.levels.append(values[offset:offset + size])
+                offset += size
+            sketches[(fare_conditions, route_no)] = sketch
+        covered_until = meta["covered_until"] and datetime.fromisoformat(meta["covered_until"])
+        return cls(sketches, covered_until, meta["k"])
+
+
+def print_report(store, top_routes=10):
+    """Квантили и гистограммы по классам обслуживания, квантили самых загруженных маршрутов"""
+    print(f"Учтены бронирования до {store.covered_until}; скетчей: {len(store.sketches)}")
+    header = "  ".join(f"p{round(q * 100):<9}" for q in QUANTILES)
+    for fare_conditions, sketch in sorted(store.by_fare_conditions().items()):
+        quantiles = sketch.quantiles(QUANTILES) / 100
+        print(f"\n{fare_conditions}: {sketch.n} сегментов, {sketch.min / 100:.2f} - {sketch.max / 100:.2f}")
+        print(f"  {header}")
+        print("  " + "  ".join(f"{value:<10.2f}" for value in quantiles))
+        counts, edges = sketch.histogram()
+        for count, low, high in zip(counts, edges[:-1] / 100, edges[1:] / 100):
+            print(f"  {low:>10.2f} - {high:<10.2f} {count:>12.0f}")
+
+    print("\nМаршруты с наибольшим числом сегментов:")
+    print(f"  {'Маршрут':<8} {'Класс':<10} {'Сегментов':>10}  {header}")
+    busiest = sorted(store.sketches.items(), key=lambda item: item[1].n, reverse=True)[:top_routes]
+    for (fare_conditions, route_no), sketch in busiest:
+        quantiles = sketch.quantiles(QUANTILES) / 100
+        print(f"  {route_no:<8} {fare_conditions:<10} {sketch.n:>10}  "
+              + "  ".join(f"{value:<10.2f}" for value in quantiles))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Квантили цен сегментов на скетчах KLL")
+    parser.add_argument("--store", type=Path, default=DEFAULT_STORE, help="Файл сохранённых скетчей")
+    parser.add_argument("--rebuild", action="store_true", help="Пересчитать скетчи по всем бронированиям")
+    parser.add_argument("--workers", type=int, default=None, help="Количество параллельных соединений")
+    args = parser.parse_args()
+
+    try:
+        store = SketchStore() if args.rebuild else SketchStore.load(args.store)
+        started = time.perf_counter()
+        added = store.refresh(workers=args.workers)
+        store.save(args.store)
+        print(f"Добавлено сегментов: {added} за {time.perf_counter() - started:.1f} с")
+    except Exception as e:
+        print(f"Ошибка при выполнении запроса: {e}")
+        return
+
+    print_report(store)
+
+
+if __name__ == "__main__":
+    main()
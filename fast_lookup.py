@@ -0,0 +1,350 @@
+"""
+Быстрые точечные выборки через asyncpg без ORM
+
+Для самых частых запросов - бронирование по book_ref, билет по ticket_no,
+посадочный талон по (ticket_no, flight_id) - накладные расходы ORM
+(компиляция запроса, identity map, создание объектов модели) больше, чем
+время самого запроса. LookupRepository выполняет их напрямую через пул
+asyncpg:
+- настройки подключения берутся из config.DBSettings;
+- тексты запросов постоянные, поэтому asyncpg готовит каждый из них один раз
+  на соединение и дальше выполняет подготовленный оператор из своего кэша;
+- строки возвращаются именованными кортежами с теми же полями и типами, что
+  и колонки классов models.py (Decimal, datetime с часовым поясом).
+
+Пакетные выборки (bookings(), tickets(), tickets_by_booking()) принимают
+коллекцию ключей, убирают повторы и выполняют запросы WHERE key = ANY($1)
+порциями не больше MAX_BATCH_KEYS ключей; результат - словарь по ключу.
+BatchLoader в стиле DataLoader собирает ключи, запрошенные параллельными
+корутинами за один проход цикла событий, в один такой запрос - вместо
+N запросов по одному ключу (N+1) выполняется один.
+
+Запуск (сравнение с ORM):
+    python fast_lookup.py --seconds 10 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import time
+from collections import namedtuple
+
+import asyncpg
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from config import db
+from database import database_url_async
+from models import BoardingPasses, Bookings, Tickets
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_SECONDS = 10
+DEFAULT_CONCURRENCY = 16
+DEFAULT_SAMPLE_KEYS = 10_000
+# Больше ключей в одном запросе = ANY($1) - дольше план и передача массива без выигрыша
+MAX_BATCH_KEYS = 1_000
+
+
+def row_type(name, model):
+    """Именованный кортеж с полями таблицы модели в порядке колонок"""
+    return namedtuple(name, [column.name for column in model.__table__.columns])
+
+
+BookingRow = row_type("BookingRow", Bookings)
+TicketRow = row_type("TicketRow", Tickets)
+BoardingPassRow = row_type("BoardingPassRow", BoardingPasses)
+
+
+def select_sql(model, keys):
+    """SELECT всех колонок таблицы модели по равенству ключевых колонок ($1, $2, ...)"""
+    table = model.__table__
+    condition = " AND ".join(f"{key} = ${i}" for i, key in enumerate(keys, 1))
+    return f"SELECT {', '.join(column.name for column in table.columns)} FROM {table.fullname} WHERE {condition}"
+
+
+def select_any_sql(model, key):
+    """SELECT всех колонок таблицы модели для значений колонки key из массива $1"""
+    return select_sql(model, [key]).replace(f"{key} = $1", f"{key} = ANY($1)")
+
+
+BOOKING_SQL = select_sql(Bookings, ["book_ref"])
+TICKET_SQL = select_sql(Tickets, ["ticket_no"])
+BOARDING_PASS_SQL = select_sql(BoardingPasses, ["ticket_no", "flight_id"])
+BOOKINGS_SQL = select_any_sql(Bookings, "book_ref")
+TICKETS_SQL = select_any_sql(Tickets, "ticket_no")
+TICKETS_BY_BOOKING_SQL = select_any_sql(Tickets, "book_ref")
+
+
+def chunks(keys, size=MAX_BATCH_KEYS):
+    """Уникальные ключи (в порядке первого появления) порциями не больше size"""
+    unique = list(dict.fromkeys(keys))
+    return [unique[i:i + size] for i in range(0, len(unique), size)]
+
+
+def connect_kwargs(settings=db):
+    """Параметры asyncpg.connect / create_pool из DBSettings"""
+    return {
+        "host": settings.postgres_host,
+        "port": settings.postgres_port,
+        "user": settings.postgres_user,
+        "password": settings.postgres_password,
+        "database": settings.postgres_db,
+    }
+
+
+class LookupRepository:
+    """
+    Точечные выборки по первичным ключам через пул asyncpg
+
+    Args:
+        pool: Пул asyncpg.Pool; обычно создаётся через LookupRepository.create()
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    @classmethod
+    async def create(cls, settings=db, pool_size=DEFAULT_POOL_SIZE, **pool_kwargs):
+        """Создаёт репозиторий с собственным пулом asyncpg на pool_size соединений"""
+        pool = await asyncpg.create_pool(min_size=1, max_size=pool_size, **connect_kwargs(settings), **pool_kwargs)
+        return cls(pool)
+
+    async def close(self):
+        await self.pool.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _fetch_one(self, row, sql, *args):
+        record = await self.pool.fetchrow(sql, *args)
+        return None if record is None else row._make(record)
+
+    async def booking(self, book_ref):
+        """Бронирование BookingRow или None"""
+        return await self._fetch_one(BookingRow, BOOKING_SQL, book_ref)
+
+    async def ticket(self, ticket_no):
+        """Билет TicketRow или None"""
+        return await self._fetch_one(TicketRow, TICKET_SQL, ticket_no)
+
+    async def boarding_pass(self, ticket_no, flight_id):
+        """Посадочный талон BoardingPassRow или None"""
+        return await self._fetch_one(BoardingPassRow, BOARDING_PASS_SQL, ticket_no, flight_id)
+
+    async def _fetch_chunks(self, row, sql, keys):
+        """Строки по всем порциям ключей; порции выполняются параллельно на соединениях пула"""
+        results = await asyncio.gather(*(self.pool.fetch(sql, chunk) for chunk in chunks(keys)))
+        return [row._make(record) for records in results for record in records]
+
+    async def bookings(self, book_refs):
+        """Бронирования по номерам: {book_ref: BookingRow}; ненайденных номеров в словаре нет"""
+        return {row.book_ref: row for row in await self._fetch_chunks(BookingRow, BOOKINGS_SQL, book_refs)}
+
+    async def tickets(self, ticket_nos):
+        """Билеты по номерам: {ticket_no: TicketRow}; ненайденных номеров в словаре нет"""
+        return {row.ticket_no: row for row in await self._fetch_chunks(TicketRow, TICKETS_SQL, ticket_nos)}
+
+    async def tickets_by_booking(self, book_refs):
+        """Билеты бронирований: {book_ref: [TicketRow, ...]}; у бронирований без билетов - пустой список"""
+        grouped = {book_ref: [] for book_ref in book_refs}
+        for row in await self._fetch_chunks(TicketRow, TICKETS_BY_BOOKING_SQL, book_refs):
+            grouped[row.book_ref].append(row)
+        return grouped
+
+
+class BatchLoader:
+    """
+    Объединяет одиночные запросы ключей в пакетные (по образцу DataLoader)
+
+    load(key) откладывает ключ и планирует выборку на конец текущего прохода
+    цикла событий; все ключи, запрошенные к этому моменту любыми корутинами,
+    уходят одним вызовом batch(keys). Результаты кэшируются на время жизни
+    загрузчика, поэтому загрузчик создаётся на запрос (см. Loaders), а не
+    на всё приложение.
+
+    Args:
+        batch: Корутина batch(keys) -> {key: value}; отсутствующий ключ даёт None
+    """
+
+    def __init__(self, batch):
+        self.batch = batch
+        self._cache = {}
+        self._pending = {}
+        # Ссылки на выполняющиеся выборки, чтобы задачи не собрал сборщик мусора
+        self._tasks = set()
+
+    def load(self, key):
+        """Future со значением ключа"""
+        future = self._cache.get(key)
+        if future is None:
+            future = self._cache[key] = asyncio.get_running_loop().create_future()
+            if not self._pending:
+                asyncio.get_running_loop().call_soon(self._dispatch)
+            self._pending[key] = future
+        return future
+
+    async def load_many(self, keys):
+        """Значения ключей в порядке keys"""
+        return await asyncio.gather(*(self.load(key) for key in keys))
+
+    def clear(self, key=None):
+        """Забывает значение ключа (или все значения), например после его изменения"""
+        if key is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(key, None)
+
+    def _dispatch(self):
+        pending, self._pending = self._pending, {}
+        task = asyncio.ensure_future(self._resolve(pending))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _resolve(self, pending):
+        try:
+            values = await self.batch(list(pending))
+        except Exception as e:
+            for key, future in pending.items():
+                # Ошибка не кэшируется: следующий load() запросит ключ снова
+                self._cache.pop(key, None)
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for key, future in pending.items():
+            if not future.done():
+                future.set_result(values.get(key))
+
+
+class Loaders:
+    """Загрузчики одного запроса (обработки одного обращения к приложению)"""
+
+    def __init__(self, repository):
+        self.booking = BatchLoader(repository.bookings)
+        self.ticket = BatchLoader(repository.tickets)
+        self.tickets_by_booking = BatchLoader(repository.tickets_by_booking)
+
+
+class OrmLookups:
+    """Те же выборки через AsyncSession - эталон для сравнения"""
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+
+    async def _fetch_one(self, row, stmt):
+        async with self.session_factory() as session:
+            instance = await session.scalar(stmt)
+        return None if instance is None else row._make(getattr(instance, name) for name in row._fields)
+
+    async def booking(self, book_ref):
+        return await self._fetch_one(BookingRow, select(Bookings).where(Bookings.book_ref == book_ref))
+
+    async def ticket(self, ticket_no):
+        return await self._fetch_one(TicketRow, select(Tickets).where(Tickets.ticket_no == ticket_no))
+
+    async def boarding_pass(self, ticket_no, flight_id):
+        return await self._fetch_one(BoardingPassRow, select(BoardingPasses).where(
+            BoardingPasses.ticket_no == ticket_no, BoardingPasses.flight_id == flight_id))
+
+
+async def sample_keys(repository, count=DEFAULT_SAMPLE_KEYS):
+    """Ключи для нагрузки: (book_ref, ticket_no, flight_id) существующих посадочных талонов"""
+    records = await repository.pool.fetch(
+        "SELECT t.book_ref, bp.ticket_no, bp.flight_id "
+        "FROM bookings.boarding_passes bp JOIN bookings.tickets t USING (ticket_no) LIMIT $1",
+        count,
+    )
+    return [tuple(record) for record in records]
+
+
+def lookup_calls(lookups, keys):
+    """Бесконечная последовательность выборок: по кругу бронирование, билет, посадочный талон"""
+    while True:
+        for book_ref, ticket_no, flight_id in keys:
+            yield lookups.booking(book_ref)
+            yield lookups.ticket(ticket_no)
+            yield lookups.boarding_pass(ticket_no, flight_id)
+
+
+async def measure(lookups, keys, seconds, concurrency):
+    """Запросов в секунду и задержки (с) при concurrency параллельных клиентах"""
+    latencies = []
+    deadline = time.perf_counter() + seconds
+
+    async def client(offset):
+        calls = lookup_calls(lookups, keys[offset:] + keys[:offset])
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            await next(calls)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(i * len(keys) // concurrency) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return len(latencies) / elapsed, np.array(latencies)
+
+
+async def compare_results(repository, orm, keys):
+    """Количество ключей, для которых два пути вернули разные строки"""
+    mismatches = 0
+    for book_ref, ticket_no, flight_id in keys:
+        for method, args in (("booking", (book_ref,)), ("ticket", (ticket_no,)),
+                             ("boarding_pass", (ticket_no, flight_id))):
+            if await getattr(repository, method)(*args) != await getattr(orm, method)(*args):
+                mismatches += 1
+    return mismatches
+
+
+async def main_async(args):
+    orm_engine = create_async_engine(database_url_async, pool_size=args.concurrency, max_overflow=0)
+    orm = OrmLookups(sessionmaker(orm_engine, class_=AsyncSession, expire_on_commit=False))
+    try:
+        async with await LookupRepository.create(pool_size=args.concurrency) as repository:
+            keys = await sample_keys(repository, args.keys)
+            if not keys:
+                print("Нет посадочных талонов для выборок")
+                return
+            mismatches = await compare_results(repository, orm, keys[:100])
+            print(f"Ключей: {len(keys)}, клиентов: {args.concurrency}, по {args.seconds} с, "
+                  f"расхождений с ORM: {mismatches}\n")
+            print(f"{'Способ':<10} {'Запросов/с':>12} {'p50, мс':>9} {'p99, мс':>9}")
+            print("-" * 43)
+            results = {}
+            for name, lookups in (("ORM", orm), ("asyncpg", repository)):
+                qps, latencies = await measure(lookups, keys, args.seconds, args.concurrency)
+                p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+                print(f"{name:<10} {qps:>12.0f} {p50:>9.2f} {p99:>9.2f}")
+                results[name] = qps
+            print(f"\nУскорение: {results['asyncpg'] / results['ORM']:.1f}x")
+
+            book_refs = [book_ref for book_ref, _, _ in keys]
+            started = time.perf_counter()
+            await asyncio.gather(*(repository.booking(book_ref) for book_ref in book_refs))
+            single_time = time.perf_counter() - started
+            started = time.perf_counter()
+            await Loaders(repository).booking.load_many(book_refs)
+            batch_time = time.perf_counter() - started
+            print(f"Бронирований по {len(book_refs)} ключам: по одному {single_time:.3f} с, "
+                  f"через BatchLoader {batch_time:.3f} с")
+    finally:
+        await orm_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Точечные выборки asyncpg в сравнении с ORM")
+    parser.add_argument("--seconds", type=float, default=DEFAULT_SECONDS, help="Длительность замера каждого способа, с")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Параллельных клиентов")
+    parser.add_argument("--keys", type=int, default=DEFAULT_SAMPLE_KEYS, help="Количество ключей для выборок")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(main_async(args))
+    except Exception as e:
+        print(f"Ошибка при выполнении запроса: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+Поток событий о статусах рейсов: симулятор и пакетный потребитель
+
+Симулятор ведёт в памяти состояние набора рейсов и с заданной частотой
+порождает переходы статуса по жизненному циклу рейса:
+
+    Scheduled -> On Time | Delayed | Cancelled
+    On Time   -> Delayed | Boarding
+    Delayed   -> Boarding | Cancelled
+    Boarding  -> Departed            (заполняется actual_departure)
+    Departed  -> Arrived             (заполняется actual_arrival)
+
+Событие несёт полное новое состояние рейса, поэтому из нескольких событий
+одного рейса в пачке достаточно применить последнее. Потребители собирают
+события в пачки (по размеру или по времени ожидания) и применяют каждую
+одним запросом UPDATE flights ... FROM (VALUES ...). Рейсы распределены
+между потребителями по flight_id, так что порядок событий рейса сохраняется.
+
+Раз в report_interval секунд печатаются частота событий и обновлений,
+средний размер пачки, глубина очередей и задержка (lag) от порождения
+события до фиксации его обновления. По умолчанию транзакции откатываются,
+чтобы не менять демо-базу; --commit фиксирует изменения.
+
+Запуск:
+    python flight_events.py --rate 5000 --consumers 4 --duration 60
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from collections import namedtuple
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+import numpy as np
+from sqlalchemy import DateTime, Integer, Text, cast, column, select, update, values
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from database import database_url_async
+from models import Flights
+
+TRANSITIONS = {
+    "Scheduled": (("On Time", 0.75), ("Delayed", 0.2), ("Cancelled", 0.05)),
+    "On Time": (("Boarding", 0.9), ("Delayed", 0.1)),
+    "Delayed": (("Boarding", 0.95), ("Cancelled", 0.05)),
+    "Boarding": (("Departed", 1.0),),
+    "Departed": (("Arrived", 1.0),),
+}
+ACTIVE_STATUSES = tuple(TRANSITIONS)
+
+DEFAULT_RATE = 1000
+DEFAULT_FLIGHTS = 10_000
+DEFAULT_CONSUMERS = 2
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_MAX_DELAY = 0.05
+DEFAULT_DURATION = 30
+DEFAULT_REPORT_INTERVAL = 5
+# Шаг, с которым симулятор порождает события
+TICK_SECONDS = 0.01
+MAX_DELAY_MINUTES = 180
+
+# Событие: новое состояние рейса и момент порождения (time.perf_counter())
+FlightEvent = namedtuple("FlightEvent", ["flight_id", "status", "actual_departure", "actual_arrival", "emitted_at"])
+
+
+@dataclass
+class FlightState:
+    flight_id: int
+    status: str
+    scheduled_departure: object
+    scheduled_arrival: object
+    actual_departure: object = None
+    actual_arrival: object = None
+
+
+@dataclass
+class Metrics:
+    """Счётчики симулятора и потребителей с момента последнего отчёта"""
+
+    emitted: int = 0
+    applied: int = 0
+    batches: int = 0
+    lags: list = field(default_factory=list)
+
+    def reset(self):
+        self.emitted = self.applied = self.batches = 0
+        self.lags = []
+
+
+def next_state(flight):
+    """Случайный переход рейса в следующий статус с заполнением фактических времён"""
+    statuses, weights = zip(*TRANSITIONS[flight.status])
+    flight.status = random.choices(statuses, weights)[0]
+    if flight.status == "Departed":
+        delay = timedelta(minutes=random.randint(0, MAX_DELAY_MINUTES))
+        flight.actual_departure = flight.scheduled_departure + delay
+    elif flight.status == "Arrived":
+        # flight_actual_check: прибытие строго позже вылета
+        duration = flight.scheduled_arrival - flight.scheduled_departure
+        if flight.actual_departure is None:
+            flight.actual_departure = flight.scheduled_departure
+        jitter = timedelta(minutes=random.randint(-10, 20))
+        flight.actual_arrival = flight.actual_departure + max(duration + jitter, timedelta(minutes=1))
+    return FlightEvent(flight.flight_id, flight.status, flight.actual_departure, flight.actual_arrival,
+                       time.perf_counter())
+
+
+async def load_active_flights(bind, count=DEFAULT_FLIGHTS):
+    """Рейсы в незавершённых статусах - начальное состояние симулятора"""
+    async with bind.connect() as connection:
+        rows = (await connection.execute(
+            select(Flights.flight_id, Flights.status, Flights.scheduled_departure, Flights.scheduled_arrival,
+                   Flights.actual_departure, Flights.actual_arrival)
+            .where(Flights.status.in_(ACTIVE_STATUSES))
+            .order_by(Flights.scheduled_departure)
+            .limit(count)
+        )).all()
+    return [FlightState(*row) for row in rows]
+
+
+async def simulate(flights, queues, rate, stop, metrics):
+    """Порождает события с частотой rate в секунду и раскладывает их по очередям потребителей"""
+    active = list(flights)
+    budget = 0.0
+    last = time.perf_counter()
+    while not stop.is_set() and active:
+        await asyncio.sleep(TICK_SECONDS)
+        now = time.perf_counter()
+        budget += (now - last) * rate
+        last = now
+        for _ in range(int(budget)):
+            if not active:
+                break
+            i = random.randrange(len(active))
+            event = next_state(active[i])
+            if active[i].status not in TRANSITIONS:
+                # Завершённый рейс выходит из симуляции
+                active[i] = active[-1]
+                active.pop()
+            queues[event.flight_id % len(queues)].put_nowait(event)
+            metrics.emitted += 1
+        budget -= int(budget)
+
+
+def batch_update(events):
+    """UPDATE flights ... FROM (VALUES ...) для пачки; из событий одного рейса берётся последнее"""
+    latest = {event.flight_id: event for event in events}
+    rows = values(
+        column("flight_id", Integer),
+        column("status", Text),
+        column("actual_departure", DateTime(True)),
+        column("actual_arrival", DateTime(True)),
+        name="changes",
+    ).data([(event.flight_id, event.status, event.actual_departure, event.actual_arrival)
+            for event in latest.values()])
+    # NULL в VALUES выводится как литерал без типа: если во всей колонке пачки NULL, она станет text
+    return (
+        update(Flights)
+        .where(Flights.flight_id == rows.c.flight_id)
+        .values(status=rows.c.status,
+                actual_departure=cast(rows.c.actual_departure, DateTime(True)),
+                actual_arrival=cast(rows.c.actual_arrival, DateTime(True)))
+    )
+
+
+async def next_batch(queue, batch_size, max_delay):
+    """Ждёт первое событие и добирает пачку до batch_size или до истечения max_delay"""
+    batch = [await queue.get()]
+    deadline = time.perf_counter() + max_delay
+    while len(batch) < batch_size:
+        timeout = deadline - time.perf_counter()
+        if timeout <= 0:
+            break
+        try:
+            batch.append(await asyncio.wait_for(queue.get(), timeout))
+        except asyncio.TimeoutError:
+            break
+    # Всё, что уже накопилось, забирается без ожидания
+    while len(batch) < batch_size and not queue.empty():
+        batch.append(queue.get_nowait())
+    return batch
+
+
+async def consume(bind, queue, metrics, batch_size=DEFAULT_BATCH_SIZE, max_delay=DEFAULT_MAX_DELAY, commit=False):
+    """Применяет события из очереди пачками, пока задача не будет отменена"""
+    async with bind.connect() as connection:
+        while True:
+            batch = await next_batch(queue, batch_size, max_delay)
+            transaction = await connection.begin()
+            try:
+                await connection.execute(batch_update(batch))
+            except BaseException:
+                await transaction.rollback()
+                raise
+            if commit:
+                await transaction.commit()
+            else:
+                await transaction.rollback()
+            applied_at = time.perf_counter()
+            metrics.applied += len(batch)
+            metrics.batches += 1
+            metrics.lags.extend(applied_at - event.emitted_at for event in batch)
+
+
+def print_report(metrics, queues, elapsed):
+    lags = np.array(metrics.lags) * 1000 if metrics.lags else np.array([np.nan])
+    p50, p99 = np.percentile(lags, [50, 99])
+    batch = metrics.applied / metrics.batches if metrics.batches else 0
+    print(f"{metrics.emitted / elapsed:>10.0f} {metrics.applied / elapsed:>12.0f} {batch:>8.1f} "
+          f"{sum(queue.qsize() for queue in queues):>8} {p50:>10.1f} {p99:>10.1f}")
+
+
+async def main_async(args):
+    bind = create_async_engine(database_url_async, pool_size=args.consumers + 1, max_overflow=0)
+    metrics = Metrics()
+    try:
+        flights = await load_active_flights(bind, args.flights)
+        if not flights:
+            print("Нет рейсов в незавершённых статусах")
+            return
+        print(f"Рейсов: {len(flights)}, частота: {args.rate}/с, потребителей: {args.consumers}, "
+              f"{'с фиксацией' if args.commit else 'с откатом транзакций'}\n")
+        print(f"{'Событий/с':>10} {'Обновлений/с':>12} {'Пачка':>8} {'Очередь':>8} {'lag p50, мс':>10} {'lag p99, мс':>10}")
+        print("-" * 64)
+
+        queues = [asyncio.Queue() for _ in range(args.consumers)]
+        stop = asyncio.Event()
+        consumers = [asyncio.create_task(consume(bind, queue, metrics, args.batch_size, args.max_delay, args.commit))
+                     for queue in queues]
+        simulator = asyncio.create_task(simulate(flights, queues, args.rate, stop, metrics))
+
+        started = time.perf_counter()
+        last_report = started
+        while time.perf_counter() - started < args.duration and not simulator.done():
+            # Потребитель завершается только с ошибкой - тогда отчёт не ждёт конца интервала
+            await asyncio.wait(consumers, timeout=min(args.report_interval, args.duration),
+                               return_when=asyncio.FIRST_COMPLETED)
+            now = time.perf_counter()
+            print_report(metrics, queues, now - last_report)
+            metrics.reset()
+            last_report = now
+            if any(task.done() for task in consumers):
+                break
+
+        stop.set()
+        await simulator
+        for task in consumers:
+            task.cancel()
+        for result in await asyncio.gather(*consumers, return_exceptions=True):
+            if isinstance(result, BaseException) and not isinstance(result, asyncio.CancelledError):
+                raise result
+    finally:
+        await bind.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Симулятор статусов рейсов и пакетный потребитель")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="Событий в секунду")
+    parser.add_argument("--flights", type=int, default=DEFAULT_FLIGHTS, help="Количество рейсов в симуляции")
+    parser.add_argument("--consumers", type=int, default=DEFAULT_CONSUMERS, help="Параллельных потребителей")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Максимальный размер пачки")
+    parser.add_argument("--max-delay", type=float, default=DEFAULT_MAX_DELAY, help="Ожидание добора пачки, с")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION, help="Длительность, с")
+    parser.add_argument("--report-interval", type=float, default=DEFAULT_REPORT_INTERVAL, help="Период отчёта, с")
+    parser.add_argument("--commit", action="store_true", help="Фиксировать обновления (по умолчанию - откат)")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(main_async(args))
+    except Exception as e:
+        print(f"Ошибка при выполнении симуляции: {e}")
+
+
+if __name__ == "__main__":
+    main()
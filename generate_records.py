@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Генерация лёгких классов записей records.py по метаданным models.py
+
+Для каждой таблицы и представления схемы создаётся замороженный dataclass со
+__slots__ (без __dict__ и состояния ORM), поля - колонки в порядке таблицы:
+- имя класса - имя класса ORM (Bookings, Flights, ...) или, для таблиц
+  Core (t_timetable, t_routes, ...), имя таблицы в CamelCase;
+- from_row() / from_rows() - из строк Core, выбранных select(<таблица>)
+  (порядок колонок совпадает с порядком полей);
+- to_dict() / from_dict() - словарь для JSON с преобразованиями значений,
+  вписанными в код каждого класса (Decimal - строка, время - ISO 8601,
+  интервал - секунды, диапазон - границы и скобки);
+- dumps() / loads() - JSON для записи или списка записей.
+
+Запуск:
+    python generate_records.py                  # перезаписать records.py
+    python generate_records.py --benchmark      # память и время JSON: ORM и записи
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from sqlalchemy import ARRAY, JSON, Boolean, DateTime, Integer, Interval, Numeric, String, Time
+from sqlalchemy.dialects.postgresql import INTERVAL
+from sqlalchemy.dialects.postgresql.ranges import AbstractRange
+
+from models import Base, Bookings, metadata
+
+DEFAULT_OUTPUT = "records.py"
+BENCHMARK_OBJECTS = 100_000
+
+HEADER = '''"""
+Лёгкие классы записей для таблиц и представлений схемы bookings
+
+Файл создан generate_records.py по метаданным models.py - не редактируйте
+его вручную, а перезапустите генератор после изменения моделей.
+"""
+
+import json
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from itertools import starmap
+
+from sqlalchemy.dialects.postgresql import Range
+
+
+def _encode_range(value):
+    if value.empty:
+        return {"empty": True}
+    return {
+        "lower": None if value.lower is None else value.lower.isoformat(),
+        "upper": None if value.upper is None else value.upper.isoformat(),
+        "bounds": value.bounds,
+    }
+
+
+def _decode_range(data):
+    if data.get("empty"):
+        return Range(empty=True)
+    lower, upper = data["lower"], data["upper"]
+    return Range(None if lower is None else datetime.fromisoformat(lower),
+                 None if upper is None else datetime.fromisoformat(upper), bounds=data["bounds"])
+
+
+def dumps(value):
+    """JSON для записи или списка записей"""
+    if isinstance(value, (list, tuple)):
+        return json.dumps([record.to_dict() for record in value], ensure_ascii=False, separators=(",", ":"))
+    return json.dumps(value.to_dict(), ensure_ascii=False, separators=(",", ":"))
+
+
+def loads(record_type, text):
+    """Запись (или список записей, если в JSON массив) типа record_type"""
+    data = json.loads(text)
+    if isinstance(data, list):
+        return [record_type.from_dict(item) for item in data]
+    return record_type.from_dict(data)
+'''
+
+CLASS_TEMPLATE = '''
+
+@dataclass(frozen=True, slots=True)
+class {name}:
+    """{comment} ({table})"""
+
+{fields}
+
+    @classmethod
+    def from_row(cls, row):
+        """Из строки select({table_variable}) (или любого кортежа в порядке колонок)"""
+        return cls(*row)
+
+    @classmethod
+    def from_rows(cls, rows):
+        return list(starmap(cls, rows))
+
+    def to_dict(self):
+        return {{
+{encoders}
+        }}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+{decoders}
+        )
+'''
+
+
+def column_codec(column):
+    """Аннотация поля и шаблоны кодирования / декодирования значения для JSON ({} - значение)"""
+    sql_type = column.type
+    if isinstance(sql_type, Boolean):
+        return "bool", None, None
+    if isinstance(sql_type, Integer):
+        return "int", None, None
+    if isinstance(sql_type, Numeric):
+        return "Decimal", "str({})", "Decimal({})"
+    if isinstance(sql_type, DateTime):
+        return "datetime", "{}.isoformat()", "datetime.fromisoformat({})"
+    if isinstance(sql_type, Time):
+        return "time", "{}.isoformat()", "time.fromisoformat({})"
+    if isinstance(sql_type, (Interval, INTERVAL)):
+        return "timedelta", "{}.total_seconds()", "timedelta(seconds={})"
+    if isinstance(sql_type, AbstractRange):
+        return "Range", "_encode_range({})", "_decode_range({})"
+    if isinstance(sql_type, ARRAY):
+        return "list", None, None
+    if isinstance(sql_type, JSON):
+        return "dict", None, None
+    if isinstance(sql_type, String):
+        return "str", None, None
+    raise TypeError(f"Нет преобразования для колонки {column.table.name}.{column.name}: {sql_type!r}")
+
+
+def _convert(template, value, nullable):
+    if template is None:
+        return value
+    converted = template.format(value)
+    return f"None if {value} is None else {converted}" if nullable else converted
+
+
+def class_name(table, mapped):
+    return mapped.get(table.fullname) or "".join(part.capitalize() for part in table.name.split("_"))
+
+
+def generate_class(table, mapped):
+    """Исходный код класса записи таблицы"""
+    fields, encoders, decoders = [], [], []
+    for column in table.columns:
+        annotation, encode, decode = column_codec(column)
+        if column.nullable:
+            annotation += " | None"
+        fields.append(f"    {column.name}: {annotation}")
+        value = f"self.{column.name}"
+        encoders.append(f'            "{column.name}": {_convert(encode, value, column.nullable)},')
+        value = f'data["{column.name}"]'
+        decoders.append(f"            {_convert(decode, value, column.nullable)},")
+    name = class_name(table, mapped)
+    table_variable = f"models.{name}.__table__" if table.fullname in mapped else f"models.t_{table.name}"
+    return CLASS_TEMPLATE.format(
+        name=name, comment=table.comment or table.name, table=table.fullname, table_variable=table_variable,
+        fields="\n".join(fields), encoders="\n".join(encoders), decoders="\n".join(decoders),
+    )
+
+
+def generate_records():
+    """Исходный код модуля records.py"""
+    mapped = {mapper.class_.__table__.fullname: mapper.class_.__name__ for mapper in Base.registry.mappers}
+    tables = sorted(metadata.tables.values(), key=lambda table: table.name)
+    classes = [generate_class(table, mapped) for table in tables]
+    registry = "\n".join(f'    "{table.fullname}": {class_name(table, mapped)},' for table in tables)
+    return HEADER + "".join(classes) + f"\n\n# Классы записей по полному имени таблицы\nRECORDS = {{\n{registry}\n}}\n"
+
+
+def _measure(build):
+    tracemalloc.start()
+    started = time.perf_counter()
+    objects = build()
+    elapsed = time.perf_counter() - started
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return objects, elapsed, size
+
+
+def benchmark(count=BENCHMARK_OBJECTS):
+    """Память на объект и время JSON: объекты ORM Bookings и записи records.Bookings"""
+    import records
+
+    book_date = datetime.now(timezone.utc)
+    rows = [(f"{i:06X}", book_date, Decimal("12345.60")) for i in range(count)]
+    columns = [column.name for column in Bookings.__table__.columns]
+
+    orm_objects, orm_build, orm_memory = _measure(
+        lambda: [Bookings(**dict(zip(columns, row))) for row in rows])
+    started = time.perf_counter()
+    orm_json = json.dumps([{name: getattr(obj, name) for name in columns} for obj in orm_objects], default=str)
+    orm_encode = time.perf_counter() - started
+    del orm_objects
+
+    record_objects, record_build, record_memory = _measure(lambda: records.Bookings.from_rows(rows))
+    started = time.perf_counter()
+    record_json = records.dumps(record_objects)
+    record_encode = time.perf_counter() - started
+    started = time.perf_counter()
+    records.loads(records.Bookings, record_json)
+    record_decode = time.perf_counter() - started
+
+    print(f"Объектов: {count}, JSON: {len(orm_json) / 2**20:.1f} / {len(record_json) / 2**20:.1f} МБ")
+    print(f"{'Способ':<10} {'Байт/объект':>12} {'Создание, с':>12} {'В JSON, с':>10}")
+    print(f"{'ORM':<10} {orm_memory / count:>12.0f} {orm_build:>12.3f} {orm_encode:>10.3f}")
+    print(f"{'records':<10} {record_memory / count:>12.0f} {record_build:>12.3f} {record_encode:>10.3f}")
+    print(f"Из JSON (records): {record_decode:.3f} с")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генерация классов записей по models.py")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Файл модуля записей")
+    parser.add_argument("--benchmark", action="store_true", help="Сравнить записи с объектами ORM")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark()
+        return
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write(generate_records())
+    print(f"Классы записей сохранены в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
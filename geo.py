@@ -0,0 +1,265 @@
+"""
+Пространственный индекс аэропортов
+
+AirportsData.coordinates хранится текстом "(долгота,широта)". Координаты
+разбираются один раз в массивы float, переводятся в единичные векторы на
+сфере и укладываются в k-d дерево: расстояние по хорде монотонно связано с
+расстоянием по большому кругу, поэтому поиск ближайших и поиск в радиусе
+работают в декартовых координатах без тригонометрии в цикле. Расстояния для
+всех пар маршрутов t_routes считаются векторно по формуле гаверсинусов.
+"""
+
+import heapq
+import re
+import time
+from dataclasses import dataclass
+
+import numpy as np
+from sqlalchemy import select
+
+from database import engine
+from models import AirportsData, t_routes
+
+EARTH_RADIUS_KM = 6371.0088
+LEAF_SIZE = 16
+
+COORDINATES = re.compile(r"\(\s*([-+\d.eE]+)\s*,\s*([-+\d.eE]+)\s*\)")
+
+
+def parse_coordinates(values):
+    """
+    Разбирает координаты вида "(долгота,широта)"
+
+    Returns:
+        tuple: (массив долгот, массив широт) в градусах
+    """
+    parsed = np.array([COORDINATES.fullmatch(value.strip()).groups() for value in values], dtype=np.float64)
+    if not len(parsed):
+        return np.empty(0), np.empty(0)
+    return parsed[:, 0], parsed[:, 1]
+
+
+def unit_vectors(lon, lat):
+    """Точки на единичной сфере для долгот и широт в градусах"""
+    lon, lat = np.radians(lon), np.radians(lat)
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+def haversine_km(lon1, lat1, lon2, lat2):
+    """Векторное расстояние по большому кругу, км"""
+    lon1, lat1, lon2, lat2 = map(np.radians, (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def chord_to_km(chord):
+    """Длина хорды единичной сферы -> расстояние по большому кругу, км"""
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2, 0.0, 1.0))
+
+
+def km_to_chord(km):
+    """Расстояние по большому кругу, км -> длина хорды единичной сферы"""
+    return 2 * np.sin(min(km / EARTH_RADIUS_KM, np.pi) / 2)
+
+
+class KDTree:
+    """k-d дерево по точкам в R^3; узлы хранятся списком, точки - перестановкой индексов"""
+
+    def __init__(self, points, leaf_size=LEAF_SIZE):
+        self.points = np.asarray(points, dtype=np.float64)
+        self.leaf_size = leaf_size
+        self.index = np.arange(len(self.points))
+        # Узел: (начало, конец, ось, значение разбиения, левый, правый); ось -1 - лист
+        self.nodes = []
+        if len(self.points):
+            self._build(0, len(self.points))
+
+    def _build(self, start, end):
+        node_id = len(self.nodes)
+        self.nodes.append(None)
+        if end - start <= self.leaf_size:
+            self.nodes[node_id] = (start, end, -1, 0.0, -1, -1)
+            return node_id
+
+        segment = self.index[start:end]
+        coords = self.points[segment]
+        axis = int(np.argmax(coords.max(axis=0) - coords.min(axis=0)))
+        middle = (end - start) // 2
+        self.index[start:end] = segment[np.argpartition(coords[:, axis], middle)]
+        split = self.points[self.index[start + middle], axis]
+
+        left = self._build(start, start + middle)
+        right = self._build(start + middle, end)
+        self.nodes[node_id] = (start, end, axis, split, left, right)
+        return node_id
+
+    def _leaf_distances(self, start, end, point):
+        candidates = self.index[start:end]
+        return candidates, np.sqrt(((self.points[candidates] - point) ** 2).sum(axis=1))
+
+    def nearest(self, point, k):
+        """
+        k ближайших точек
+
+        Returns:
+            list: Пары (индекс точки, евклидово расстояние) по возрастанию расстояния
+        """
+        if not self.nodes:
+            return []
+        point = np.asarray(point, dtype=np.float64)
+        best = []  # max-куча по расстоянию: (-расстояние, индекс)
+        stack = [(0, 0.0)]  # (узел, нижняя граница расстояния до его точек)
+        while stack:
+            node_id, bound = stack.pop()
+            if len(best) == k and bound >= -best[0][0]:
+                continue
+            start, end, axis, split, left, right = self.nodes[node_id]
+            if axis < 0:
+                candidates, distances = self._leaf_distances(start, end, point)
+                for i, distance in zip(candidates.tolist(), distances.tolist()):
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, i))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, i))
+                continue
+            delta = point[axis] - split
+            near, far = (left, right) if delta < 0 else (right, left)
+            # Дальнее поддерево проверяется после ближнего и отбрасывается,
+            # если гиперплоскость дальше текущего k-го соседа
+            stack.append((far, max(bound, abs(delta))))
+            stack.append((near, bound))
+        return sorted(((i, -negative) for negative, i in best), key=lambda item: item[1])
+
+    def within(self, point, radius):
+        """Точки на евклидовом расстоянии не больше radius: пары (индекс, расстояние)"""
+        if not self.nodes:
+            return []
+        point = np.asarray(point, dtype=np.float64)
+        found = []
+        stack = [0]
+        while stack:
+            start, end, axis, split, left, right = self.nodes[stack.pop()]
+            if axis < 0:
+                candidates, distances = self._leaf_distances(start, end, point)
+                mask = distances <= radius
+                found.extend(zip(candidates[mask].tolist(), distances[mask].tolist()))
+                continue
+            delta = point[axis] - split
+            if delta - radius <= 0:
+                stack.append(left)
+            if delta + radius >= 0:
+                stack.append(right)
+        return sorted(found, key=lambda item: item[1])
+
+
+@dataclass
+class AirportIndex:
+    """Аэропорты с координатами и пространственным индексом"""
+
+    codes: np.ndarray
+    lon: np.ndarray
+    lat: np.ndarray
+
+    def __post_init__(self):
+        self.codes = np.asarray(self.codes)
+        self.position = {code: i for i, code in enumerate(self.codes.tolist())}
+        self.tree = KDTree(unit_vectors(self.lon, self.lat))
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Строит индекс из пар (код аэропорта, координаты текстом)"""
+        codes = [code for code, _ in rows]
+        lon, lat = parse_coordinates([coordinates for _, coordinates in rows])
+        return cls(np.array(codes, dtype="U3"), lon, lat)
+
+    @classmethod
+    def load(cls, bind=engine):
+        with bind.connect() as connection:
+            rows = connection.execute(select(AirportsData.airport_code, AirportsData.coordinates)).all()
+        return cls.from_rows(rows)
+
+    def _point(self, where):
+        """Точка на сфере по коду аэропорта или паре (долгота, широта)"""
+        if isinstance(where, str):
+            i = self.position[where]
+            return unit_vectors(self.lon[i], self.lat[i])[0]
+        lon, lat = where
+        return unit_vectors(lon, lat)[0]
+
+    def nearest(self, where, n=5, include_self=False):
+        """n ближайших аэропортов: список пар (код, км)"""
+        extra = 1 if isinstance(where, str) and not include_self else 0
+        found = self.tree.nearest(self._point(where), n + extra)
+        result = [(self.codes[i], float(chord_to_km(chord))) for i, chord in found]
+        if extra:
+            result = [item for item in result if item[0] != where]
+        return result[:n]
+
+    def within(self, where, radius_km):
+        """Аэропорты не дальше radius_km: список пар (код, км) по возрастанию расстояния"""
+        found = self.tree.within(self._point(where), km_to_chord(radius_km))
+        return [(self.codes[i], float(chord_to_km(chord))) for i, chord in found]
+
+    def positions(self, codes):
+        """Векторно переводит коды аэропортов в позиции массивов индекса"""
+        return np.fromiter((self.position[code] for code in codes), dtype=np.int64, count=len(codes))
+
+    def distance_km(self, codes_from, codes_to):
+        """Векторное расстояние между парами аэропортов, км"""
+        a, b = self.positions(codes_from), self.positions(codes_to)
+        return haversine_km(self.lon[a], self.lat[a], self.lon[b], self.lat[b])
+
+
+def load_routes(bind=engine):
+    """Маршруты: номера, аэропорты вылета/прилёта, тип самолёта и длительность"""
+    columns = t_routes.c
+    with bind.connect() as connection:
+        return connection.execute(select(
+            columns.route_no, columns.departure_airport, columns.arrival_airport,
+            columns.airplane_code, columns.duration,
+        )).all()
+
+
+def route_distances(airports, routes):
+    """
+    Расстояния по большому кругу для всех маршрутов
+
+    Returns:
+        np.ndarray: Расстояние в км для каждого маршрута (в порядке routes)
+    """
+    departures = [route.departure_airport for route in routes]
+    arrivals = [route.arrival_airport for route in routes]
+    return airports.distance_km(departures, arrivals)
+
+
+def main():
+    """Пример: ближайшие аэропорты, поиск в радиусе и расстояния маршрутов"""
+    try:
+        airports = AirportIndex.load()
+        routes = load_routes()
+    except Exception as e:
+        print(f"Ошибка при выполнении запроса: {e}")
+        return
+
+    print(f"Аэропортов в индексе: {len(airports.codes)}")
+    origin = "SVO" if "SVO" in airports.position else str(airports.codes[0])
+
+    print(f"\nБлижайшие к {origin}:")
+    for code, km in airports.nearest(origin, 5):
+        print(f"  {code:<5} {km:>8.1f} км")
+
+    print(f"\nВ радиусе 500 км от {origin}:")
+    for code, km in airports.within(origin, 500):
+        print(f"  {code:<5} {km:>8.1f} км")
+
+    started = time.perf_counter()
+    distances = route_distances(airports, routes)
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"\nРасстояния {len(routes)} маршрутов рассчитаны за {elapsed:.2f} мс")
+    if len(distances):
+        print(f"Самый длинный маршрут: {routes[int(np.argmax(distances))].route_no} ({distances.max():.0f} км)")
+
+
+if __name__ == "__main__":
+    main()
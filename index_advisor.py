@@ -0,0 +1,379 @@
+"""
+Советник по индексам на основе записанной нагрузки
+
+Нагрузка записывается движками из database.py в журнал JSON Lines
+(переменная окружения WORKLOAD_LOG или record_workload()). Советник:
+1. группирует одинаковые запросы и разбирает в них предикаты и сортировки
+   по колонкам схемы bookings;
+2. строит индексы-кандидаты (равенство, диапазон, ORDER BY ... LIMIT),
+   отбрасывая уже покрытые существующими индексами;
+3. оценивает выигрыш по EXPLAIN на гипотетических индексах расширения
+   hypopg; без него - только с --build-real-indexes, на настоящем индексе
+   внутри откатываемой транзакции (построение читает всю таблицу и блокирует
+   запись в неё до отката);
+4. пишет выгодные индексы в migrations/ как готовые SQL-миграции.
+
+Запуск:
+    WORKLOAD_LOG=workload.jsonl python query_tickets.py
+    python index_advisor.py workload.jsonl
+    python index_advisor.py workload.jsonl --build-real-indexes   # без hypopg
+"""
+
+import argparse
+import json
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+
+from sqlalchemy import text
+
+from database import engine, explain_plan
+
+SCHEMA = "bookings"
+MIGRATIONS_DIR = Path("migrations")
+
+# Минимальный относительный выигрыш стоимости, при котором индекс предлагается
+DEFAULT_MIN_GAIN = 0.1
+# Кандидаты - индексы B-дерева (метод CREATE INDEX по умолчанию)
+INDEX_METHOD = "btree"
+
+RANGE_OPERATORS = {">", ">=", "<", "<=", "BETWEEN", "LIKE"}
+OPERATOR = r"\s*(?P<operator>=|!=|<>|>=|<=|>|<|IN\b|NOT IN\b|LIKE\b|ILIKE\b|BETWEEN\b)"
+CLAUSE_END = r"\b(?:GROUP BY|ORDER BY|HAVING|LIMIT|OFFSET|FOR UPDATE|RETURNING)\b"
+
+
+@dataclass
+class WorkloadStatement:
+    """Уникальный запрос из журнала с количеством выполнений и примером параметров"""
+
+    statement: str
+    parameters: object
+    paramstyle: str
+    count: int = 0
+
+
+@dataclass(frozen=True)
+class Candidate:
+    """Индекс-кандидат: таблица и колонки с направлением сортировки"""
+
+    table: str
+    columns: tuple
+
+    @property
+    def name(self):
+        return f"{self.table}_{'_'.join(column for column, _ in self.columns)}_idx"
+
+    @property
+    def column_list(self):
+        return ", ".join(f"{column} DESC" if descending else column for column, descending in self.columns)
+
+    def ddl(self, concurrently=False):
+        return (
+            f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {self.name} "
+            f"ON {SCHEMA}.{self.table} ({self.column_list})"
+        )
+
+
+@dataclass(frozen=True)
+class ExistingIndex:
+    """Существующий индекс: метод доступа, колонки ключа с направлением сортировки, частичный ли он"""
+
+    method: str
+    columns: tuple
+    partial: bool = False
+
+
+@dataclass
+class Advice:
+    """Оценка кандидата по нагрузке"""
+
+    candidate: Candidate
+    cost_before: float
+    cost_after: float
+    statements: list
+
+    @property
+    def gain(self):
+        return self.cost_before - self.cost_after
+
+    @property
+    def gain_ratio(self):
+        return self.gain / self.cost_before if self.cost_before else 0.0
+
+
+def load_workload(path):
+    """Читает журнал нагрузки и группирует одинаковые запросы"""
+    statements = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            sql = record["statement"]
+            if f"{SCHEMA}." not in sql or sql.lstrip().upper().startswith("EXPLAIN"):
+                continue
+            entry = statements.setdefault(
+                sql, WorkloadStatement(sql, record.get("parameters"), record.get("paramstyle", "pyformat")))
+            entry.count += 1
+    return list(statements.values())
+
+
+def _column_pattern(aliases):
+    """Регулярное выражение для ссылок на колонки: bookings.table.column и alias.column"""
+    prefixes = [rf"{SCHEMA}\.(?P<table>\w+)"]
+    if aliases:
+        prefixes.append(rf"(?P<alias>{'|'.join(map(re.escape, aliases))})")
+    return rf"(?:{'|'.join(prefixes)})\.(?P<column>\w+)\b"
+
+
+def parse_statement(sql):
+    """
+    Разбирает запрос, сгенерированный SQLAlchemy
+
+    Returns:
+        dict: таблица -> {"eq": [...], "range": [...], "order": [(колонка, desc)], "other": [...]}
+    """
+    aliases = dict(re.findall(rf"{SCHEMA}\.(\w+)\s+AS\s+(\w+)", sql))
+    alias_tables = {alias: table for table, alias in aliases.items()}
+    column = _column_pattern(alias_tables)
+    usage = defaultdict(lambda: {"eq": [], "range": [], "order": [], "other": []})
+
+    def resolve(match):
+        return match.group("table") or alias_tables[match.group("alias")], match.group("column")
+
+    # Предикаты ищутся после списка выборки: в WHERE и в условиях JOIN ... ON
+    body = re.split(r"\bFROM\b", sql, maxsplit=1, flags=re.IGNORECASE)[-1]
+    conditions = re.split(CLAUSE_END, body, maxsplit=1, flags=re.IGNORECASE)[0]
+    for match in re.finditer(column + OPERATOR, conditions, flags=re.IGNORECASE):
+        table, name = resolve(match)
+        operator = match.group("operator").upper()
+        if operator in ("=", "IN"):
+            kind = "eq"
+        elif operator in RANGE_OPERATORS:
+            kind = "range"
+        else:
+            kind = "other"
+        if name not in usage[table][kind]:
+            usage[table][kind].append(name)
+
+    order = re.search(r"\bORDER BY\s+(.+?)(?:\bLIMIT\b|\bOFFSET\b|$)", sql, flags=re.IGNORECASE | re.DOTALL)
+    if order and re.search(r"\bLIMIT\b", sql, flags=re.IGNORECASE):
+        for item in order.group(1).split(","):
+            match = re.search(column, item)
+            if match:
+                table, name = resolve(match)
+                usage[table]["order"].append((name, bool(re.search(r"\bDESC\b", item, flags=re.IGNORECASE))))
+
+    return dict(usage)
+
+
+def candidates_for(usage):
+    """Индексы-кандидаты для одного запроса"""
+    candidates = set()
+    for table, columns in usage.items():
+        equality = [(name, False) for name in columns["eq"]]
+        for name, _ in equality:
+            candidates.add(Candidate(table, ((name, False),)))
+        if len(equality) > 1:
+            candidates.add(Candidate(table, tuple(equality)))
+        for name in columns["range"]:
+            candidates.add(Candidate(table, ((name, False),)))
+            if equality:
+                candidates.add(Candidate(table, (*equality, (name, False))))
+        if columns["order"]:
+            candidates.add(Candidate(table, (*equality, *columns["order"])))
+    return candidates
+
+
+def existing_indexes(connection, table):
+    """
+    Существующие индексы таблицы
+
+    Returns:
+        dict: имя -> ExistingIndex; колонки ключа (без INCLUDE) - пары (имя, desc), None для выражений
+    """
+    rows = connection.execute(text(
+        """
+        SELECT i.relname, am.amname, x.indpred IS NOT NULL,
+               array_agg(a.attname ORDER BY k.ord), array_agg((k.flags & 1) = 1 ORDER BY k.ord)
+        FROM pg_index x
+        JOIN pg_class t ON t.oid = x.indrelid
+        JOIN pg_class i ON i.oid = x.indexrelid
+        JOIN pg_am am ON am.oid = i.relam
+        JOIN pg_namespace n ON n.oid = t.relnamespace
+        CROSS JOIN LATERAL unnest(x.indkey::int2[], x.indoption::int2[]) WITH ORDINALITY AS k(attnum, flags, ord)
+        LEFT JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+        WHERE n.nspname = :schema AND t.relname = :table AND k.ord <= x.indnkeyatts
+        GROUP BY i.relname, am.amname, x.indpred IS NOT NULL
+        """
+    ), {"schema": SCHEMA, "table": table})
+    return {name: ExistingIndex(method, tuple(zip(columns, descending)), partial)
+            for name, method, partial, columns, descending in rows}
+
+
+def is_covered(candidate, indexes):
+    """
+    Кандидат покрыт, если его колонки с направлениями сортировки - префикс
+    ключа существующего полного индекса того же метода
+
+    Индекс B-дерева читается и в обратном порядке, поэтому подходит и префикс
+    с противоположными направлениями всех колонок. Индексы других методов
+    (например, GIN с gin_trgm_ops) и частичные индексы кандидата не покрывают.
+    """
+    columns = candidate.columns
+    reversed_columns = tuple((name, not descending) for name, descending in columns)
+    for index in indexes.values():
+        if index.method != INDEX_METHOD or index.partial:
+            continue
+        prefix = index.columns[:len(columns)]
+        if prefix in (columns, reversed_columns):
+            return True
+    return False
+
+
+def _driver_statement(entry):
+    """Приводит запрос из журнала к стилю параметров psycopg2 для EXPLAIN"""
+    if entry.paramstyle == "numeric_dollar":
+        sql = re.sub(r"\$(\d+)", lambda m: f"%(p{m.group(1)})s", entry.statement.replace("%", "%%"))
+        parameters = {f"p{i}": value for i, value in enumerate(entry.parameters or [], start=1)}
+        return sql, parameters
+    return entry.statement, entry.parameters or {}
+
+
+def workload_cost(connection, statements):
+    """Суммарная оценочная стоимость запросов с учётом количества выполнений"""
+    total = 0.0
+    for entry in statements:
+        sql, parameters = _driver_statement(entry)
+        plan = explain_plan(connection, sql, parameters=parameters)
+        total += plan["Plan"]["Total Cost"] * entry.count
+    return total
+
+
+def has_hypopg(connection):
+    return connection.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'hypopg'")).first() is not None
+
+
+def cost_with_index(connection, candidate, statements, hypothetical):
+    """
+    Стоимость нагрузки при наличии индекса-кандидата
+
+    Без hypothetical индекс строится по-настоящему: это полное чтение таблицы
+    под блокировкой SHARE до отката, поэтому вызывается только явно
+    (advise(build_real_indexes=True)).
+    """
+    if hypothetical:
+        connection.execute(text("SELECT * FROM hypopg_create_index(:ddl)"), {"ddl": candidate.ddl()})
+        try:
+            return workload_cost(connection, statements)
+        finally:
+            connection.execute(text("SELECT hypopg_reset()"))
+
+    # DDL в PostgreSQL транзакционен - индекс исчезает при откате точки сохранения
+    transaction = connection.begin_nested()
+    try:
+        connection.execute(text(candidate.ddl()))
+        return workload_cost(connection, statements)
+    finally:
+        transaction.rollback()
+
+
+def advise(workload, bind=engine, min_gain=DEFAULT_MIN_GAIN, build_real_indexes=False):
+    """
+    Оценивает кандидатов по нагрузке
+
+    Args:
+        workload (list): Запросы из load_workload()
+        bind: Движок SQLAlchemy
+        min_gain (float): Минимальный относительный выигрыш стоимости
+        build_real_indexes (bool): Без hypopg оценивать на настоящих индексах
+            (строятся и откатываются, блокируя запись в таблицы)
+
+    Returns:
+        list: Выгодные индексы по убыванию выигрыша
+    """
+    by_candidate = defaultdict(list)
+    for entry in workload:
+        for candidate in candidates_for(parse_statement(entry.statement)):
+            by_candidate[candidate].append(entry)
+
+    advice = []
+    with bind.connect() as connection:
+        hypothetical = has_hypopg(connection)
+        if not hypothetical and not build_real_indexes:
+            raise RuntimeError(
+                "Расширение hypopg не установлено: установите его (CREATE EXTENSION hypopg) "
+                "или разрешите оценку на настоящих индексах (--build-real-indexes)")
+        indexes = {}
+        for candidate, statements in by_candidate.items():
+            if candidate.table not in indexes:
+                indexes[candidate.table] = existing_indexes(connection, candidate.table)
+            if is_covered(candidate, indexes[candidate.table]):
+                continue
+            before = workload_cost(connection, statements)
+            after = cost_with_index(connection, candidate, statements, hypothetical)
+            result = Advice(candidate, before, after, statements)
+            if result.gain_ratio >= min_gain:
+                advice.append(result)
+        connection.rollback()
+
+    # Из кандидатов с одинаковыми колонками оставляем самый выгодный
+    advice.sort(key=lambda a: a.gain, reverse=True)
+    unique = {}
+    for result in advice:
+        unique.setdefault(result.candidate.name, result)
+    return list(unique.values())
+
+
+def next_migration_number(directory=MIGRATIONS_DIR):
+    numbers = [int(path.name[:4]) for path in Path(directory).glob("[0-9][0-9][0-9][0-9]_*.sql")]
+    return max(numbers, default=0) + 1
+
+
+def write_migration(result, directory=MIGRATIONS_DIR):
+    """Записывает рекомендацию как SQL-миграцию и возвращает путь к файлу"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{next_migration_number(directory):04d}_{result.candidate.name}.sql"
+    queries = "\n".join(f"--   x{entry.count}: {' '.join(entry.statement.split())[:150]}"
+                        for entry in result.statements)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(
+            f"-- Предложено index_advisor.py\n"
+            f"-- Оценка стоимости нагрузки: {result.cost_before:.2f} -> {result.cost_after:.2f} "
+            f"(-{result.gain_ratio:.0%})\n"
+            f"-- Запросы:\n{queries}\n"
+            f"-- CONCURRENTLY не блокирует запись, но не может выполняться внутри транзакции\n"
+            f"{result.candidate.ddl(concurrently=True)};\n"
+        )
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Советник по индексам на основе журнала нагрузки")
+    parser.add_argument("workload", help="Журнал нагрузки (JSON Lines)")
+    parser.add_argument("--min-gain", type=float, default=DEFAULT_MIN_GAIN)
+    parser.add_argument("--write", action="store_true", help="Записать миграции в migrations/")
+    parser.add_argument("--build-real-indexes", action="store_true",
+                        help="Без hypopg строить индексы-кандидаты по-настоящему в откатываемой транзакции")
+    args = parser.parse_args()
+
+    workload = load_workload(args.workload)
+    print(f"Уникальных запросов в журнале: {len(workload)}")
+    try:
+        advice = advise(workload, min_gain=args.min_gain, build_real_indexes=args.build_real_indexes)
+    except Exception as e:
+        print(f"Ошибка при выполнении запроса: {e}")
+        return
+
+    if not advice:
+        print("Выгодных индексов не найдено")
+    for result in advice:
+        print(f"{result.candidate.ddl()}")
+        print(f"  стоимость {result.cost_before:.2f} -> {result.cost_after:.2f} (-{result.gain_ratio:.0%}), "
+              f"запросов: {len(result.statements)}")
+        if args.write:
+            print(f"  миграция: {write_migration(result)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""
+Генератор синтетической нагрузки на запись бронирований
+
+Параллельные клиенты (корутины asyncio на асинхронном движке) создают
+бронирования целиком: bookings, tickets, segments и boarding_passes в одной
+транзакции. Места и номера посадочных талонов выбираются так же, как это
+делал бы конкурентный клиент: места пассажиров - разные случайные из
+свободных по мнению клиента (занятые до прогона и уже проданные генератором),
+номер - max(boarding_no) + 1. Нарушения boarding_passes_flight_id_seat_no_key
+и boarding_passes_flight_id_boarding_no_key, взаимоблокировки (40P01) и
+ошибки сериализации (40001) - ожидаемые конфликты: транзакция повторяется с
+другим местом. Рейсы берутся из небольшого «горячего» набора, чтобы
+конфликты возникали как в пиковый сезон.
+
+Число клиентов растёт ступенями; для каждой ступени печатаются транзакции в
+секунду, перцентили задержки (вместе с повторами), доля конфликтов и
+транзакции, так и не выполненные за MAX_RETRIES попыток.
+
+Созданные строки помечены префиксами (book_ref на Z, ticket_no на LG) и
+удаляются после каждой ступени, чтобы следующая начинала с теми же
+свободными местами, а не измеряла их нехватку; --keep оставляет строки
+последней ступени. Если на всех рейсах места кончились до конца ступени,
+клиент останавливается, а ступень отмечается в отчёте.
+
+Запуск:
+    python load_generator.py --clients 1 2 4 8 16 32 --step 20
+"""
+
+import argparse
+import asyncio
+import itertools
+import random
+import string
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import numpy as np
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import database_url_async
+from models import BoardingPasses, Bookings, Seats, Segments, Tickets, t_timetable
+
+BOOK_REF_PREFIX = "Z"
+TICKET_PREFIX = "LG"
+
+DEFAULT_CLIENTS = (1, 2, 4, 8, 16, 32)
+DEFAULT_STEP_SECONDS = 20
+DEFAULT_HOT_FLIGHTS = 20
+MAX_RETRIES = 5
+MAX_PASSENGERS = 3
+
+# Конфликты, после которых транзакция повторяется с другим местом
+RETRYABLE_CONSTRAINTS = {
+    "boarding_passes_flight_id_seat_no_key",
+    "boarding_passes_flight_id_boarding_no_key",
+    "bookings_pkey",
+    "tickets_pkey",
+}
+# SQLSTATE конфликтов параллельных транзакций, после которых транзакция повторяется
+RETRYABLE_SQLSTATES = {
+    "40P01": "deadlock_detected",
+    "40001": "serialization_failure",
+}
+
+PRICE_RANGES = {
+    "Economy": (3_000, 25_000),
+    "Comfort": (15_000, 60_000),
+    "Business": (30_000, 150_000),
+}
+
+BOOK_REF_ALPHABET = string.ascii_uppercase + string.digits
+
+
+@dataclass
+class Flight:
+    """Рейс нагрузки: места самолёта, занятые до прогона и проданные генератором"""
+
+    flight_id: int
+    seats: list
+    taken: set = field(default_factory=set)
+    booked: set = field(default_factory=set)
+
+    def free_seats(self):
+        return [seat for seat in self.seats if seat[0] not in self.taken and seat[0] not in self.booked]
+
+
+@dataclass
+class StepStats:
+    """Результаты ступени нагрузки"""
+
+    clients: int
+    elapsed: float = 0.0
+    latencies: list = field(default_factory=list)
+    conflicts: dict = field(default_factory=dict)
+    failed: int = 0
+    # Клиенты, остановленные до конца ступени: свободных мест не осталось
+    exhausted: int = 0
+
+    @property
+    def committed(self):
+        return len(self.latencies)
+
+    @property
+    def conflict_total(self):
+        return sum(self.conflicts.values())
+
+
+class SeatsExhausted(Exception):
+    """На рейсах нагрузки не осталось свободных мест"""
+
+
+def conflict_name(error):
+    """Имя ожидаемого конфликта из ошибки DBAPI или None, если ошибку нужно пробросить"""
+    orig = error.orig
+    sqlstate = getattr(orig, "sqlstate", None) or getattr(getattr(orig, "__cause__", None), "sqlstate", None)
+    if sqlstate in RETRYABLE_SQLSTATES:
+        return RETRYABLE_SQLSTATES[sqlstate]
+    if isinstance(error, IntegrityError):
+        name = constraint_name(error)
+        if name in RETRYABLE_CONSTRAINTS:
+            return name
+    return None
+
+
+def constraint_name(error):
+    """Имя нарушенного ограничения из IntegrityError (asyncpg передаёт его в исключении драйвера)"""
+    name = getattr(getattr(error.orig, "__cause__", None), "constraint_name", None)
+    if name:
+        return name
+    message = str(error.orig)
+    return next((constraint for constraint in RETRYABLE_CONSTRAINTS if constraint in message), None)
+
+
+async def load_hot_flights(session_factory, count=DEFAULT_HOT_FLIGHTS):
+    """Ближайшие рейсы, на которые ещё идёт продажа, с местами их самолётов"""
+    async with session_factory() as session:
+        flights = (await session.execute(
+            select(t_timetable.c.flight_id, t_timetable.c.airplane_code)
+            .where(t_timetable.c.scheduled_departure > datetime.now(timezone.utc))
+            .where(t_timetable.c.status.in_(("Scheduled", "On Time")))
+            .order_by(t_timetable.c.scheduled_departure)
+            .limit(count)
+        )).all()
+        taken = {}
+        for flight_id, seat_no in (await session.execute(
+            select(BoardingPasses.flight_id, BoardingPasses.seat_no)
+            .where(BoardingPasses.flight_id.in_([flight_id for flight_id, _ in flights]))
+        )).all():
+            taken.setdefault(flight_id, set()).add(seat_no)
+        airplanes = {airplane_code for _, airplane_code in flights}
+        seats = {}
+        for airplane_code, seat_no, fare_conditions in (await session.execute(
+            select(Seats.airplane_code, Seats.seat_no, Seats.fare_conditions)
+            .where(Seats.airplane_code.in_(airplanes))
+        )).all():
+            seats.setdefault(airplane_code, []).append((seat_no, fare_conditions))
+    return [Flight(flight_id, seats[airplane_code], taken.get(flight_id, set()))
+            for flight_id, airplane_code in flights if airplane_code in seats]
+
+
+class BookingClient:
+    """Клиент, оформляющий бронирования в цикле до остановки"""
+
+    def __init__(self, session_factory, flights, ticket_numbers, stats):
+        self.session_factory = session_factory
+        self.flights = flights
+        self.ticket_numbers = ticket_numbers
+        self.stats = stats
+
+    def _book_ref(self):
+        return BOOK_REF_PREFIX + "".join(random.choices(BOOK_REF_ALPHABET, k=5))
+
+    def _booking(self):
+        """
+        Бронирование с билетами, сегментами и посадочными талонами на один рейс
+
+        Returns:
+            tuple: (рейс, номера мест, строки для записи)
+        """
+        passengers = random.randint(1, MAX_PASSENGERS)
+        free = {flight.flight_id: flight.free_seats() for flight in self.flights}
+        flights = [flight for flight in self.flights if free[flight.flight_id]]
+        if not flights:
+            raise SeatsExhausted()
+        flight = random.choice(flights)
+        chosen = random.sample(free[flight.flight_id], min(passengers, len(free[flight.flight_id])))
+        book_ref = self._book_ref()
+        rows, total = [], Decimal(0)
+        for seat_no, fare_conditions in chosen:
+            ticket_no = f"{TICKET_PREFIX}{next(self.ticket_numbers):011d}"
+            low, high = PRICE_RANGES.get(fare_conditions, PRICE_RANGES["Economy"])
+            price = Decimal(random.randrange(low, high, 100))
+            total += price
+            next_boarding_no = (
+                select(func.coalesce(func.max(BoardingPasses.boarding_no), 0) + 1)
+                .where(BoardingPasses.flight_id == flight.flight_id)
+                .scalar_subquery()
+            )
+            rows.extend([
+                Tickets(ticket_no=ticket_no, book_ref=book_ref, passenger_id=f"{random.randrange(10**10):010d}",
+                        passenger_name="LOAD TEST", outbound=True),
+                Segments(ticket_no=ticket_no, flight_id=flight.flight_id, fare_conditions=fare_conditions,
+                         price=price),
+                BoardingPasses(ticket_no=ticket_no, flight_id=flight.flight_id, seat_no=seat_no,
+                               boarding_no=next_boarding_no),
+            ])
+        booking = Bookings(book_ref=book_ref, book_date=datetime.now(timezone.utc), total_amount=total)
+        return flight, [seat_no for seat_no, _ in chosen], [booking, *rows]
+
+    async def _attempt(self):
+        """Одна попытка; возвращает None при успехе или имя конфликта"""
+        async with self.session_factory() as session:
+            try:
+                async with session.begin():
+                    flight, seats, rows = self._booking()
+                    # Строки сбрасываются по одной таблице за раз, чтобы соблюдались внешние ключи
+                    for model in (Bookings, Tickets, Segments, BoardingPasses):
+                        session.add_all(row for row in rows if isinstance(row, model))
+                        await session.flush()
+            except DBAPIError as e:
+                name = conflict_name(e)
+                if name is None:
+                    raise
+                return name
+        flight.booked.update(seats)
+        return None
+
+    async def run(self, stop):
+        while not stop.is_set():
+            started = time.perf_counter()
+            for _ in range(MAX_RETRIES):
+                try:
+                    conflict = await self._attempt()
+                except SeatsExhausted:
+                    self.stats.exhausted += 1
+                    return
+                if conflict is None:
+                    self.stats.latencies.append(time.perf_counter() - started)
+                    break
+                self.stats.conflicts[conflict] = self.stats.conflicts.get(conflict, 0) + 1
+            else:
+                self.stats.failed += 1
+
+
+async def run_step(session_factory, flights, ticket_numbers, clients, seconds):
+    """Одна ступень нагрузки: clients клиентов в течение seconds секунд"""
+    stats = StepStats(clients)
+    stop = asyncio.Event()
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(BookingClient(session_factory, flights, ticket_numbers, stats).run(stop))
+             for _ in range(clients)]
+    await asyncio.sleep(seconds)
+    stop.set()
+    await asyncio.gather(*tasks)
+    stats.elapsed = time.perf_counter() - started
+    return stats
+
+
+async def cleanup(session_factory):
+    """Удаляет строки, созданные генератором"""
+    generated_ticket = Tickets.ticket_no.like(f"{TICKET_PREFIX}%")
+    async with session_factory() as session, session.begin():
+        await session.execute(delete(BoardingPasses).where(BoardingPasses.ticket_no.like(f"{TICKET_PREFIX}%")))
+        await session.execute(delete(Segments).where(Segments.ticket_no.like(f"{TICKET_PREFIX}%")))
+        await session.execute(delete(Tickets).where(generated_ticket))
+        await session.execute(delete(Bookings).where(Bookings.book_ref.like(f"{BOOK_REF_PREFIX}%")))
+
+
+def print_header():
+    print(f"{'Клиентов':>8} {'Транзакций':>10} {'Tx/с':>8} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} "
+          f"{'Конфл./tx':>10} {'Отказов':>8}")
+    print("-" * 80)
+
+
+def print_step(stats):
+    if stats.committed:
+        p50, p95, p99 = np.percentile(stats.latencies, [50, 95, 99]) * 1000
+    else:
+        p50 = p95 = p99 = float("nan")
+    attempts = stats.committed + stats.failed
+    conflict_rate = stats.conflict_total / attempts if attempts else 0.0
+    print(f"{stats.clients:>8} {stats.committed:>10} {stats.committed / stats.elapsed:>8.1f} "
+          f"{p50:>9.1f} {p95:>9.1f} {p99:>9.1f} {conflict_rate:>10.3f} {stats.failed:>8}")
+    for name, count in sorted(stats.conflicts.items()):
+        print(f"{'':>8} {name}: {count}")
+    if stats.exhausted:
+        print(f"{'':>8} места кончились: остановлено клиентов {stats.exhausted} - увеличьте --flights")
+
+
+async def main_async(args):
+    # Пул под максимальное число клиентов, чтобы ожидание соединения не маскировало предел записи
+    load_engine = create_async_engine(database_url_async, pool_size=max(args.clients), max_overflow=0)
+    session_factory = sessionmaker(load_engine, class_=AsyncSession, expire_on_commit=False)
+    # Номера билетов уникальны в пределах прогона: время запуска + счётчик
+    ticket_numbers = itertools.count(int(time.time()) % 100_000 * 1_000_000)
+    try:
+        flights = await load_hot_flights(session_factory, args.flights)
+        if not flights:
+            print("Нет рейсов, открытых для продажи")
+            return
+        print(f"Рейсов в нагрузке: {len(flights)}, ступени: {args.clients}, по {args.step} с\n")
+        print_header()
+        for i, clients in enumerate(args.clients):
+            if i:
+                # Каждая ступень начинает с теми же свободными местами
+                await cleanup(session_factory)
+                for flight in flights:
+                    flight.booked.clear()
+            print_step(await run_step(session_factory, flights, ticket_numbers, clients, args.step))
+    finally:
+        if not args.keep:
+            await cleanup(session_factory)
+        await load_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Синтетическая нагрузка на запись бронирований")
+    parser.add_argument("--clients", type=int, nargs="+", default=list(DEFAULT_CLIENTS),
+                        help="Количество клиентов на ступенях нагрузки")
+    parser.add_argument("--step", type=float, default=DEFAULT_STEP_SECONDS, help="Длительность ступени, с")
+    parser.add_argument("--flights", type=int, default=DEFAULT_HOT_FLIGHTS, help="Количество «горячих» рейсов")
+    parser.add_argument("--keep", action="store_true", help="Не удалять строки последней ступени")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(main_async(args))
+    except Exception as e:
+        print(f"Ошибка при выполнении нагрузки: {e}")
+
+
+if __name__ == "__main__":
+    main()
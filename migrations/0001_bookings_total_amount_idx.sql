@@ -0,0 +1,6 @@
+-- Топ-10 бронирований по сумме из query_tickets.py:
+--   SELECT ... FROM bookings.bookings ORDER BY bookings.bookings.total_amount DESC LIMIT 10
+-- Без индекса запрос читает и сортирует всю таблицу bookings (top-N heapsort);
+-- с индексом - читает 10 записей обратным проходом по индексу.
+-- CONCURRENTLY не блокирует запись, но не может выполняться внутри транзакции
+CREATE INDEX CONCURRENTLY IF NOT EXISTS bookings_total_amount_idx ON bookings.bookings (total_amount);
@@ -0,0 +1,4 @@
+-- Поиск билетов по имени пассажира (name_search.py): префиксный ILIKE и нечёткий поиск pg_trgm
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+-- CONCURRENTLY не блокирует запись, но не может выполняться внутри транзакции
+CREATE INDEX CONCURRENTLY IF NOT EXISTS tickets_passenger_name_trgm_idx ON bookings.tickets USING gin (passenger_name gin_trgm_ops);
@@ -0,0 +1,5 @@
+-- Водяной знак sync_cache.py: (book_date, book_ref) > (:date, :ref) ORDER BY book_date, book_ref LIMIT n
+-- Без индекса каждая порция читает и сортирует всю таблицу bookings; с индексом -
+-- читает порцию по порядку индекса. Он же обслуживает диапазоны book_date из time_range.py.
+-- CONCURRENTLY не блокирует запись, но не может выполняться внутри транзакции
+CREATE INDEX CONCURRENTLY IF NOT EXISTS bookings_book_date_book_ref_idx ON bookings.bookings (book_date, book_ref);
@@ -70,6 +70,8 @@ class Bookings(Base):
     __tablename__ = 'bookings'
     __table_args__ = (
         PrimaryKeyConstraint('book_ref', name='bookings_pkey'),
+        Index('bookings_total_amount_idx', 'total_amount'),
+        Index('bookings_book_date_book_ref_idx', 'book_date', 'book_ref'),
         {'comment': 'Bookings', 'schema': 'bookings'}
     )
 
@@ -164,6 +166,7 @@ class Tickets(Base):
         ForeignKeyConstraint(['book_ref'], ['bookings.bookings.book_ref'], name='tickets_book_ref_fkey'),
         PrimaryKeyConstraint('ticket_no', name='tickets_pkey'),
         UniqueConstraint('book_ref', 'passenger_id', 'outbound', name='tickets_book_ref_passenger_id_outbound_key'),
+        Index('tickets_passenger_name_trgm_idx', 'passenger_name', postgresql_using='gin', postgresql_ops={'passenger_name': 'gin_trgm_ops'}),
         {'comment': 'Tickets', 'schema': 'bookings'}
     )
 
@@ -0,0 +1,225 @@
+"""
+Поиск билетов по имени пассажира
+
+Два способа, оба возвращают top-K совпадений за миллисекунды:
+- в базе: GIN-индекс pg_trgm по tickets.passenger_name (миграция
+  0002_tickets_passenger_name_trgm_idx.sql) ускоряет и префиксный поиск
+  ILIKE 'ИМЯ%', и нечёткий поиск оператором %;
+- в памяти: имена выгружаются серверным курсором, повторяющиеся имена
+  хранятся один раз (коды + словарь), префиксный поиск идёт бинарным поиском
+  по отсортированным именам, нечёткий - по инвертированному индексу
+  триграмм с той же мерой сходства, что у pg_trgm.
+
+Запуск:
+    python name_search.py "IVAN IVANOV"
+    python name_search.py --prefix "IVAN"
+    python name_search.py --memory "IVAN IVANOV"
+"""
+
+import argparse
+import re
+import time
+from collections import namedtuple
+
+import numpy as np
+from sqlalchemy import func, select, text
+
+from columnar import load_columns
+from database import engine
+from models import Tickets
+
+DEFAULT_LIMIT = 10
+# Порог сходства по умолчанию, как pg_trgm.similarity_threshold
+DEFAULT_THRESHOLD = 0.3
+
+TRIGRAM_INDEX = "tickets_passenger_name_trgm_idx"
+
+WORDS = re.compile(r"\w+")
+
+# Совпадение: имя пассажира, сходство с запросом (1.0 для префикса) и номера билетов
+Match = namedtuple("Match", ["name", "similarity", "ticket_nos"])
+
+
+def trigrams(value):
+    """Множество триграмм строки по правилам pg_trgm: слова в нижнем регистре, дополненные пробелами"""
+    result = set()
+    for word in WORDS.findall(value.lower()):
+        padded = f"  {word} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+def _escape_like(value, escape="/"):
+    return value.replace(escape, escape * 2).replace("%", escape + "%").replace("_", escape + "_")
+
+
+def prefix_query(prefix, limit=DEFAULT_LIMIT):
+    """Имена, начинающиеся с prefix (без учёта регистра), с номерами билетов"""
+    return (
+        select(Tickets.passenger_name, func.array_agg(Tickets.ticket_no))
+        .where(Tickets.passenger_name.ilike(_escape_like(prefix) + "%", escape="/"))
+        .group_by(Tickets.passenger_name)
+        .order_by(Tickets.passenger_name)
+        .limit(limit)
+    )
+
+
+def similar_query(value, limit=DEFAULT_LIMIT):
+    """Имена, похожие на value (оператор % pg_trgm), по убыванию сходства"""
+    similarity = func.similarity(Tickets.passenger_name, value)
+    return (
+        select(Tickets.passenger_name, func.array_agg(Tickets.ticket_no), similarity)
+        .where(Tickets.passenger_name.op("%")(value))
+        .group_by(Tickets.passenger_name)
+        .order_by(similarity.desc(), Tickets.passenger_name)
+        .limit(limit)
+    )
+
+
+def search_db(value, limit=DEFAULT_LIMIT, prefix=False, threshold=DEFAULT_THRESHOLD, bind=engine):
+    """
+    Поиск в базе по индексу pg_trgm
+
+    Returns:
+        list: Совпадения Match
+    """
+    with bind.connect() as connection:
+        if prefix:
+            rows = connection.execute(prefix_query(value, limit)).all()
+            return [Match(name, 1.0, ticket_nos) for name, ticket_nos in rows]
+        # Порог действует только внутри транзакции, соединение возвращается в пул без него
+        connection.execute(text("SELECT set_config('pg_trgm.similarity_threshold', :threshold, true)"),
+                           {"threshold": str(threshold)})
+        rows = connection.execute(similar_query(value, limit)).all()
+        return [Match(name, float(similarity), ticket_nos) for name, ticket_nos, similarity in rows]
+
+
+class NameIndex:
+    """
+    Индекс имён пассажиров в памяти
+
+    Уникальные имена хранятся один раз; номера билетов сгруппированы по имени
+    (смещения + общий массив), списки имён для каждой триграммы - массивы int32.
+    """
+
+    def __init__(self, names, name_codes, ticket_nos):
+        self.names = np.asarray(names, dtype=object)
+        name_codes = np.asarray(name_codes)
+
+        # Номера билетов, сгруппированные по коду имени
+        order = np.argsort(name_codes, kind="stable")
+        self.ticket_nos = np.asarray(ticket_nos)[order]
+        self.ticket_offsets = np.concatenate(([0], np.cumsum(np.bincount(name_codes, minlength=len(self.names)))))
+
+        # Отсортированные имена в нижнем регистре - для префиксного поиска
+        keys = np.array([name.lower() for name in self.names], dtype=str)
+        self.sorted_codes = np.argsort(keys, kind="stable")
+        self.sorted_keys = keys[self.sorted_codes]
+
+        # Инвертированный индекс триграмм: пары (триграмма, имя), сгруппированные по триграмме
+        vocabulary = {}
+        pairs_trigram, pairs_name = [], []
+        self.trigram_counts = np.empty(len(self.names), dtype=np.int32)
+        for code, name in enumerate(self.names):
+            name_trigrams = trigrams(name)
+            self.trigram_counts[code] = len(name_trigrams)
+            for trigram in name_trigrams:
+                pairs_trigram.append(vocabulary.setdefault(trigram, len(vocabulary)))
+                pairs_name.append(code)
+        pairs_trigram = np.array(pairs_trigram, dtype=np.int32)
+        order = np.argsort(pairs_trigram, kind="stable")
+        self.postings = np.array(pairs_name, dtype=np.int32)[order]
+        self.posting_offsets = np.concatenate(([0], np.cumsum(np.bincount(pairs_trigram, minlength=len(vocabulary)))))
+        self.vocabulary = vocabulary
+
+    @classmethod
+    def load(cls, bind=engine):
+        """Строит индекс по всем билетам, читая их серверным курсором"""
+        columns = load_columns(
+            select(Tickets.ticket_no, Tickets.passenger_name),
+            [("ticket_no", "S13"), ("passenger_name", None)],
+            bind,
+        )
+        return cls(columns.categories["passenger_name"], columns["passenger_name"], columns["ticket_no"])
+
+    def __len__(self):
+        return len(self.names)
+
+    def tickets(self, code):
+        """Номера билетов пассажиров с именем под данным кодом"""
+        start, end = self.ticket_offsets[code], self.ticket_offsets[code + 1]
+        return [ticket_no.decode() for ticket_no in self.ticket_nos[start:end].tolist()]
+
+    def _match(self, code, similarity):
+        return Match(self.names[code], similarity, self.tickets(code))
+
+    def prefix(self, prefix, limit=DEFAULT_LIMIT):
+        """Имена, начинающиеся с prefix (без учёта регистра), в алфавитном порядке"""
+        prefix = prefix.lower()
+        start = np.searchsorted(self.sorted_keys, prefix, side="left")
+        end = np.searchsorted(self.sorted_keys, prefix + "\U0010ffff", side="left")
+        return [self._match(code, 1.0) for code in self.sorted_codes[start:min(end, start + limit)].tolist()]
+
+    def similar(self, value, limit=DEFAULT_LIMIT, threshold=DEFAULT_THRESHOLD):
+        """
+        Имена, похожие на value, по убыванию сходства
+
+        Сходство - как similarity() в pg_trgm: доля общих триграмм в объединении
+        множеств триграмм запроса и имени.
+        """
+        value_trigrams = trigrams(value)
+        query_trigrams = [self.vocabulary[t] for t in value_trigrams if t in self.vocabulary]
+        total = len(value_trigrams)
+        if not query_trigrams:
+            return []
+        hits = np.concatenate([self.postings[self.posting_offsets[t]:self.posting_offsets[t + 1]]
+                               for t in query_trigrams])
+        codes, shared = np.unique(hits, return_counts=True)
+        similarity = shared / (total + self.trigram_counts[codes] - shared)
+        keep = similarity >= threshold
+        codes, similarity = codes[keep], similarity[keep]
+        if len(codes) > limit:
+            top = np.argpartition(-similarity, limit - 1)[:limit]
+            codes, similarity = codes[top], similarity[top]
+        order = np.lexsort((self.names[codes].astype(str), -similarity))
+        return [self._match(int(codes[i]), float(similarity[i])) for i in order]
+
+
+def print_matches(matches, elapsed):
+    print(f"Найдено {len(matches)} за {elapsed * 1000:.1f} мс")
+    for match in matches:
+        tickets = ", ".join(match.ticket_nos[:5]) + (" ..." if len(match.ticket_nos) > 5 else "")
+        print(f"  {match.similarity:.2f}  {match.name:<30} ({len(match.ticket_nos)}) {tickets}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Поиск билетов по имени пассажира")
+    parser.add_argument("name", help="Имя или начало имени пассажира")
+    parser.add_argument("--prefix", action="store_true", help="Поиск по началу имени")
+    parser.add_argument("--memory", action="store_true", help="Искать по индексу в памяти, а не в базе")
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    try:
+        if args.memory:
+            started = time.perf_counter()
+            index = NameIndex.load()
+            print(f"Индекс построен за {time.perf_counter() - started:.1f} с: {len(index)} уникальных имён")
+            started = time.perf_counter()
+            if args.prefix:
+                matches = index.prefix(args.name, args.limit)
+            else:
+                matches = index.similar(args.name, args.limit, args.threshold)
+        else:
+            started = time.perf_counter()
+            matches = search_db(args.name, args.limit, args.prefix, args.threshold)
+    except Exception as e:
+        print(f"Ошибка при выполнении запроса: {e}")
+        return
+
+    print_matches(matches, time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    main()
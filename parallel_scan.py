@@ -0,0 +1,312 @@
+"""
+Параллельное сканирование больших таблиц по шардам
+
+Пространство ключей таблицы (диапазоны ticket_no, flight_id или блоки ctid)
+делится на шарды, каждый шард читается своим соединением - в отдельном потоке
+или процессе - через серверный курсор пачками. Результаты сворачиваются
+потоково: внутри шарда каждая пачка сразу отображается в частичный результат
+(map_batch) и сворачивается в аккумулятор (reduce), а аккумуляторы шардов
+сливаются тем же reduce по мере готовности шардов. В памяти никогда не лежит
+вся таблица.
+
+В режиме процессов map_batch, reduce и initial передаются в дочерние процессы,
+поэтому должны быть функциями уровня модуля (не lambda).
+"""
+
+import os
+import queue
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+
+from sqlalchemy import and_, create_engine, func, select, text, true
+from sqlalchemy.dialects.postgresql import array
+
+from database import database_url, engine
+from models import Segments, Tickets
+
+DEFAULT_BATCH_SIZE = 10_000
+
+
+@dataclass(frozen=True)
+class Shard:
+    """Диапазон ключей [lower, upper); None означает отсутствие границы"""
+
+    index: int
+    lower: object = None
+    upper: object = None
+    by_ctid: bool = False
+
+    def where(self, key):
+        """
+        Условие отбора строк шарда
+
+        Args:
+            key: Колонка-ключ, либо таблица - для шардов по ctid
+        """
+        if self.by_ctid:
+            conditions = []
+            if self.lower is not None:
+                conditions.append(text(f"{key.fullname}.ctid >= '({int(self.lower)},0)'::tid"))
+            if self.upper is not None:
+                conditions.append(text(f"{key.fullname}.ctid < '({int(self.upper)},0)'::tid"))
+            return and_(true(), *conditions)
+
+        conditions = []
+        if self.lower is not None:
+            conditions.append(key >= self.lower)
+        if self.upper is not None:
+            conditions.append(key < self.upper)
+        return and_(true(), *conditions)
+
+
+def _shards_from_bounds(bounds, by_ctid=False):
+    """Строит шарды из отсортированного списка внутренних границ"""
+    edges = [None, *bounds, None]
+    return [Shard(i, lower, upper, by_ctid) for i, (lower, upper) in enumerate(zip(edges, edges[1:]))]
+
+
+def key_shards(key, count, bind=engine, sample_percent=1.0):
+    """
+    Делит диапазон значений колонки на count шардов примерно равного размера
+
+    Границы берутся как квантили по выборке TABLESAMPLE SYSTEM, поэтому
+    перекос распределения ключей (например, ticket_no) не ломает баланс.
+
+    Args:
+        key: Колонка-ключ (Tickets.ticket_no, Segments.flight_id, ...)
+        count (int): Желаемое количество шардов
+        bind: Движок SQLAlchemy
+        sample_percent (float): Доля страниц таблицы в выборке, %
+    """
+    if count <= 1:
+        return [Shard(0)]
+
+    column = key.__clause_element__() if hasattr(key, "__clause_element__") else key
+    fractions = array([i / count for i in range(1, count)])
+    sample = column.table.tablesample(func.system(sample_percent))
+    sampled = select(func.percentile_disc(fractions).within_group(sample.c[column.name]))
+
+    with bind.connect() as connection:
+        bounds = connection.execute(sampled).scalar_one()
+        if bounds is None:
+            # Таблица слишком мала для выборки - считаем квантили по всем строкам
+            bounds = connection.execute(select(func.percentile_disc(fractions).within_group(column))).scalar_one()
+
+    bounds = sorted({b for b in bounds or [] if b is not None})
+    return _shards_from_bounds(bounds)
+
+
+def ctid_shards(table, count, bind=engine):
+    """
+    Делит физические блоки таблицы на count шардов (TID Range Scan, PostgreSQL 14+)
+
+    Подходит для таблиц без удобного ключа: каждый шард читает свой
+    непрерывный диапазон страниц без обращения к индексу.
+    """
+    with bind.connect() as connection:
+        pages = connection.execute(
+            text("SELECT pg_relation_size(CAST(:name AS regclass)) / current_setting('block_size')::int"),
+            {"name": table.fullname},
+        ).scalar_one()
+
+    if count <= 1 or pages <= 1:
+        return [Shard(0, by_ctid=True)]
+
+    step = -(-pages // count)
+    bounds = list(range(step, pages, step))
+    return _shards_from_bounds(bounds, by_ctid=True)
+
+
+def _shard_statement(stmt, key, shard):
+    """Запрос одного шарда: stmt может быть функцией shard -> запрос для сложных соединений"""
+    if callable(stmt):
+        return stmt(shard)
+    return stmt.where(shard.where(key))
+
+
+def _compile(stmt, bind):
+    """Компилирует запрос в SQL и параметры драйвера, чтобы передать их в поток/процесс"""
+    compiled = stmt.compile(dialect=bind.dialect, compile_kwargs={"render_postcompile": True})
+    return str(compiled), compiled.params
+
+
+def _stream_batches(bind, sql, params, batch_size):
+    """Читает результат запроса серверным курсором пачками по batch_size строк"""
+    with bind.connect() as connection:
+        result = connection.execution_options(stream_results=True).exec_driver_sql(sql, params)
+        for batch in result.partitions(batch_size):
+            yield batch
+
+
+def _scan_shard(bind, sql, params, map_batch, reduce, initial, batch_size):
+    """Сворачивает один шард: reduce(acc, map_batch(пачка)) для каждой пачки"""
+    accumulator = initial()
+    for batch in _stream_batches(bind, sql, params, batch_size):
+        accumulator = reduce(accumulator, map_batch(batch))
+    return accumulator
+
+
+_worker_engine = None
+
+
+def _init_worker(url):
+    """Инициализация дочернего процесса: собственный движок на одно соединение"""
+    global _worker_engine
+    _worker_engine = create_engine(url, pool_size=1, max_overflow=0)
+
+
+def _scan_shard_in_worker(sql, params, map_batch, reduce, initial, batch_size):
+    return _scan_shard(_worker_engine, sql, params, map_batch, reduce, initial, batch_size)
+
+
+def parallel_scan(stmt, key, shards, map_batch, reduce, initial, workers=None, mode="process",
+                  batch_size=DEFAULT_BATCH_SIZE, url=database_url):
+    """
+    Параллельно сканирует запрос по шардам и потоково сворачивает результат
+
+    Args:
+        stmt: Запрос SQLAlchemy без учёта шардирования, либо функция
+            shard -> запрос, если условие шарда нужно поставить в несколько мест
+        key: Колонка-ключ шардов, либо таблица - для шардов по ctid
+            (не используется, если stmt - функция)
+        shards (list): Шарды из key_shards() или ctid_shards()
+        map_batch: Функция пачка строк -> частичный результат
+        reduce: Функция (аккумулятор, частичный результат) -> аккумулятор;
+            частичный результат и аккумулятор должны быть одного типа
+        initial: Фабрика пустого аккумулятора (например, Counter)
+        workers (int): Количество соединений; по умолчанию - число ядер
+        mode (str): "process" для CPU-ёмкой свёртки, "thread" для лёгкой
+        batch_size (int): Размер пачки серверного курсора
+        url (str): Строка подключения для рабочих соединений
+
+    Returns:
+        Итоговый аккумулятор
+    """
+    workers = min(workers or os.cpu_count() or 1, len(shards))
+    scan_engine = create_engine(url, pool_size=workers, max_overflow=0)
+    compiled = [_compile(_shard_statement(stmt, key, shard), scan_engine) for shard in shards]
+
+    total = initial()
+    try:
+        if mode == "process":
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(url,))
+            submit = lambda sql, params: executor.submit(
+                _scan_shard_in_worker, sql, params, map_batch, reduce, initial, batch_size)
+        elif mode == "thread":
+            executor = ThreadPoolExecutor(max_workers=workers)
+            submit = lambda sql, params: executor.submit(
+                _scan_shard, scan_engine, sql, params, map_batch, reduce, initial, batch_size)
+        else:
+            raise ValueError(f"Неизвестный режим сканирования: {mode}")
+
+        with executor:
+            futures = [submit(sql, params) for sql, params in compiled]
+            for future in as_completed(futures):
+                total = reduce(total, future.result())
+    finally:
+        scan_engine.dispose()
+
+    return total
+
+
+def parallel_batches(stmt, key, shards, workers=None, batch_size=DEFAULT_BATCH_SIZE, max_pending=None,
+                     url=database_url):
+    """
+    Параллельно читает шарды в потоках и отдаёт пачки строк по мере поступления
+
+    Подходит для выгрузок: потребитель получает пачки из всех шардов через
+    ограниченную очередь, поэтому медленная запись тормозит чтение, а не
+    копит строки в памяти. Порядок пачек между шардами не гарантируется.
+    """
+    workers = min(workers or os.cpu_count() or 1, len(shards))
+    scan_engine = create_engine(url, pool_size=workers, max_overflow=0)
+    compiled = [_compile(_shard_statement(stmt, key, shard), scan_engine) for shard in shards]
+    pending = queue.Queue(maxsize=max_pending or workers * 2)
+    finished = object()
+    stop = threading.Event()
+
+    def put(item):
+        # Ожидание с таймаутом, чтобы производитель замечал остановку потребителя
+        while not stop.is_set():
+            try:
+                pending.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce(sql, params):
+        try:
+            for batch in _stream_batches(scan_engine, sql, params, batch_size):
+                if not put(batch):
+                    return
+        except Exception as e:
+            put(e)
+        finally:
+            put(finished)
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        for sql, params in compiled:
+            executor.submit(produce, sql, params)
+
+        remaining = len(compiled)
+        while remaining:
+            item = pending.get()
+            if item is finished:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+    finally:
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+        scan_engine.dispose()
+
+
+def revenue_by_fare_conditions(batch):
+    """Частичная выручка по классу обслуживания для пачки (fare_conditions, price)"""
+    revenue = Counter()
+    for fare_conditions, price in batch:
+        revenue[fare_conditions] += price
+    return revenue
+
+
+def tickets_by_direction(batch):
+    """Частичное количество билетов туда/обратно для пачки (outbound,)"""
+    return Counter("outbound" if outbound else "return" for (outbound,) in batch)
+
+
+def merge_counters(accumulator, partial):
+    accumulator.update(partial)
+    return accumulator
+
+
+def main():
+    """Пример: агрегаты по segments и tickets параллельными шардами"""
+    workers = os.cpu_count() or 1
+    try:
+        shards = key_shards(Segments.flight_id, workers * 4)
+        revenue = parallel_scan(
+            select(Segments.fare_conditions, Segments.price), Segments.flight_id, shards,
+            revenue_by_fare_conditions, merge_counters, Counter, workers=workers,
+        )
+        print(f"Выручка по классам обслуживания ({len(shards)} шардов, {workers} процессов):")
+        for fare_conditions, amount in revenue.most_common():
+            print(f"  {fare_conditions:<10} {amount:>16}")
+
+        shards = key_shards(Tickets.ticket_no, workers * 4)
+        directions = parallel_scan(
+            select(Tickets.outbound), Tickets.ticket_no, shards,
+            tickets_by_direction, merge_counters, Counter, workers=workers, mode="thread",
+        )
+        print(f"Билетов туда: {directions['outbound']}, обратно: {directions['return']}")
+    except Exception as e:
+        print(f"Ошибка при выполнении запроса: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Базовые планы запросов и обнаружение регрессий планов
+
+Каждый именованный запрос из queries.py выполняется с
+EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON). План сохраняется как базовый в
+каталог plan_baselines/, а при проверке сравнивается с базовым:
+- последовательное чтение таблицы вместо индексного доступа;
+- рост оценки стоимости больше, чем в cost_ratio раз;
+- чтение с диска больше max_read_blocks блоков;
+- ожидаемый индекс (например, segments_flight_id_idx) не используется.
+
+Запуск:
+    python plan_baseline.py --record      # сохранить базовые планы
+    python plan_baseline.py               # сравнить с базовыми
+"""
+
+import argparse
+import json
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+from database import engine, explain_plan, plan_nodes
+from queries import NAMED_QUERIES
+
+BASELINE_DIR = Path("plan_baselines")
+
+DEFAULT_COST_RATIO = 1.5
+DEFAULT_MAX_READ_BLOCKS = 10_000
+
+INDEX_SCANS = {"Index Scan", "Index Only Scan", "Bitmap Heap Scan"}
+SEQ_SCANS = {"Seq Scan"}
+
+
+@dataclass(frozen=True)
+class Regression:
+    """Обнаруженная регрессия плана"""
+
+    query: str
+    kind: str
+    message: str
+
+
+def summarize(plan):
+    """Краткая сводка плана: стоимость, буферы, способы чтения таблиц и индексы"""
+    root = plan["Plan"]
+    scans = {}
+    indexes = set()
+    for node in plan_nodes(plan):
+        if "Relation Name" in node:
+            scans.setdefault(node["Relation Name"], set()).add(node["Node Type"])
+        if "Index Name" in node:
+            indexes.add(node["Index Name"])
+    return {
+        "total_cost": root["Total Cost"],
+        "actual_total_time": root.get("Actual Total Time"),
+        "shared_hit_blocks": root.get("Shared Hit Blocks", 0),
+        "shared_read_blocks": root.get("Shared Read Blocks", 0),
+        "scans": {relation: sorted(types) for relation, types in sorted(scans.items())},
+        "indexes": sorted(indexes),
+    }
+
+
+def capture(query, bind=engine):
+    """Выполняет EXPLAIN ANALYZE для запроса и возвращает план со сводкой"""
+    # ANALYZE выполняет запрос по-настоящему; транзакция без commit откатывается при закрытии
+    with bind.connect() as connection:
+        plan = explain_plan(connection, query.build(), analyze=True, buffers=True)
+    return {"query": query.name, "source": query.source, "summary": summarize(plan), "plan": plan}
+
+
+def baseline_path(name, directory=BASELINE_DIR):
+    return Path(directory) / f"{name}.json"
+
+
+def save_baseline(captured, directory=BASELINE_DIR):
+    path = baseline_path(captured["query"], directory)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(captured, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def load_baseline(name, directory=BASELINE_DIR):
+    path = baseline_path(name, directory)
+    if not path.exists():
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(query, current, baseline, cost_ratio=DEFAULT_COST_RATIO, max_read_blocks=DEFAULT_MAX_READ_BLOCKS):
+    """
+    Сравнивает текущую сводку плана с базовой
+
+    Args:
+        query (NamedQuery): Проверяемый запрос
+        current (dict): Сводка текущего плана
+        baseline (dict): Сводка базового плана или None
+        cost_ratio (float): Допустимый рост оценки стоимости
+        max_read_blocks (int): Допустимое число блоков, прочитанных с диска
+
+    Returns:
+        list: Обнаруженные регрессии
+    """
+    regressions = []
+
+    for index in query.expected_indexes:
+        if index not in current["indexes"]:
+            regressions.append(Regression(query.name, "missing_index", f"не используется индекс {index}"))
+
+    if max_read_blocks is not None and current["shared_read_blocks"] > max_read_blocks:
+        regressions.append(Regression(
+            query.name, "buffers",
+            f"прочитано с диска {current['shared_read_blocks']} блоков (порог {max_read_blocks})",
+        ))
+
+    if baseline is None:
+        return regressions
+
+    for relation, types in current["scans"].items():
+        before = set(baseline["scans"].get(relation, []))
+        if SEQ_SCANS & set(types) and INDEX_SCANS & before and not SEQ_SCANS & before:
+            regressions.append(Regression(
+                query.name, "seq_scan",
+                f"{relation}: Seq Scan вместо {', '.join(sorted(INDEX_SCANS & before))}",
+            ))
+
+    if baseline["total_cost"] and current["total_cost"] > baseline["total_cost"] * cost_ratio:
+        regressions.append(Regression(
+            query.name, "cost",
+            f"стоимость выросла {baseline['total_cost']:.2f} -> {current['total_cost']:.2f}",
+        ))
+
+    return regressions
+
+
+def record_all(queries=NAMED_QUERIES, directory=BASELINE_DIR):
+    """Снимает и сохраняет базовые планы всех запросов"""
+    for query in queries:
+        path = save_baseline(capture(query), directory)
+        print(f"Сохранён базовый план {query.name}: {path}")
+
+
+def check_all(queries=NAMED_QUERIES, directory=BASELINE_DIR, **thresholds):
+    """Сравнивает планы всех запросов с базовыми и возвращает список регрессий"""
+    regressions = []
+    for query in queries:
+        baseline = load_baseline(query.name, directory)
+        current = capture(query)["summary"]
+        found = compare(query, current, baseline and baseline["summary"], **thresholds)
+        status = "FAIL" if found else ("OK" if baseline else "NEW")
+        print(f"[{status:<4}] {query.name:<25} стоимость {current['total_cost']:>12.2f}  "
+              f"чтений {current['shared_read_blocks']:>8}  индексы: {', '.join(current['indexes']) or '-'}")
+        for regression in found:
+            print(f"       {regression.kind}: {regression.message}")
+        regressions.extend(found)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Базовые планы запросов и поиск регрессий")
+    parser.add_argument("--record", action="store_true", help="Сохранить текущие планы как базовые")
+    parser.add_argument("--dir", default=BASELINE_DIR, type=Path, help="Каталог базовых планов")
+    parser.add_argument("--cost-ratio", type=float, default=DEFAULT_COST_RATIO)
+    parser.add_argument("--max-read-blocks", type=int, default=DEFAULT_MAX_READ_BLOCKS)
+    args = parser.parse_args()
+
+    try:
+        if args.record:
+            record_all(directory=args.dir)
+            return
+        regressions = check_all(directory=args.dir, cost_ratio=args.cost_ratio,
+                                max_read_blocks=args.max_read_blocks)
+    except Exception as e:
+        print(f"Ошибка при выполнении запроса: {e}")
+        sys.exit(2)
+
+    print(f"\nРегрессий: {len(regressions)}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Именованные запросы, которые выполняют скрипты проекта
+
+Реестр используется инструментами анализа планов (plan_baseline.py) и
+индексов: у каждого запроса есть имя, функция построения с примерными
+параметрами и список индексов, которые он обязан использовать.
+"""
+
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import func, select
+
+from models import AirportsData, Bookings, Flights, Segments, Tickets, t_routes
+from name_search import prefix_query, similar_query
+from query_tickets import tickets_count, tickets_with_amounts, top_bookings_by_amount
+from time_range import TimeWindow, daily_bookings_summary, flights_departing_in
+
+
+@dataclass(frozen=True)
+class NamedQuery:
+    """Запрос из скрипта проекта с ожидаемыми индексами"""
+
+    name: str
+    source: str
+    build: object
+    expected_indexes: tuple = field(default=())
+
+
+def _sample_day():
+    return TimeWindow.day(date.today() - timedelta(days=1))
+
+
+NAMED_QUERIES = [
+    NamedQuery("all_flights", "connect.py", lambda: select(Flights)),
+    NamedQuery("active_flights", "connect.py", lambda: select(Flights).filter(Flights.status != 'Cancelled')),
+    NamedQuery("route_flights", "connect.py", lambda: select(Flights).filter(Flights.route_no == 'PG0001')),
+    NamedQuery(
+        "future_flights", "connect.py",
+        lambda: select(Flights)
+        .filter(Flights.scheduled_departure > datetime.now(timezone.utc))
+        .order_by(Flights.scheduled_departure)
+        .limit(10),
+    ),
+    NamedQuery("all_airports", "query_airports.py", lambda: select(AirportsData)),
+    NamedQuery("tickets_count", "query_tickets.py", tickets_count),
+    NamedQuery("tickets_with_amounts", "query_tickets.py", tickets_with_amounts),
+    NamedQuery(
+        "top_bookings_by_amount", "query_tickets.py", top_bookings_by_amount,
+        expected_indexes=("bookings_total_amount_idx",),
+    ),
+    NamedQuery("all_tickets", "query_tickets_async.py", lambda: select(Tickets)),
+    NamedQuery(
+        "booking_by_ref", "query_tickets_async.py",
+        lambda: select(Bookings).filter(Bookings.book_ref == '00000F'),
+        expected_indexes=("bookings_pkey",),
+    ),
+    NamedQuery("daily_bookings_summary", "time_range.py", lambda: daily_bookings_summary(_sample_day())),
+    NamedQuery(
+        "daily_flights", "time_range.py",
+        lambda: select(func.count()).select_from(flights_departing_in(_sample_day()).subquery()),
+    ),
+    NamedQuery(
+        "segments_by_flight", "models.py (Flights.segments)",
+        lambda: select(Segments.fare_conditions, Segments.price).filter(Segments.flight_id == 1),
+        expected_indexes=("segments_flight_id_idx",),
+    ),
+    NamedQuery(
+        "routes_from_airport", "models.py (t_routes)",
+        lambda: select(t_routes).filter(t_routes.c.departure_airport == 'SVO'),
+        expected_indexes=("routes_departure_airport_lower_idx",),
+    ),
+    NamedQuery(
+        "passenger_name_prefix", "name_search.py",
+        lambda: prefix_query("IVAN"),
+        expected_indexes=("tickets_passenger_name_trgm_idx",),
+    ),
+    NamedQuery(
+        "passenger_name_similar", "name_search.py",
+        lambda: similar_query("IVAN IVANOV"),
+        expected_indexes=("tickets_passenger_name_trgm_idx",),
+    ),
+]
+
+
+def get_query(name):
+    """Возвращает именованный запрос по имени"""
+    for query in NAMED_QUERIES:
+        if query.name == name:
+            return query
+    raise KeyError(f"Неизвестный запрос: {name}")
@@ -1,51 +1,60 @@
+import argparse
 import asyncio
-from config import db
-from sqlalchemy.ext.asyncio import create_async_engine, 
-from sqlalchemy.orm import sessionmaker
+from database import AsyncSessionLocal
+from sqlalchemy import func
 from sqlalchemy.future import select
 from models import AirportsData
+from report import Column, OutputClosed, ReportRenderer, add_format_argument
 
-# Использование асинхронного SQLAlchemy
-# Преобразуем URL для асинхронного подключения (postgresql -> postgresql+asyncpg)
-database_url_async = db.database_url.replace("postgresql://", "postgresql+asyncpg://")
-engine = create_async_engine(database_url_async, echo=False)
-AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+COLUMNS = [
+    Column("airport_code", "Код", 8),
+    Column("airport_name", "Название", 30),
+    Column("city", "Город", 20),
+    Column("country", "Страна", 15),
+    Column("timezone", "Часовой пояс", 20),
+]
 
-async def get_airports_data():
+
+def localized(value):
+    """Извлекает значение из JSONB поля: русское, иначе английское"""
+    if isinstance(value, dict):
+        return value.get('ru', value.get('en', ''))
+    return str(value)
+
+
+async def airport_rows(result):
+    """Строки отчёта из потока аэропортов"""
+    async for airport in result:
+        yield (airport.airport_code, localized(airport.airport_name), localized(airport.city),
+               localized(airport.country), airport.timezone)
+
+
+async def get_airports_data(fmt="table"):
     """Асинхронная функция для получения и отображения данных аэропортов"""
     async with AsyncSessionLocal() as session:
         try:
-            # Асинхронный запрос к таблице AirportsData
-            stmt = select(AirportsData)
-            result = await session.execute(stmt)
-            all_airports = result.scalars().all()
-            
-            print(f"Всего аэропортов в базе: {len(all_airports)}")
-            print("=" * 80)
-            
-            # Вывести заголовки столбцов
-            print(f"{'Код':<8} {'Название':<30} {'Город':<20} {'Страна':<15} {'Часовой пояс':<20}")
-            print("-" * 80)
-            
-            # Вывести данные каждого аэропорта
-            for airport in all_airports:
-                # Извлекаем значения из JSONB полей
-                airport_name = airport.airport_name.get('ru', airport.airport_name.get('en', '')) if isinstance(
-                    airport.airport_name, dict) else str(airport.airport_name)
-                city = airport.city.get('ru', airport.city.get('en', '')) if isinstance(airport.city, dict) else str(
-                    airport.city)
-                country = airport.country.get('ru', airport.country.get('en', '')) if isinstance(airport.country,
-                                                                                                 dict) else str(airport.country)
-                
-                print(
-                    f"{airport.airport_code:<8} {airport_name[:28]:<30} {city[:18]:<20} {country[:13]:<15} {airport.timezone:<20}")
-                
-            print("=" * 80)
-            print(f"Выведено {len(all_airports)} записей")
-            
+            table = fmt == "table"
+            if table:
+                total = await session.scalar(select(func.count()).select_from(AirportsData))
+                print(f"Всего аэропортов в базе: {total}")
+                print("=" * 80, flush=True)
+
+            # Аэропорты читаются потоком и выводятся блоками
+            result = await session.stream_scalars(select(AirportsData))
+            written = await ReportRenderer(COLUMNS, fmt).render_async(airport_rows(result))
+
+            if table:
+                print("=" * 80)
+                print(f"Выведено {written} записей")
+
+        except OutputClosed:
+            return
         except Exception as e:
             print(f"Ошибка при выполнении запроса: {e}")
 
+
 # Запуск асинхронной функции
 if __name__ == "__main__":
-    asyncio.run(get_airports_data())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Список аэропортов")
+    add_format_argument(parser)
+    asyncio.run(get_airports_data(parser.parse_args().format))
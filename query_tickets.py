@@ -1,73 +1,118 @@
-from config import db
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import select
-from models import Tickets, Bookings
+import argparse
 import asyncio
+from collections import Counter
+import deadlines
+from database import AsyncSessionLocal
+from sqlalchemy import func, select
+from models import Tickets, Bookings
+from report import Column, OutputClosed, ReportRenderer, add_format_argument
+
+TICKET_COLUMNS = [
+    Column("ticket_no", "Номер билета", 15),
+    Column("book_ref", "Номер брони", 10),
+    Column("passenger_id", "ID пассажира", 15),
+    Column("passenger_name", "Имя пассажира", 25),
+    Column("outbound", "Вылет?", 8),
+    Column("total_amount", "Сумма брони", 12),
+]
+
+BOOKING_COLUMNS = [
+    Column("book_ref", "Номер брони", 10),
+    Column("book_date", "Дата", 20),
+    Column("total_amount", "Сумма", 12),
+]
+
+
+# Запросы отчёта; их же проверяет plan_baseline.py через реестр queries.py
+
+def tickets_count():
+    """Количество билетов"""
+    return select(func.count()).select_from(Tickets)
+
+
+def tickets_with_amounts():
+    """Билеты вместе с суммой брони одним запросом (внешнее соединение)"""
+    return (
+        select(Tickets.ticket_no, Tickets.book_ref, Tickets.passenger_id, Tickets.passenger_name,
+               Tickets.outbound, Bookings.total_amount)
+        .outerjoin(Bookings, Bookings.book_ref == Tickets.book_ref)
+    )
+
 
-# Получить строку подключения
-connection_string = db.database_url
+def top_bookings_by_amount(limit=10):
+    """Бронирования с наибольшей суммой"""
+    return select(Bookings).order_by(Bookings.total_amount.desc()).limit(limit)
 
-# Использование SQLAlchemy
-database_url_async = db.database_url.replace("postgresql://", "postgresql+asyncpg://")
-engine = create_async_engine(database_url_async, echo=False)
-AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
-async def get_tickets_data():
+async def ticket_rows(result, directions, table):
+    """Строки отчёта из потока билетов; попутно считает билеты туда и обратно"""
+    async for ticket_no, book_ref, passenger_id, passenger_name, outbound, total_amount in result:
+        directions[outbound] += 1
+        if table:
+            outbound = 'Да' if outbound else 'Нет'
+            total_amount = "N/A" if total_amount is None else total_amount
+        yield ticket_no, book_ref, passenger_id, passenger_name, outbound, total_amount
+
+
+async def get_tickets_data(fmt="table", timeout=None):
     """Асинхронная функция для получения и отображения данных билетов"""
     async with AsyncSessionLocal() as session:
         try:
-            # Получить все билеты из таблицы Tickets
-            result = await session.execute(select(Tickets))
-            all_tickets = result.scalars().all()
-            
-            print(f"Всего билетов в базе: {len(all_tickets)}")
-            print("=" * 100)
-            
-            # Вывести заголовки столбцов
-            print(f"{'Номер билета':<15} {'Номер брони':<10} {'ID пассажира':<15} {'Имя пассажира':<25} {'Вылет?':<8} {'Сумма брони':<12}")
-            print("-" * 100)
-            
-            # Вывести данные каждого билета
-            for ticket in all_tickets:
-                # Получить информацию о бронировании
-                result = await session.execute(select(Bookings).filter(Bookings.book_ref == ticket.book_ref))
-                booking = result.scalar_one_or_none()
-                total_amount = booking.total_amount if booking else "N/A"
-                
-                # Ограничить длину отображаемых строк
-                passenger_name = ticket.passenger_name[:23] if ticket.passenger_name else ""
-                
-                print(f"{ticket.ticket_no:<15} {ticket.book_ref:<10} {ticket.passenger_id:<15} {passenger_name:<25} "
-                    f"{'Да' if ticket.outbound else 'Нет':<8} {str(total_amount):<12}")
-                
-            print("=" * 100)
-            print(f"Выведено {len(all_tickets)} записей")
-            
-            # Дополнительная статистика
-            print("\nСтатистика:")
-            outbound_count = len([t for t in all_tickets if t.outbound])
-            return_count = len([t for t in all_tickets if not t.outbound])
-            print(f"- Исходящих билетов: {outbound_count}")
-            print(f"- Возвращающихся билетов: {return_count}")
-            
-            # Топ-10 бронирований по сумме
-            print("\nТоп-10 бронирований по сумме:")
-            result = await session.execute(select(Bookings).order_by(Bookings.total_amount.desc()).limit(10))
-            bookings_with_amount = result.scalars().all()
-            print(f"{'Номер брони':<10} {'Дата':<20} {'Сумма':<12}")
-            print("-" * 45)
-            for booking in bookings_with_amount:
-                print(f"{booking.book_ref:<10} {booking.book_date.strftime('%Y-%m-%d %H:%M'):<20} {booking.total_amount:<12}")
-            
+            # Общий бюджет времени на все запросы отчёта
+            with deadlines.deadline(timeout):
+                await render_tickets(session, fmt)
+
+        except OutputClosed:
+            return
+        except deadlines.DeadlineExceeded as e:
+            print(f"Отчёт прерван: {e}")
         except Exception as e:
             print(f"Ошибка при выполнении запроса: {e}")
             raise
 
+
+async def render_tickets(session, fmt):
+    """Отчёт по билетам; все запросы выполняются с учётом дедлайна"""
+    table = fmt == "table"
+    if table:
+        total = await deadlines.scalar(session, tickets_count())
+        print(f"Всего билетов в базе: {total}")
+        print("=" * 100, flush=True)
+
+    # Билеты вместе с суммой брони читаются потоком
+    result = deadlines.stream(session, tickets_with_amounts())
+    directions = Counter()
+    written = await ReportRenderer(TICKET_COLUMNS, fmt).render_async(ticket_rows(result, directions, table))
+    if not table:
+        return
+
+    print("=" * 100)
+    print(f"Выведено {written} записей")
+
+    # Дополнительная статистика
+    print("\nСтатистика:")
+    print(f"- Исходящих билетов: {directions[True]}")
+    print(f"- Возвращающихся билетов: {directions[False]}")
+
+    # Топ-10 бронирований по сумме
+    print("\nТоп-10 бронирований по сумме:", flush=True)
+    result = await deadlines.execute(session, top_bookings_by_amount())
+    ReportRenderer(BOOKING_COLUMNS).render(
+        (booking.book_ref, booking.book_date.strftime('%Y-%m-%d %H:%M'), booking.total_amount)
+        for booking in result.scalars()
+    )
+
 async def main():
     """Главная асинхронная функция для запуска"""
-    await get_tickets_data()
+    parser = argparse.ArgumentParser(description="Список билетов и бронирований")
+    add_format_argument(parser)
+    parser.add_argument("--timeout", type=float, default=None, help="Бюджет времени на весь отчёт, с")
+    args = parser.parse_args()
+    await get_tickets_data(args.format, args.timeout)
 
 if __name__ == "__main__":
-    # Запуск асинхронной функции
-    asyncio.run(main())
\ No newline at end of file
+    # Запуск асинхронной функции; Ctrl-C отменяет задачу, а вместе с ней и запрос на сервере
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
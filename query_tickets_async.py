@@ -1,18 +1,8 @@
-from config import db
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+from database import AsyncSessionLocal
 from sqlalchemy import select
 from models import Tickets, Bookings
 import asyncio
 
-# Получить строку подключения
-connection_string = db.database_url
-
-# Использование SQLAlchemy
-database_url_async = db.database_url.replace("postgresql://", "postgresql+asyncpg://")
-engine = create_async_engine(database_url_async, echo=False)
-AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-
 async def get_tickets_data():
     """Асинхронная функция для получения и отображения данных билетов"""
     async with AsyncSessionLocal() as session:
@@ -0,0 +1,559 @@
+"""
+Лёгкие классы записей для таблиц и представлений схемы bookings
+
+Файл создан generate_records.py по метаданным models.py - не редактируйте
+его вручную, а перезапустите генератор после изменения моделей.
+"""
+
+import json
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from itertools import starmap
+
+from sqlalchemy.dialects.postgresql import Range
+
+
+def _encode_range(value):
+    if value.empty:
+        return {"empty": True}
+    return {
+        "lower": None if value.lower is None else value.lower.isoformat(),
+        "upper": None if value.upper is None else value.upper.isoformat(),
+        "bounds": value.bounds,
+    }
+
+
+def _decode_range(data):
+    if data.get("empty"):
+        return Range(empty=True)
+    lower, upper = data["lower"], data["upper"]
+    return Range(None if lower is None else datetime.fromisoformat(lower),
+                 None if upper is None else datetime.fromisoformat(upper), bounds=data["bounds"])
+
+
+def dumps(value):
+    """JSON для записи или списка записей"""
+    if isinstance(value, (list, tuple)):
+        return json.dumps([record.to_dict() for record in value], ensure_ascii=False, separators=(",", ":"))
+    return json.dumps(value.to_dict(), ensure_ascii=False, separators=(",", ":"))
+
+
+def loads(record_type, text):
+    """Запись (или список записей, если в JSON массив) типа record_type"""
+    data = json.loads(text)
+    if isinstance(data, list):
+        return [record_type.from_dict(item) for item in data]
+    return record_type.from_dict(data)
+
+
+@dataclass(frozen=True, slots=True)
+class Airplanes:
+    """Airplanes (bookings.airplanes)"""
+
+    airplane_code: str | None
+    model: str | None
+    range: int | None
+    speed: int | None
+
+    @classmethod
+    def from_row(cls, row):
+        """Из строки select(models.t_airplanes) (или любого кортежа в порядке колонок)"""
+        return cls(*row)
+
+    @classmethod
+    def from_rows(cls, rows):
+        return list(starmap(cls, rows))
+
+    def to_dict(self):
+        return {
+            "airplane_code": self.airplane_code,
+            "model": self.model,
+            "range": self.range,
+            "speed": self.speed,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["airplane_code"],
+            data["model"],
+            data["range"],
+            data["speed"],
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class AirplanesData:
+    """Airplanes (internal multilingual data) (bookings.airplanes_data)"""
+
+    airplane_code: str
+    model: dict
+    range: int
+    speed: int
+
+    @classmethod
+    def from_row(cls, row):
+        """Из строки select(models.AirplanesData.__table__) (или любого кортежа в порядке колонок)"""
+        return cls(*row)
+
+    @classmethod
+    def from_rows(cls, rows):
+        return list(starmap(cls, rows))
+
+    def to_dict(self):
+        return {
+            "airplane_code": self.airplane_code,
+            "model": self.model,
+            "range": self.range,
+            "speed": self.speed,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["airplane_code"],
+            data["model"],
+            data["range"],
+            data["speed"],
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class Airports:
+    """Airports (bookings.airports)"""
+
+    airport_code: str | None
+    airport_name: str | None
+    city: str | None
+    country: str | None
+    coordinates: str | None
+    timezone: str | None
+
+    @classmethod
+    def from_row(cls, row):
+        """Из строки select(models.t_airports) (или любого кортежа в порядке колонок)"""
+        return cls(*row)
+
+    @classmethod
+    def from_rows(cls, rows):
+        return list(starmap(cls, rows))
+
+    def to_dict(self):
+        return {
+            "airport_code": self.airport_code,
+            "airport_name": self.airport_name,
+            "city": self.city,
+            "country": self.country,
+            "coordinates": self.coordinates,
+            "timezone": self.timezone,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["airport_code"],
+            data["airport_name"],
+            data["city"],
+            data["country"],
+            data["coordinates"],
+            data["timezone"],
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class AirportsData:
+    """Airports (internal multilingual data) (bookings.airports_data)"""
+
+    airport_code: str
+    airport_name: dict
+    city: dict
+    country: dict
+    coordinates: str
+    timezone: str
+
+    @classmethod
+    def from_row(cls, row):
+        """Из строки select(models.AirportsData.__table__) (или любого кортежа в порядке колонок)"""
+        return cls(*row)
+
+    @classmethod
+    def from_rows(cls, rows):
+        return list(starmap(cls, rows))
+
+    def to_dict(self):
+        return {
+            "airport_code": self.airport_code,
+            "airport_name": self.airport_name,
+            "city": self.city,
+            "country": self.country,
+            "coordinates": self.coordinates,
+            "timezone": self.timezone,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["airport_code"],
+            data["airport_name"],
+            data["city"],
+            data["country"],
+            data["coordinates"],
+            data["timezone"],
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class BoardingPasses:
+    """Boarding passes (bookings.boarding_passes)"""
+
+    ticket_no: str
+    flight_id: int
+    seat_no: str
+    boarding_no: int | None
+    boarding_time: datetime | None
+
+    @classmethod
+    def from_row(cls, row):
+        """Из строки select(models.BoardingPasses.__table__) (или любого кортежа в порядке колонок)"""
+        return cls(*row)
+
+    @classmethod
+    def from_rows(cls, rows):
+        return list(starmap(cls, rows))
+
+    def to_dict(self):
+        return {
+            "ticket_no": self.ticket_no,
+            "flight_id": self.flight_id,
+            "seat_no": self.seat_no,
+            "boarding_no": self.boarding_no,
+            "boarding_time": None if self.boarding_time is None else self.boarding_time.isoformat(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["ticket_no"],
+            data["flight_id"],
+            data["seat_no"],
+            data["boarding_no"],
+            None if data["boarding_time"] is None else datetime.fromisoformat(data["boarding_time"]),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class Bookings:
+    """Bookings (bookings.bookings)"""
+
+    book_ref: str
+    book_date: datetime
+    total_amount: Decimal
+
+    @classmethod
+    def from_row(cls, row):
+        """Из строки select(models.Bookings.__table__) (или любого кортежа в порядке колонок)"""
+        return cls(*row)
+
+    @classmethod
+    def from_rows(cls, rows):
+        return list(starmap(cls, rows))
+
+    def to_dict(self):
+        return {
+            "book_ref": self.book_ref,
+            "book_date": self.book_date.isoformat(),
+            "total_amount": str(self.total_amount),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["book_ref"],
+            datetime.fromisoformat(data["book_date"]),
+            Decimal(data["total_amount"]),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class Flights:
+    """Flights (bookings.flights)"""
+
+    flight_id: int
+    route_no: str
+    status: str
+    scheduled_departure: datetime
+    scheduled_arrival: datetime
+    actual_departure: datetime | None
+    actual_arrival: datetime | None
+
+    @classmethod
+    def from_row(cls, row):
+        """Из строки select(models.Flights.__table__) (или любого кортежа в порядке колонок)"""
+        return cls(*row)
+
+    @classmethod
+    def from_rows(cls, rows):
+        return list(starmap(cls, rows))
+
+    def to_dict(self):
+        return {
+            "flight_id": self.flight_id,
+            "route_no": self.route_no,
+            "status": self.status,
+            "scheduled_departure": self.scheduled_departure.isoformat(),
+            "scheduled_arrival": self.scheduled_arrival.isoformat(),
+            "actual_departure": None if self.actual_departure is None else self.actual_departure.isoformat(),
+            "actual_arrival": None if self.actual_arrival is None else self.actual_arrival.isoformat(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["flight_id"],
+            data["route_no"],
+            data["status"],
+            datetime.fromisoformat(data["scheduled_departure"]),
+            datetime.fromisoformat(data["scheduled_arrival"]),
+            None if data["actual_departure"] is None else datetime.fromisoformat(data["actual_departure"]),
+            None if data["actual_arrival"] is None else datetime.fromisoformat(data["actual_arrival"]),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class Routes:
+    """Routes (bookings.routes)"""
+
+    route_no: str
+    validity: Range
+    departure_airport: str
+    arrival_airport: str
+    airplane_code: str
+    days_of_week: list
+    scheduled_time: time
+    duration: timedelta
+
+    @classmethod
+    def from_row(cls, row):
+        """Из строки select(models.t_routes) (или любого кортежа в порядке колонок)"""
+        return cls(*row)
+
+    @classmethod
+    def from_rows(cls, rows):
+        return list(starmap(cls, rows))
+
+    def to_dict(self):
+        return {
+            "route_no": self.route_no,
+            "validity": _encode_range(self.validity),
+            "departure_airport": self.departure_airport,
+            "arrival_airport": self.arrival_airport,
+            "airplane_code": self.airplane_code,
+            "days_of_week": self.days_of_week,
+            "scheduled_time": self.scheduled_time.isoformat(),
+            "duration": self.duration.total_seconds(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["route_no"],
+            _decode_range(data["validity"]),
+            data["departure_airport"],
+            data["arrival_airport"],
+            data["airplane_code"],
+            data["days_of_week"],
+            time.fromisoformat(data["scheduled_time"]),
+            timedelta(seconds=data["duration"]),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class Seats:
+    """Seats (bookings.seats)"""
+
+    airplane_code: str
+    seat_no: str
+    fare_conditions: str
+
+    @classmethod
+    def from_row(cls, row):
+        """Из строки select(models.Seats.__table__) (или любого кортежа в порядке колонок)"""
+        return cls(*row)
+
+    @classmethod
+    def from_rows(cls, rows):
+        return list(starmap(cls, rows))
+
+    def to_dict(self):
+        return {
+            "airplane_code": self.airplane_code,
+            "seat_no": self.seat_no,
+            "fare_conditions": self.fare_conditions,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["airplane_code"],
+            data["seat_no"],
+            data["fare_conditions"],
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class Segments:
+    """Flight segment (leg) (bookings.segments)"""
+
+    ticket_no: str
+    flight_id: int
+    fare_conditions: str
+    price: Decimal
+
+    @classmethod
+    def from_row(cls, row):
+        """Из строки select(models.Segments.__table__) (или любого кортежа в порядке колонок)"""
+        return cls(*row)
+
+    @classmethod
+    def from_rows(cls, rows):
+        return list(starmap(cls, rows))
+
+    def to_dict(self):
+        return {
+            "ticket_no": self.ticket_no,
+            "flight_id": self.flight_id,
+            "fare_conditions": self.fare_conditions,
+            "price": str(self.price),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["ticket_no"],
+            data["flight_id"],
+            data["fare_conditions"],
+            Decimal(data["price"]),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class Tickets:
+    """Tickets (bookings.tickets)"""
+
+    ticket_no: str
+    book_ref: str
+    passenger_id: str
+    passenger_name: str
+    outbound: bool
+
+    @classmethod
+    def from_row(cls, row):
+        """Из строки select(models.Tickets.__table__) (или любого кортежа в порядке колонок)"""
+        return cls(*row)
+
+    @classmethod
+    def from_rows(cls, rows):
+        return list(starmap(cls, rows))
+
+    def to_dict(self):
+        return {
+            "ticket_no": self.ticket_no,
+            "book_ref": self.book_ref,
+            "passenger_id": self.passenger_id,
+            "passenger_name": self.passenger_name,
+            "outbound": self.outbound,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["ticket_no"],
+            data["book_ref"],
+            data["passenger_id"],
+            data["passenger_name"],
+            data["outbound"],
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class Timetable:
+    """Detailed info about flights (bookings.timetable)"""
+
+    flight_id: int | None
+    route_no: str | None
+    departure_airport: str | None
+    arrival_airport: str | None
+    status: str | None
+    airplane_code: str | None
+    scheduled_departure: datetime | None
+    scheduled_departure_local: datetime | None
+    actual_departure: datetime | None
+    actual_departure_local: datetime | None
+    scheduled_arrival: datetime | None
+    scheduled_arrival_local: datetime | None
+    actual_arrival: datetime | None
+    actual_arrival_local: datetime | None
+
+    @classmethod
+    def from_row(cls, row):
+        """Из строки select(models.t_timetable) (или любого кортежа в порядке колонок)"""
+        return cls(*row)
+
+    @classmethod
+    def from_rows(cls, rows):
+        return list(starmap(cls, rows))
+
+    def to_dict(self):
+        return {
+            "flight_id": self.flight_id,
+            "route_no": self.route_no,
+            "departure_airport": self.departure_airport,
+            "arrival_airport": self.arrival_airport,
+            "status": self.status,
+            "airplane_code": self.airplane_code,
+            "scheduled_departure": None if self.scheduled_departure is None else self.scheduled_departure.isoformat(),
+            "scheduled_departure_local": None if self.scheduled_departure_local is None else self.scheduled_departure_local.isoformat(),
+            "actual_departure": None if self.actual_departure is None else self.actual_departure.isoformat(),
+            "actual_departure_local": None if self.actual_departure_local is None else self.actual_departure_local.isoformat(),
+            "scheduled_arrival": None if self.scheduled_arrival is None else self.scheduled_arrival.isoformat(),
+            "scheduled_arrival_local": None if self.scheduled_arrival_local is None else self.scheduled_arrival_local.isoformat(),
+            "actual_arrival": None if self.actual_arrival is None else self.actual_arrival.isoformat(),
+            "actual_arrival_local": None if self.actual_arrival_local is None else self.actual_arrival_local.isoformat(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["flight_id"],
+            data["route_no"],
+            data["departure_airport"],
+            data["arrival_airport"],
+            data["status"],
+            data["airplane_code"],
+            None if data["scheduled_departure"] is None else datetime.fromisoformat(data["scheduled_departure"]),
+            None if data["scheduled_departure_local"] is None else datetime.fromisoformat(data["scheduled_departure_local"]),
+            None if data["actual_departure"] is None else datetime.fromisoformat(data["actual_departure"]),
+            None if data["actual_departure_local"] is None else datetime.fromisoformat(data["actual_departure_local"]),
+            None if data["scheduled_arrival"] is None else datetime.fromisoformat(data["scheduled_arrival"]),
+            None if data["scheduled_arrival_local"] is None else datetime.fromisoformat(data["scheduled_arrival_local"]),
+            None if data["actual_arrival"] is None else datetime.fromisoformat(data["actual_arrival"]),
+            None if data["actual_arrival_local"] is None else datetime.fromisoformat(data["actual_arrival_local"]),
+        )
+
+
+# Классы записей по полному имени таблицы
+RECORDS = {
+    "bookings.airplanes": Airplanes,
+    "bookings.airplanes_data": AirplanesData,
+    "bookings.airports": Airports,
+    "bookings.airports_data": AirportsData,
+    "bookings.boarding_passes": BoardingPasses,
+    "bookings.bookings": Bookings,
+    "bookings.flights": Flights,
+    "bookings.routes": Routes,
+    "bookings.seats": Seats,
+    "bookings.segments": Segments,
+    "bookings.tickets": Tickets,
+    "bookings.timetable": Timetable,
+}
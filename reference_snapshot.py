@@ -0,0 +1,449 @@
+"""
+Снимок справочных данных в одном файле для мгновенного старта
+
+Аэропорты, самолёты, места и маршруты редко меняются, но каждый рабочий
+процесс загружал их запросами при старте. Снимок хранит их в одном двоичном
+файле, который открывается через mmap без разбора данных:
+
+    магия (8 байт) | длина заголовка (uint64) | заголовок JSON | секции
+
+Заголовок - оглавление: для каждой колонки каждой таблицы тип NumPy, смещение
+и число строк. Секции выровнены по SECTION_ALIGNMENT байт и становятся
+массивами через np.frombuffer прямо над отображённым файлом:
+- коды (CHAR(n), номера мест) - массивы байтовых строк фиксированной ширины;
+- прочий текст - номера в общей таблице строк (смещения uint32 + байты UTF-8),
+  строки декодируются только по запросу;
+- числа и время - массивы фиксированной ширины (время - datetime64[us] в UTC,
+  длительности - секунды, дни недели маршрута - битовая маска).
+
+Снимок помнит два признака версии исходных таблиц: дешёвый - по счётчикам
+изменений строк и файлам таблиц из статистики сервера, и полный - md5
+содержимого (чтение всех строк). load_snapshot() по умолчанию сравнивает с
+базой дешёвый признак, с verify=True - полный, и пересобирает устаревший
+снимок; с check=False готовый снимок открывается без обращения к базе.
+
+Запуск (пересборка при изменении базы и сравнение времени старта):
+    python reference_snapshot.py
+    python reference_snapshot.py --verify     # сравнить md5 содержимого таблиц
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import bindparam, select, text
+
+from database import engine
+from geo import AirportIndex, parse_coordinates
+from models import Seats, t_airplanes, t_airports, t_routes
+from route_feasibility import Airplanes
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+DEFAULT_PATH = Path(".cache") / "reference.snap"
+
+MAGIC = b"BKREFSNP"
+FORMAT_VERSION = 1
+SECTION_ALIGNMENT = 64
+# Магия и длина заголовка
+PREAMBLE = struct.Struct("<8sQ")
+# Пауза между попытками взять блокировку пересборки на Windows, с
+LOCK_RETRY_INTERVAL = 0.1
+
+SOURCE_TABLES = (t_airports, t_airplanes, Seats.__table__, t_routes)
+
+
+def database_version(bind=engine):
+    """md5 содержимого справочных таблиц; меняется при любом изменении их строк"""
+    parts = [
+        f"(SELECT coalesce(md5(string_agg(r::text, '|' ORDER BY r::text)), '') FROM {table.fullname} r)"
+        for table in SOURCE_TABLES
+    ]
+    with bind.connect() as connection:
+        return connection.execute(text(f"SELECT md5({' || '.join(parts)})")).scalar_one()
+
+
+def statistics_version(bind=engine):
+    """
+    Дешёвый признак версии справочных таблиц по статистике сервера
+
+    Счётчики вставленных, изменённых и удалённых строк растут при любом
+    изменении (в том числе откатанном - это лишь лишняя пересборка), файл
+    таблицы меняется при TRUNCATE. После сброса статистики признак другой, и
+    снимок пересобирается.
+
+    Returns:
+        str | None: md5 счётчиков или None, если статистики нет у какой-либо таблицы
+    """
+    statement = text(
+        """
+        SELECT count(*), md5(string_agg(
+            concat_ws(':', relid::regclass, pg_relation_filenode(relid), n_tup_ins, n_tup_upd, n_tup_del),
+            '|' ORDER BY relid::regclass::text))
+        FROM pg_stat_user_tables
+        WHERE relid = ANY(CAST(:tables AS regclass[]))
+        """
+    ).bindparams(bindparam("tables", [table.fullname for table in SOURCE_TABLES]))
+    with bind.connect() as connection:
+        found, version = connection.execute(statement).one()
+    return version if found == len(SOURCE_TABLES) else None
+
+
+class StringTable:
+    """Строки снимка: i-я строка - байты data[offsets[i]:offsets[i + 1]] в UTF-8"""
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode()
+
+    def decode(self, ids):
+        """Строки по массиву номеров"""
+        return [self[i] for i in np.asarray(ids).tolist()]
+
+
+class _StringTableBuilder:
+    def __init__(self):
+        self.ids = {}
+
+    def encode(self, values):
+        """Номера строк (int32); повторяющиеся строки хранятся один раз"""
+        return np.fromiter((self.ids.setdefault(value, len(self.ids)) for value in values),
+                           dtype=np.int32, count=len(values))
+
+    def arrays(self):
+        encoded = [value.encode() for value in self.ids]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.uint32)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def _codes(values):
+    """Байтовые строки фиксированной ширины по самому длинному значению"""
+    return np.array([value.encode() for value in values], dtype=f"S{max(map(len, values), default=1)}")
+
+
+def _utc(values):
+    """datetime с часовым поясом (или None) -> datetime64[us] в UTC (NaT)"""
+    return np.array([None if value is None else value.astimezone(timezone.utc).replace(tzinfo=None)
+                     for value in values], dtype="datetime64[us]")
+
+
+def _seconds(values):
+    return np.fromiter((value.total_seconds() for value in values), dtype=np.int32, count=len(values))
+
+
+def _days_mask(days):
+    """Дни недели 1-7 -> битовая маска (бит 0 - понедельник)"""
+    return sum(1 << (day - 1) for day in days)
+
+
+def fetch_reference_tables(bind=engine):
+    """Справочные таблицы в виде колонок: {таблица: {колонка: массив}} и таблица строк"""
+    strings = _StringTableBuilder()
+    with bind.connect() as connection:
+        airports = connection.execute(select(t_airports)).all()
+        airplanes = connection.execute(select(t_airplanes)).all()
+        seats = connection.execute(select(Seats.airplane_code, Seats.seat_no, Seats.fare_conditions)).all()
+        routes = connection.execute(select(t_routes)).all()
+
+    lon, lat = parse_coordinates([row.coordinates for row in airports])
+    tables = {
+        "airports": {
+            "airport_code": _codes([row.airport_code for row in airports]),
+            "airport_name": strings.encode([row.airport_name for row in airports]),
+            "city": strings.encode([row.city for row in airports]),
+            "country": strings.encode([row.country for row in airports]),
+            "lon": lon,
+            "lat": lat,
+            "timezone": strings.encode([row.timezone for row in airports]),
+        },
+        "airplanes": {
+            "airplane_code": _codes([row.airplane_code for row in airplanes]),
+            "model": strings.encode([row.model for row in airplanes]),
+            "range": np.array([row.range for row in airplanes], dtype=np.int32),
+            "speed": np.array([row.speed for row in airplanes], dtype=np.int32),
+        },
+        "seats": {
+            "airplane_code": _codes([row.airplane_code for row in seats]),
+            "seat_no": _codes([row.seat_no for row in seats]),
+            "fare_conditions": strings.encode([row.fare_conditions for row in seats]),
+        },
+        "routes": {
+            "route_no": strings.encode([row.route_no for row in routes]),
+            "validity_lower": _utc([row.validity.lower for row in routes]),
+            "validity_upper": _utc([row.validity.upper for row in routes]),
+            "departure_airport": _codes([row.departure_airport for row in routes]),
+            "arrival_airport": _codes([row.arrival_airport for row in routes]),
+            "airplane_code": _codes([row.airplane_code for row in routes]),
+            "days_of_week": np.array([_days_mask(row.days_of_week) for row in routes], dtype=np.uint8),
+            "scheduled_time": np.array([row.scheduled_time.hour * 3600 + row.scheduled_time.minute * 60
+                                        + row.scheduled_time.second for row in routes], dtype=np.int32),
+            "duration": _seconds([row.duration for row in routes]),
+        },
+    }
+    return tables, strings.arrays()
+
+
+def _align(position):
+    return -position % SECTION_ALIGNMENT
+
+
+def write_snapshot(path, tables, strings, version, statistics=None):
+    """Записывает снимок во временный файл и атомарно заменяет им path"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    sections = [("strings", "offsets", strings[0]), ("strings", "data", strings[1])]
+    sections += [(table, name, np.ascontiguousarray(array))
+                 for table, columns in tables.items() for name, array in columns.items()]
+
+    # Смещения секций считаются от начала области данных, поэтому не зависят от длины заголовка
+    index, position = {}, 0
+    for table, name, array in sections:
+        position += _align(position)
+        index.setdefault(table, {})[name] = {"dtype": array.dtype.str, "offset": position, "rows": len(array)}
+        position += array.nbytes
+    header = json.dumps({
+        "format": FORMAT_VERSION,
+        "version": version,
+        "statistics": statistics,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "sections": index,
+    }).encode()
+    header += b" " * _align(PREAMBLE.size + len(header))
+
+    # Свой временный файл у каждого процесса: параллельные пересборки не пишут в один файл
+    descriptor, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "wb") as f:
+            f.write(PREAMBLE.pack(MAGIC, len(header)))
+            f.write(header)
+            written = 0
+            for _, _, array in sections:
+                padding = _align(written)
+                f.write(b"\0" * padding)
+                f.write(array.tobytes())
+                written += padding + array.nbytes
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def build_snapshot(path=DEFAULT_PATH, bind=engine):
+    """Строит снимок по текущему содержимому базы; возвращает его версию"""
+    # Версия считается до выборки: изменение во время выборки даст пересборку при следующей проверке
+    statistics = statistics_version(bind)
+    version = database_version(bind)
+    tables, strings = fetch_reference_tables(bind)
+    write_snapshot(path, tables, strings, version, statistics)
+    return version
+
+
+class ReferenceSnapshot:
+    """
+    Открытый через mmap снимок справочных данных
+
+    snapshot["airports"]["lon"] - массив NumPy над отображённым файлом;
+    текстовые колонки - номера строк snapshot.strings (см. text()).
+    Повреждённый файл даёт OSError, ValueError, KeyError или struct.error.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._open()
+        except BaseException:
+            self.close()
+            raise
+
+    def _open(self):
+        magic, header_size = PREAMBLE.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} не является снимком справочных данных")
+        header = json.loads(self._map[PREAMBLE.size:PREAMBLE.size + header_size])
+        self.format = header["format"]
+        self.version = header["version"]
+        self.statistics = header.get("statistics")
+        self.created = header["created"]
+        base = PREAMBLE.size + header_size
+        self.tables = {
+            table: {
+                name: np.frombuffer(self._map, dtype=section["dtype"], count=section["rows"],
+                                    offset=base + section["offset"])
+                for name, section in columns.items()
+            }
+            for table, columns in header["sections"].items()
+        }
+        strings = self.tables.pop("strings")
+        self.strings = StringTable(strings["offsets"], strings["data"])
+
+    def __getitem__(self, table):
+        return self.tables[table]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Освобождает отображение файла; массивы снимка после этого использовать нельзя"""
+        self.tables = {}
+        self.strings = None
+        try:
+            self._map.close()
+        except BufferError:
+            # На массивы ещё есть ссылки - отображение освободится вместе с ними
+            pass
+
+    def text(self, table, column):
+        """Значения текстовой колонки строками Python"""
+        return self.strings.decode(self.tables[table][column])
+
+    def airport_index(self):
+        """Пространственный индекс аэропортов (geo.AirportIndex)"""
+        airports = self.tables["airports"]
+        return AirportIndex(airports["airport_code"].astype("U3"), airports["lon"], airports["lat"])
+
+    def airplanes(self):
+        """Дальность и скорость самолётов (route_feasibility.Airplanes)"""
+        airplanes = self.tables["airplanes"]
+        codes = airplanes["airplane_code"].astype("U3")
+        order = np.argsort(codes)
+        return Airplanes(codes[order], airplanes["range"][order].astype(np.float64),
+                         airplanes["speed"][order].astype(np.float64))
+
+
+def _lock_file(lock):
+    if fcntl is not None:
+        fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        return
+    # msvcrt блокирует байты от текущей позиции; LK_LOCK сдаётся через 10 секунд, поэтому ждём сами
+    lock.seek(0)
+    while True:
+        try:
+            msvcrt.locking(lock.fileno(), msvcrt.LK_NBLCK, 1)
+            return
+        except OSError:
+            time.sleep(LOCK_RETRY_INTERVAL)
+
+
+def _unlock_file(lock):
+    if fcntl is not None:
+        fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+    else:
+        lock.seek(0)
+        msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def _rebuild_lock(path):
+    """
+    Исключительная блокировка пересборки снимка path между процессами
+
+    Блокировка файла <снимок>.lock снимается системой и при аварийном
+    завершении процесса, поэтому брошенных блокировок не бывает.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(path.name + ".lock"), "a+b") as lock:
+        _lock_file(lock)
+        try:
+            yield
+        finally:
+            _unlock_file(lock)
+
+
+def _is_current(path, expected):
+    """Снимок path читается, в текущем формате и совпадает с expected (поле заголовка -> значение)"""
+    try:
+        snapshot = ReferenceSnapshot(path)
+    except (OSError, ValueError, KeyError, struct.error):
+        # Нет файла, или он пустой, обрезанный или чужой - пересобрать
+        return False
+    with snapshot:
+        return snapshot.format == FORMAT_VERSION and all(
+            getattr(snapshot, field) == value for field, value in expected.items())
+
+
+def _expected_version(bind, check, verify):
+    if not check:
+        return {}
+    statistics = None if verify else statistics_version(bind)
+    if statistics is None:
+        return {"version": database_version(bind)}
+    return {"statistics": statistics}
+
+
+def load_snapshot(path=DEFAULT_PATH, bind=engine, check=True, verify=False):
+    """
+    Открывает снимок, при необходимости (пере)строив его
+
+    Пересборку выполняет один процесс: остальные ждут блокировку и, получив
+    её, видят уже новый снимок.
+
+    Args:
+        path: Файл снимка
+        bind: Движок для проверки версии и пересборки
+        check (bool): Сравнить версию снимка с базой; False - открыть без обращения к базе
+        verify (bool): Сравнивать md5 содержимого таблиц (чтение всех строк), а не статистику
+    """
+    path = Path(path)
+    expected = _expected_version(bind, check, verify)
+    if not _is_current(path, expected):
+        with _rebuild_lock(path):
+            # Пока ждали блокировку, снимок мог пересобрать другой процесс
+            if not _is_current(path, expected):
+                build_snapshot(path, bind)
+    return ReferenceSnapshot(path)
+
+
+def main():
+    """Пересборка снимка при изменении базы и сравнение загрузки из базы и из снимка"""
+    parser = argparse.ArgumentParser(description="Снимок справочных данных")
+    parser.add_argument("--verify", action="store_true", help="Сравнить с базой md5 содержимого таблиц")
+    args = parser.parse_args()
+
+    try:
+        started = time.perf_counter()
+        fetch_reference_tables()
+        query_time = time.perf_counter() - started
+        snapshot = load_snapshot(verify=args.verify)
+    except Exception as e:
+        print(f"Ошибка при выполнении запроса: {e}")
+        return
+
+    started = time.perf_counter()
+    ReferenceSnapshot(snapshot.path).close()
+    open_time = time.perf_counter() - started
+
+    print(f"Снимок: {snapshot.path} ({snapshot.path.stat().st_size / 1024:.0f} КБ), версия {snapshot.version}")
+    for table, columns in snapshot.tables.items():
+        print(f"  {table:<10} {len(next(iter(columns.values()))):>8} строк")
+    print(f"Строк в таблице строк: {len(snapshot.strings)}")
+    print(f"Загрузка запросами: {query_time * 1000:.1f} мс, открытие снимка: {open_time * 1000:.2f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Буферизованный потоковый вывод табличных отчётов
+
+Строки принимаются из итератора (или асинхронного итератора), форматируются
+в одном из форматов и пишутся в поток крупными блоками, а не print() на
+строку:
+- table - колонки фиксированной ширины; ширина задаётся явно или
+  определяется по первым sample_size строкам;
+- csv, tsv - с экранированием разделителей и переводов строк;
+- jsonl - по объекту JSON на строку.
+
+Если читатель закрыл канал (python query_tickets.py | head), запись
+прекращается исключением OutputClosed, а stdout перенаправляется в
+/dev/null, чтобы интерпретатор не сообщал об ошибке при выходе.
+"""
+
+import csv
+import io
+import json
+import os
+import sys
+from dataclasses import dataclass
+
+FORMATS = ("table", "csv", "tsv", "jsonl")
+
+DEFAULT_CHUNK_ROWS = 10_000
+DEFAULT_SAMPLE_SIZE = 1_000
+MAX_INFERRED_WIDTH = 40
+
+TSV_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+class OutputClosed(Exception):
+    """Читатель закрыл поток вывода (например, head в конвейере)"""
+
+
+@dataclass(frozen=True)
+class Column:
+    """Колонка отчёта: имя (ключ в csv/jsonl), заголовок и ширина в формате table"""
+
+    name: str
+    title: str = None
+    width: int = None
+    align: str = "<"
+
+    @property
+    def header(self):
+        return self.title or self.name
+
+
+def _text(value):
+    return "" if value is None else str(value)
+
+
+class ReportRenderer:
+    """
+    Форматирует строки отчёта и пишет их в поток блоками
+
+    Args:
+        columns (list): Колонки Column (или строки-имена)
+        fmt (str): Формат из FORMATS
+        out: Текстовый поток, по умолчанию sys.stdout
+        chunk_rows (int): Сколько строк собирается перед записью в поток
+        sample_size (int): По скольким строкам определяется ширина колонок без width
+    """
+
+    def __init__(self, columns, fmt="table", out=None, chunk_rows=DEFAULT_CHUNK_ROWS,
+                 sample_size=DEFAULT_SAMPLE_SIZE):
+        if fmt not in FORMATS:
+            raise ValueError(f"Неизвестный формат отчёта: {fmt}")
+        self.columns = [Column(column) if isinstance(column, str) else column for column in columns]
+        self.fmt = fmt
+        self.out = out or sys.stdout
+        self.chunk_rows = chunk_rows
+        self.sample_size = sample_size if fmt == "table" else 0
+        self.rows_written = 0
+        self._pending = []
+        self._started = False
+        self._format_line = getattr(self, f"_{fmt}_line")
+
+    # Форматы строк
+
+    def _table_line(self, row):
+        return self._template.format(*map(_text, row))
+
+    def _csv_line(self, row):
+        buffer = io.StringIO()
+        # Поля в кавычки берутся по символам lineterminator: с "\n" одиночный \r
+        # остался бы без кавычек, поэтому строка пишется с "\r\n" и обрезается
+        csv.writer(buffer, lineterminator="\r\n").writerow(row)
+        return buffer.getvalue()[:-2] + "\n"
+
+    def _tsv_line(self, row):
+        return "\t".join(_text(value).translate(TSV_ESCAPES) for value in row) + "\n"
+
+    def _jsonl_line(self, row):
+        record = {column.name: value for column, value in zip(self.columns, row)}
+        return json.dumps(record, ensure_ascii=False, default=str) + "\n"
+
+    # Запись
+
+    def _infer_widths(self, sample):
+        widths = []
+        for i, column in enumerate(self.columns):
+            if column.width is not None:
+                widths.append(column.width)
+                continue
+            longest = max((len(_text(row[i])) for row in sample), default=0)
+            widths.append(min(max(longest, len(column.header)), MAX_INFERRED_WIDTH))
+        return widths
+
+    def _start(self, sample):
+        """Заголовок отчёта; для table - ширина колонок по образцу строк"""
+        self._started = True
+        if self.fmt == "table":
+            self.widths = self._infer_widths(sample)
+            # Точность в спецификации формата обрезает значения длиннее колонки
+            self._template = " ".join(
+                f"{{:{column.align}{width}.{width}}}" for column, width in zip(self.columns, self.widths)) + "\n"
+            header = self._template.format(*(column.header for column in self.columns))
+            self._write(header + "-" * (sum(self.widths) + len(self.widths) - 1) + "\n")
+        elif self.fmt == "csv":
+            self._write(self._csv_line([column.name for column in self.columns]))
+        elif self.fmt == "tsv":
+            self._write(self._tsv_line([column.name for column in self.columns]))
+
+    def _write(self, text):
+        try:
+            self.out.write(text)
+        except BrokenPipeError:
+            self._close_broken_output()
+            raise OutputClosed() from None
+
+    def _close_broken_output(self):
+        # Дальнейшие записи и сброс буфера при выходе уходят в /dev/null
+        if self.out is sys.stdout:
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, sys.stdout.fileno())
+            os.close(devnull)
+
+    def _flush_pending(self):
+        if not self._started:
+            self._start(self._pending)
+        if self._pending:
+            self._write("".join(map(self._format_line, self._pending)))
+            self.rows_written += len(self._pending)
+            self._pending = []
+
+    def add(self, row):
+        """Добавляет строку; блок записывается, когда накопится chunk_rows строк"""
+        self._pending.append(row)
+        limit = self.chunk_rows if self._started else max(self.sample_size, 1)
+        if len(self._pending) >= limit:
+            self._flush_pending()
+
+    def finish(self):
+        """Записывает оставшиеся строки и сбрасывает поток"""
+        self._flush_pending()
+        try:
+            self.out.flush()
+        except BrokenPipeError:
+            self._close_broken_output()
+            raise OutputClosed() from None
+        return self.rows_written
+
+    def render(self, rows):
+        """Выводит все строки итератора; возвращает их количество"""
+        for row in rows:
+            self.add(row)
+        return self.finish()
+
+    async def render_async(self, rows):
+        """Выводит все строки асинхронного итератора (например, AsyncResult); возвращает их количество"""
+        async for row in rows:
+            self.add(row)
+        return self.finish()
+
+
+def add_format_argument(parser):
+    """Добавляет в argparse параметр --format"""
+    parser.add_argument("--format", choices=FORMATS, default="table", help="Формат вывода")
@@ -0,0 +1,160 @@
+"""
+Проверка выполнимости маршрутов
+
+Для всех маршрутов t_routes разом считается расстояние по большому кругу
+между аэропортами (см. geo) и сравнивается с характеристиками назначенного
+самолёта из AirplanesData:
+- расстояние больше дальности полёта самолёта (range);
+- длительность duration не согласуется с крейсерской скоростью (speed):
+  ожидаемое время - расстояние / скорость плюс время на взлёт, посадку и
+  руление; длительность вне [min_ratio, max_ratio] от ожидаемой - нарушение.
+
+Маршрут с аэропортом или самолётом, которых нет в справочниках, не
+проверяется и сам считается нарушением (unknown_airport, unknown_airplane):
+остальные маршруты проверяются как обычно.
+
+Проверка входит в consistency_check и выполняется вместе с остальными
+проверками данных.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+from sqlalchemy import select
+
+from database import engine
+from geo import AirportIndex, load_routes, route_distances
+from models import AirplanesData
+
+# Время на взлёт, посадку и руление сверх полёта на крейсерской скорости, ч
+GROUND_OVERHEAD_HOURS = 0.5
+DEFAULT_MIN_RATIO = 0.75
+DEFAULT_MAX_RATIO = 1.5
+
+COLUMNS = ("route_no", "departure_airport", "arrival_airport", "airplane_code",
+           "problem", "distance_km", "range_km", "duration_h", "expected_h")
+
+
+@dataclass(frozen=True)
+class Airplanes:
+    """Характеристики самолётов в виде массивов, упорядоченных по коду"""
+
+    codes: np.ndarray
+    range_km: np.ndarray
+    speed_kmh: np.ndarray
+
+    @classmethod
+    def load(cls, bind=engine):
+        stmt = select(AirplanesData.airplane_code, AirplanesData.range, AirplanesData.speed)
+        with bind.connect() as connection:
+            rows = connection.execute(stmt).all()
+        codes = np.array([row.airplane_code for row in rows], dtype="U3")
+        # Побайтовый порядок кодов - для бинарного поиска в positions()
+        order = np.argsort(codes)
+        return cls(
+            codes[order],
+            np.array([row.range for row in rows], dtype=np.float64)[order],
+            np.array([row.speed for row in rows], dtype=np.float64)[order],
+        )
+
+    def lookup(self, codes):
+        """
+        Позиции кодов самолётов в массивах
+
+        Returns:
+            tuple: (позиции, маска известных кодов); позиция неизвестного кода не определена
+        """
+        codes = np.asarray(codes, dtype="U3")
+        if not len(self.codes):
+            return np.zeros(len(codes), dtype=np.intp), np.zeros(len(codes), dtype=bool)
+        position = np.searchsorted(self.codes, codes)
+        position[position == len(self.codes)] = 0
+        return position, self.codes[position] == codes
+
+    def positions(self, codes):
+        """Позиции кодов самолётов в массивах; неизвестный код - KeyError"""
+        position, known = self.lookup(codes)
+        if not known.all():
+            unknown = np.asarray(codes, dtype="U3")[~known]
+            raise KeyError(f"Неизвестные коды самолётов: {sorted(set(unknown.tolist()))}")
+        return position
+
+
+def route_feasibility(airports, airplanes, routes, min_ratio=DEFAULT_MIN_RATIO, max_ratio=DEFAULT_MAX_RATIO):
+    """
+    Векторная проверка всех маршрутов
+
+    Args:
+        airports (AirportIndex): Координаты аэропортов
+        airplanes (Airplanes): Дальность и скорость самолётов
+        routes: Строки load_routes()
+        min_ratio (float): Минимальное отношение duration к ожидаемому времени полёта
+        max_ratio (float): Максимальное отношение duration к ожидаемому времени полёта
+
+    Returns:
+        list: Нарушения - кортежи в порядке COLUMNS
+    """
+    if not routes:
+        return []
+    plane, plane_known = airplanes.lookup([route.airplane_code for route in routes])
+    airport_known = np.fromiter(
+        (route.departure_airport in airports.position and route.arrival_airport in airports.position
+         for route in routes), dtype=bool, count=len(routes))
+    duration = np.fromiter((route.duration.total_seconds() / 3600 for route in routes),
+                           dtype=np.float64, count=len(routes))
+
+    violations = []
+    for problem, mask in (("unknown_airport", ~airport_known), ("unknown_airplane", ~plane_known)):
+        for i in np.flatnonzero(mask).tolist():
+            route = routes[i]
+            violations.append((
+                route.route_no, route.departure_airport, route.arrival_airport, route.airplane_code, problem,
+                None, None, round(float(duration[i]), 2), None,
+            ))
+
+    checked = np.flatnonzero(airport_known & plane_known)
+    if not len(checked):
+        return violations
+    checked_routes = [routes[i] for i in checked.tolist()]
+    distance = route_distances(airports, checked_routes)
+    plane, duration = plane[checked], duration[checked]
+    range_km = airplanes.range_km[plane]
+    expected = distance / airplanes.speed_kmh[plane] + GROUND_OVERHEAD_HOURS
+
+    problems = {
+        "out_of_range": distance > range_km,
+        "too_fast": duration < expected * min_ratio,
+        "too_slow": duration > expected * max_ratio,
+    }
+    for problem, mask in problems.items():
+        for i in np.flatnonzero(mask).tolist():
+            route = checked_routes[i]
+            violations.append((
+                route.route_no, route.departure_airport, route.arrival_airport, route.airplane_code, problem,
+                round(float(distance[i]), 1), int(range_km[i]), round(float(duration[i]), 2),
+                round(float(expected[i]), 2),
+            ))
+    return violations
+
+
+def check_routes(bind=engine, **thresholds):
+    """Загружает маршруты, аэропорты и самолёты и возвращает нарушения"""
+    return route_feasibility(AirportIndex.load(bind), Airplanes.load(bind), load_routes(bind), **thresholds)
+
+
+def main():
+    try:
+        violations = check_routes()
+    except Exception as e:
+        print(f"Ошибка при выполнении запроса: {e}")
+        return
+
+    print(f"Нарушений: {len(violations)}")
+    if violations:
+        print("\t".join(COLUMNS))
+        for row in violations:
+            print("\t".join(str(value) for value in row))
+
+
+if __name__ == "__main__":
+    main()
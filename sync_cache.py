@@ -0,0 +1,254 @@
+"""
+Инкрементальная синхронизация бронирований в локальный кэш Parquet
+
+Каждый запуск забирает только бронирования, оформленные после водяного знака
+(book_date, book_ref), вместе с их билетами и сегментами, и дописывает их
+новыми файлами Parquet в каталоги bookings/, tickets/ и segments/. Водяной
+знак хранится в state.json и заменяется атомарно после записи файлов: если
+запуск прервётся, следующий перечитает ту же порцию и перезапишет те же
+файлы, не создав дублей. Бронирования моложе SAFETY_LAG не забираются, чтобы
+не пропустить транзакции, которые ещё не зафиксированы.
+
+Аналитика читает кэш через read_table() / load_segments() без обращения к
+базе.
+
+Запуск:
+    python sync_cache.py
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from sqlalchemy import and_, select, tuple_
+
+from columnar import Columns
+from database import engine
+from models import Bookings, Segments, Tickets
+
+DEFAULT_CACHE_DIR = Path(".cache") / "sync"
+STATE_FILE = "state.json"
+# Количество бронирований в одной порции (одном файле каждой таблицы)
+DEFAULT_CHUNK_SIZE = 100_000
+DEFAULT_BATCH_SIZE = 50_000
+SAFETY_LAG = timedelta(minutes=5)
+
+SCHEMAS = {
+    "bookings": pa.schema([
+        ("book_ref", pa.string()),
+        ("book_date", pa.timestamp("us", tz="UTC")),
+        ("total_amount", pa.decimal128(10, 2)),
+    ]),
+    "tickets": pa.schema([
+        ("ticket_no", pa.string()),
+        ("book_ref", pa.string()),
+        ("passenger_id", pa.string()),
+        ("passenger_name", pa.string()),
+        ("outbound", pa.bool_()),
+    ]),
+    "segments": pa.schema([
+        ("ticket_no", pa.string()),
+        ("flight_id", pa.int32()),
+        ("fare_conditions", pa.dictionary(pa.int8(), pa.string())),
+        ("price", pa.decimal128(10, 2)),
+    ]),
+}
+
+
+def _after(watermark):
+    """Бронирования строго после водяного знака (book_date, book_ref)"""
+    if watermark is None:
+        return True
+    return tuple_(Bookings.book_date, Bookings.book_ref) > tuple_(*watermark)
+
+
+def _up_to(last):
+    """Бронирования не позже последнего бронирования порции"""
+    return tuple_(Bookings.book_date, Bookings.book_ref) <= tuple_(*last)
+
+
+def delta_queries(watermark, last):
+    """Запросы порции: бронирования, их билеты и сегменты между watermark и last"""
+    in_chunk = and_(_after(watermark), _up_to(last))
+    return {
+        "bookings": (
+            select(Bookings.book_ref, Bookings.book_date, Bookings.total_amount)
+            .where(in_chunk)
+        ),
+        "tickets": (
+            select(Tickets.ticket_no, Tickets.book_ref, Tickets.passenger_id, Tickets.passenger_name,
+                   Tickets.outbound)
+            .join(Bookings, Bookings.book_ref == Tickets.book_ref)
+            .where(in_chunk)
+        ),
+        "segments": (
+            select(Segments.ticket_no, Segments.flight_id, Segments.fare_conditions, Segments.price)
+            .join(Tickets, Tickets.ticket_no == Segments.ticket_no)
+            .join(Bookings, Bookings.book_ref == Tickets.book_ref)
+            .where(in_chunk)
+        ),
+    }
+
+
+def chunk_end(connection, watermark, cutoff, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Ключ (book_date, book_ref) последнего бронирования следующей порции или None"""
+    keys = (
+        select(Bookings.book_date, Bookings.book_ref)
+        .where(_after(watermark))
+        .where(Bookings.book_date < cutoff)
+        .order_by(Bookings.book_date, Bookings.book_ref)
+        .limit(chunk_size)
+        .subquery()
+    )
+    return connection.execute(
+        select(keys.c.book_date, keys.c.book_ref)
+        .order_by(keys.c.book_date.desc(), keys.c.book_ref.desc())
+        .limit(1)
+    ).first()
+
+
+def _arrow_array(values, data_type):
+    """Массив Arrow заданного типа; словарные колонки кодируются по значениям пачки"""
+    if pa.types.is_dictionary(data_type):
+        return pa.array(values, type=data_type.value_type).dictionary_encode().cast(data_type)
+    return pa.array(values, type=data_type)
+
+
+def fetch_table(connection, stmt, schema, batch_size=DEFAULT_BATCH_SIZE):
+    """Читает запрос серверным курсором в таблицу Arrow"""
+    batches = []
+    result = connection.execution_options(stream_results=True).execute(stmt)
+    for rows in result.partitions(batch_size):
+        arrays = [_arrow_array(values, field.type) for field, values in zip(schema, zip(*rows))]
+        batches.append(pa.record_batch(arrays, schema=schema))
+    return pa.Table.from_batches(batches, schema=schema)
+
+
+def _write_durably(path, write):
+    """Записывает файл во временный, сбрасывает на диск и атомарно заменяет"""
+    temporary = path.with_name(path.name + ".tmp")
+    write(temporary)
+    with open(temporary, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+
+class SyncCache:
+    """Кэш Parquet с водяным знаком последнего синхронизированного бронирования"""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR):
+        self.directory = Path(directory)
+        self.state = self._load_state()
+
+    def _load_state(self):
+        path = self.directory / STATE_FILE
+        if not path.exists():
+            return {"watermark": None, "parts": 0, "rows": {name: 0 for name in SCHEMAS}}
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_state(self):
+        def write(path):
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.state, f, ensure_ascii=False, indent=2)
+        _write_durably(self.directory / STATE_FILE, write)
+
+    @property
+    def watermark(self):
+        """Водяной знак (book_date, book_ref) или None, если кэш пуст"""
+        if self.state["watermark"] is None:
+            return None
+        book_date, book_ref = self.state["watermark"]
+        return datetime.fromisoformat(book_date), book_ref
+
+    def part_path(self, name, part):
+        return self.directory / name / f"part-{part:06d}.parquet"
+
+    def parts(self, name):
+        """Файлы таблицы, учтённые водяным знаком (незавершённые запуски игнорируются)"""
+        return [self.part_path(name, part) for part in range(self.state["parts"])]
+
+    def sync(self, bind=engine, chunk_size=DEFAULT_CHUNK_SIZE, now=None):
+        """
+        Дописывает в кэш бронирования, оформленные после водяного знака
+
+        Returns:
+            dict: Количество новых строк по таблицам
+        """
+        cutoff = (now or datetime.now(timezone.utc)) - SAFETY_LAG
+        added = {name: 0 for name in SCHEMAS}
+        for name in SCHEMAS:
+            (self.directory / name).mkdir(parents=True, exist_ok=True)
+
+        while True:
+            # Порция читается в одной транзакции REPEATABLE READ - согласованный снимок трёх таблиц
+            with bind.connect().execution_options(isolation_level="REPEATABLE READ") as connection:
+                last = chunk_end(connection, self.watermark, cutoff, chunk_size)
+                if last is None:
+                    break
+                tables = {
+                    name: fetch_table(connection, stmt, SCHEMAS[name])
+                    for name, stmt in delta_queries(self.watermark, tuple(last)).items()
+                }
+
+            part = self.state["parts"]
+            for name, table in tables.items():
+                _write_durably(self.part_path(name, part), lambda path, table=table: pq.write_table(table, path))
+                added[name] += table.num_rows
+                self.state["rows"][name] += table.num_rows
+            self.state["parts"] = part + 1
+            self.state["watermark"] = [last.book_date.isoformat(), last.book_ref]
+            self._save_state()
+        return added
+
+    def read_table(self, name, columns=None):
+        """Таблица Arrow из всех синхронизированных файлов"""
+        paths = self.parts(name)
+        if not paths:
+            return SCHEMAS[name].empty_table().select(columns or SCHEMAS[name].names)
+        return pa.concat_tables([pq.read_table(path, columns=columns) for path in paths]).unify_dictionaries()
+
+    def load_segments(self):
+        """Сегменты в формате columnar.load_segments: flight_id, коды fare_conditions, price_cents"""
+        table = self.read_table("segments", ["flight_id", "fare_conditions", "price"]).combine_chunks()
+        # После unify_dictionaries и combine_chunks у колонки один фрагмент с общим словарём
+        fare_conditions = table["fare_conditions"].combine_chunks()
+        price_cents = pc.cast(pc.multiply(table["price"], pa.scalar(100)), pa.int64())
+        return Columns(
+            {
+                "flight_id": table["flight_id"].to_numpy(),
+                "fare_conditions": fare_conditions.indices.to_numpy(zero_copy_only=False).astype(np.int32),
+                "price_cents": price_cents.to_numpy(),
+            },
+            {"fare_conditions": fare_conditions.dictionary.to_pylist()},
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Инкрементальная синхронизация бронирований в кэш Parquet")
+    parser.add_argument("--dir", type=Path, default=DEFAULT_CACHE_DIR, help="Каталог кэша")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Бронирований в одной порции")
+    args = parser.parse_args()
+
+    cache = SyncCache(args.dir)
+    started = time.perf_counter()
+    try:
+        added = cache.sync(chunk_size=args.chunk_size)
+    except Exception as e:
+        print(f"Ошибка при синхронизации: {e}")
+        return
+
+    print(f"Синхронизация за {time.perf_counter() - started:.1f} с, водяной знак: {cache.watermark}")
+    for name, count in added.items():
+        print(f"  {name:<10} +{count:<10} всего {cache.state['rows'][name]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Пакетная запись bulk_upsert: исход каждой строки на клоне шаблонной базы"""
+
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import insert, select
+
+from bulk_upsert import upsert_boarding_passes
+from db_fixtures import database_available
+from models import BoardingPasses, Bookings, Flights, Segments, Tickets
+
+pytestmark = pytest.mark.skipif(not database_available(), reason="PostgreSQL недоступен")
+
+SEAT_KEY = "boarding_passes_flight_id_seat_no_key"
+BOARDING_NO_KEY = "boarding_passes_flight_id_boarding_no_key"
+SEGMENT_FKEY = "boarding_passes_ticket_no_flight_id_fkey"
+BOARDING_TIME = datetime(2026, 10, 1, 9, 30, tzinfo=timezone.utc)
+TICKETS = ["T000000000001", "T000000000002", "T000000000003", "T000000000004"]
+
+
+@pytest.fixture
+def flight_id(db_engine):
+    """Рейс с сегментами четырёх билетов; у первого билета уже есть талон на место 1A"""
+    departure = datetime(2026, 10, 1, 10, 0, tzinfo=timezone.utc)
+    with db_engine.begin() as connection:
+        flight_id = connection.execute(
+            insert(Flights.__table__).values(
+                route_no="PG0001", status="Scheduled",
+                scheduled_departure=departure, scheduled_arrival=departure + timedelta(hours=2),
+            ).returning(Flights.__table__.c.flight_id)
+        ).scalar_one()
+        connection.execute(insert(Bookings.__table__).values(
+            book_ref="T00001", book_date=departure - timedelta(days=7), total_amount=Decimal("400.00")))
+        connection.execute(insert(Tickets.__table__), [
+            {"ticket_no": ticket_no, "book_ref": "T00001", "passenger_id": str(i),
+             "passenger_name": f"PASSENGER {i}", "outbound": True}
+            for i, ticket_no in enumerate(TICKETS)
+        ])
+        connection.execute(insert(Segments.__table__), [
+            {"ticket_no": ticket_no, "flight_id": flight_id, "fare_conditions": "Economy", "price": Decimal("100.00")}
+            for ticket_no in TICKETS
+        ])
+        connection.execute(insert(BoardingPasses.__table__).values(
+            ticket_no=TICKETS[0], flight_id=flight_id, seat_no="1A", boarding_no=1, boarding_time=BOARDING_TIME))
+    return flight_id
+
+
+def _upsert(db_engine, rows):
+    with db_engine.begin() as connection:
+        return upsert_boarding_passes(connection, rows)
+
+
+def _seats(db_engine, flight_id):
+    """Места рейса по номерам билетов"""
+    table = BoardingPasses.__table__
+    with db_engine.connect() as connection:
+        return dict(connection.execute(
+            select(table.c.ticket_no, table.c.seat_no).where(table.c.flight_id == flight_id)).all())
+
+
+def test_seat_taken_by_existing_row(db_engine, flight_id):
+    result = _upsert(db_engine, [
+        (TICKETS[1], flight_id, "1A", 2, BOARDING_TIME),
+        (TICKETS[2], flight_id, "2A", 3, BOARDING_TIME),
+    ])
+
+    assert result.outcomes == [SEAT_KEY, "inserted"]
+    assert result.rejected() == [(0, SEAT_KEY)]
+    assert _seats(db_engine, flight_id) == {TICKETS[0]: "1A", TICKETS[2]: "2A"}
+
+
+def test_same_seat_twice_in_batch(db_engine, flight_id):
+    result = _upsert(db_engine, [
+        (TICKETS[1], flight_id, "2A", 2, BOARDING_TIME),
+        (TICKETS[2], flight_id, "2A", 3, BOARDING_TIME),
+        (TICKETS[3], flight_id, "3A", 2, BOARDING_TIME),
+    ])
+
+    # Место и номер посадки получает более ранняя строка пачки
+    assert result.outcomes == ["inserted", SEAT_KEY, BOARDING_NO_KEY]
+    assert _seats(db_engine, flight_id) == {TICKETS[0]: "1A", TICKETS[1]: "2A"}
+
+
+def test_rejected_last_row_falls_back_to_previous(db_engine, flight_id):
+    result = _upsert(db_engine, [
+        (TICKETS[1], flight_id, "3A", 2, BOARDING_TIME),
+        (TICKETS[1], flight_id, "1A", 2, BOARDING_TIME),
+    ])
+
+    assert result.outcomes == ["inserted", SEAT_KEY]
+    assert _seats(db_engine, flight_id) == {TICKETS[0]: "1A", TICKETS[1]: "3A"}
+
+
+def test_later_row_wins_and_earlier_is_duplicate(db_engine, flight_id):
+    result = _upsert(db_engine, [
+        (TICKETS[1], flight_id, "3A", 2, BOARDING_TIME),
+        (TICKETS[1], flight_id, "4A", 2, BOARDING_TIME),
+    ])
+
+    assert result.outcomes == ["duplicate", "inserted"]
+    assert _seats(db_engine, flight_id)[TICKETS[1]] == "4A"
+
+
+def test_unchanged_and_updated_rows(db_engine, flight_id):
+    assert _upsert(db_engine, [(TICKETS[0], flight_id, "1A", 1, BOARDING_TIME)]).outcomes == ["unchanged"]
+
+    later = BOARDING_TIME + timedelta(minutes=5)
+    assert _upsert(db_engine, [(TICKETS[0], flight_id, "1A", 1, later)]).outcomes == ["updated"]
+
+    table = BoardingPasses.__table__
+    with db_engine.connect() as connection:
+        assert connection.execute(
+            select(table.c.boarding_time).where(table.c.ticket_no == TICKETS[0])).scalar_one() == later
+
+
+def test_row_without_segment_is_rejected(db_engine, flight_id):
+    result = _upsert(db_engine, [("T999999999999", flight_id, "5A", 5, BOARDING_TIME)])
+
+    assert result.outcomes == [SEGMENT_FKEY]
+    assert result.counts == {SEGMENT_FKEY: 1}
@@ -0,0 +1,103 @@
+"""Группировки columnar: group_sum и отчёты RevenueAnalytics против подсчёта в цикле"""
+
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+from columnar import CategoryEncoder, Columns, RevenueAnalytics, dense_group_sum, group_sum
+
+
+def _expected(codes, values):
+    sums, counts = defaultdict(int), defaultdict(int)
+    for code, value in zip(codes.tolist(), values.tolist()):
+        sums[code] += value
+        counts[code] += 1
+    keys = sorted(sums)
+    return keys, [sums[key] for key in keys], [counts[key] for key in keys]
+
+
+@pytest.mark.parametrize("groups", [1, 7, 5_000])
+def test_group_sum_matches_loop(groups):
+    rng = np.random.default_rng(groups)
+    codes = rng.integers(-groups, groups, 20_000)
+    values = rng.integers(0, 10**12, 20_000)
+
+    keys, sums, counts = group_sum(codes, values)
+
+    assert (keys.tolist(), sums.tolist(), counts.tolist()) == _expected(codes, values)
+    assert sums.dtype == np.int64
+
+
+def test_group_sum_is_exact_beyond_float_precision():
+    values = np.array([2**53, 1, 1], dtype=np.int64)
+    _, sums, _ = group_sum(np.zeros(3, dtype=np.int64), values)
+    assert sums.tolist() == [2**53 + 2]
+
+
+def test_group_sum_empty():
+    keys, sums, counts = group_sum(np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64))
+    assert (len(keys), len(sums), len(counts)) == (0, 0, 0)
+    assert keys.dtype == np.int32 and sums.dtype == np.int64
+
+
+def test_dense_group_sum_matches_group_sum():
+    rng = np.random.default_rng(3)
+    codes = rng.integers(0, 3, 1_000)
+    values = rng.integers(0, 10**9, 1_000)
+
+    keys, sums, counts = dense_group_sum(codes, values, 5)
+
+    assert keys.tolist() == [0, 1, 2, 3, 4]
+    assert sums.tolist() == _expected(codes, values)[1] + [0, 0]
+    assert counts.tolist() == _expected(codes, values)[2] + [0, 0]
+
+
+def test_revenue_analytics_reports():
+    routes = CategoryEncoder()
+    fares = CategoryEncoder()
+    flights = Columns(
+        {
+            "flight_id": np.array([10, 11, 12], dtype=np.int32),
+            "route_no": routes.encode(["PG0001", "PG0002", "PG0001"]),
+            "scheduled_departure": np.array(
+                ["2026-10-01T23:00", "2026-10-02T01:00", "2026-10-02T10:00"], dtype="datetime64[s]"),
+        },
+        {"route_no": routes.categories},
+    )
+    segments = Columns(
+        {
+            # Рейса 99 нет в flights: он входит только в отчёты по рейсам и классам
+            "flight_id": np.array([10, 11, 12, 12, 99], dtype=np.int32),
+            "fare_conditions": fares.encode(["Economy", "Business", "Economy", "Comfort", "Economy"]),
+            "price_cents": np.array([100, 500, 150, 300, 7], dtype=np.int64),
+        },
+        {"fare_conditions": fares.categories},
+    )
+    analytics = RevenueAnalytics(segments, flights)
+
+    per_flight = analytics.per_flight()
+    assert per_flight.keys.tolist() == [10, 11, 12, 99]
+    assert per_flight.revenue_cents.tolist() == [100, 500, 450, 7]
+
+    per_fare = dict(zip(*analytics.per_fare_conditions()[:2]))
+    assert per_fare == {"Business": 500, "Comfort": 300, "Economy": 257}
+
+    per_route = analytics.per_route()
+    assert dict(zip(per_route.keys, per_route.revenue_cents.tolist())) == {"PG0001": 550, "PG0002": 500}
+
+    per_day = analytics.per_day()
+    assert per_day.keys.astype(str).tolist() == ["2026-10-01", "2026-10-02"]
+    assert per_day.revenue_cents.tolist() == [100, 950]
+    assert per_day.counts.tolist() == [1, 3]
+
+
+def test_columns_save_load_round_trip(tmp_path):
+    encoder = CategoryEncoder()
+    columns = Columns({"code": encoder.encode(["b", "a", "b"]), "value": np.arange(3)}, {"code": encoder.categories})
+
+    columns.save(tmp_path)
+    loaded = Columns.load(tmp_path)
+
+    assert loaded.decode("code").tolist() == ["b", "a", "b"]
+    assert loaded["value"].tolist() == [0, 1, 2]
@@ -0,0 +1,67 @@
+"""Фикстуры db_fixtures: откат db_session и изоляция клонов шаблона"""
+
+import random
+import string
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+
+from db_fixtures import database_available, database_url_for
+from models import Bookings
+
+
+pytestmark = pytest.mark.skipif(not database_available(), reason="PostgreSQL недоступен")
+
+
+def _booking():
+    # Префикс T не встречается в номерах бронирований демо-базы
+    book_ref = "T" + "".join(random.choices(string.ascii_uppercase + string.digits, k=5))
+    return Bookings(book_ref=book_ref, book_date=datetime.now(timezone.utc), total_amount=Decimal("100.00"))
+
+
+def _count(bind, book_refs):
+    with bind.connect() as connection:
+        return connection.execute(
+            select(func.count()).select_from(Bookings).where(Bookings.book_ref.in_(book_refs))
+        ).scalar_one()
+
+
+@pytest.fixture
+def absent_after_test(db_bind):
+    """Номера бронирований, которых не должно быть в базе после теста (проверка после отката db_session)"""
+    book_refs = []
+    yield book_refs
+    assert _count(db_bind, book_refs) == 0
+
+
+def test_db_session_commit_is_rolled_back(absent_after_test, db_session, db_bind):
+    booking = _booking()
+    absent_after_test.append(booking.book_ref)
+
+    db_session.add(booking)
+    db_session.commit()
+
+    # После commit() строка видна в сессии теста, но внешняя транзакция не зафиксирована
+    assert db_session.get(Bookings, booking.book_ref) is not None
+    assert _count(db_bind, [booking.book_ref]) == 0
+
+
+def test_clones_are_isolated(db_clone_pool):
+    names = [db_clone_pool.acquire(), db_clone_pool.acquire()]
+    binds = [create_engine(database_url_for(name), poolclass=NullPool) for name in names]
+    try:
+        booking = _booking()
+        with Session(binds[0]) as session:
+            session.add(booking)
+            session.commit()
+
+        assert _count(binds[0], [booking.book_ref]) == 1
+        assert _count(binds[1], [booking.book_ref]) == 0
+    finally:
+        for bind, name in zip(binds, names):
+            bind.dispose()
+            db_clone_pool.release(name)
@@ -0,0 +1,165 @@
+"""Дедлайны deadlines.stream(): statement_timeout, проверка между порциями и контекст вызывающего"""
+
+import asyncio
+
+import pytest
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+import deadlines
+from database import database_url_async
+from db_fixtures import database_available
+
+
+class FakeResult:
+    """Результат потокового запроса: порции строк с задержкой перед каждой"""
+
+    def __init__(self, partitions, delay):
+        self._partitions = partitions
+        self.delay = delay
+        self.closed = False
+
+    async def partitions(self, size):
+        for partition in self._partitions:
+            await asyncio.sleep(self.delay)
+            yield partition
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeScalar:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+
+class FakeConnection:
+    """
+    Асинхронное соединение: ведёт statement_timeout как сервер (SET LOCAL и
+    восстановление) и запоминает значение, при котором выполнялся каждый запрос
+    """
+
+    def __init__(self, partitions=(), delay=0.0, setting="0"):
+        self.info = {"backend_pid": 1}
+        self.invalidated = False
+        self.setting = setting
+        self.timeouts_ms = []
+        self.executed = []
+        self.result = FakeResult(partitions, delay)
+
+    async def execute(self, stmt, params=None):
+        if stmt is deadlines.SET_STATEMENT_TIMEOUT:
+            previous, self.setting = self.setting, params["ms"]
+            self.timeouts_ms.append(int(params["ms"]))
+            return FakeScalar(previous)
+        if stmt is deadlines.RESTORE_STATEMENT_TIMEOUT:
+            self.setting = params["previous"]
+            return FakeScalar(self.setting)
+        self.executed.append((stmt, self.setting))
+        return FakeScalar(None)
+
+    async def stream(self, stmt, params=None):
+        self.executed.append((stmt, self.setting))
+        return self.result
+
+
+async def _collect(rows, check=None):
+    collected = []
+    async for row in rows:
+        if check is not None:
+            check()
+        collected.append(row)
+    return collected
+
+
+@pytest.mark.asyncio
+async def test_stream_timeout_sets_statement_timeout_without_leaking_into_caller():
+    connection = FakeConnection([[1, 2], [3]])
+
+    def caller_has_no_deadline():
+        assert deadlines.remaining() is None
+
+    rows = await _collect(deadlines.stream(connection, None, timeout=5), caller_has_no_deadline)
+
+    assert rows == [1, 2, 3]
+    assert len(connection.timeouts_ms) == 1
+    assert 4_000 < connection.timeouts_ms[0] <= 5_000
+    assert connection.result.closed
+
+
+@pytest.mark.asyncio
+async def test_stream_timeout_is_bounded_by_outer_deadline():
+    connection = FakeConnection([[1]])
+    with deadlines.deadline(1):
+        await _collect(deadlines.stream(connection, None, timeout=10))
+    assert connection.timeouts_ms[0] <= 1_000
+
+
+@pytest.mark.asyncio
+async def test_stream_timeout_expires_between_partitions():
+    connection = FakeConnection([[1], [2], [3]], delay=0.05)
+    with pytest.raises(deadlines.DeadlineExceeded):
+        await _collect(deadlines.stream(connection, None, timeout=0.08))
+    assert connection.result.closed
+
+
+@pytest.mark.asyncio
+async def test_stream_closed_from_another_task():
+    connection = FakeConnection([[1], [2]])
+    rows = deadlines.stream(connection, None, timeout=5)
+    assert await anext(rows) == 1
+
+    # Так генератор закрывает финализатор asyncgen - в другой задаче и другом контексте
+    await asyncio.create_task(rows.aclose())
+
+    assert connection.result.closed
+    assert deadlines.remaining() is None
+
+
+@pytest.mark.asyncio
+async def test_timeout_does_not_outlive_its_statement():
+    connection = FakeConnection(setting="30s")
+
+    await deadlines.execute(connection, "q1", timeout=0.5)
+    await deadlines.execute(connection, "q2")
+    await _collect(deadlines.stream(connection, "q3", timeout=5))
+    await _collect(deadlines.stream(connection, "q4"))
+
+    limited, q2, limited_stream, q4 = connection.executed
+    assert limited[0] == "q1" and 0 < int(limited[1]) <= 500
+    assert q2 == ("q2", "30s")
+    assert limited_stream[0] == "q3" and 4_000 < int(limited_stream[1]) <= 5_000
+    assert q4 == ("q4", "30s")
+    assert connection.setting == "30s"
+
+
+@pytest.mark.asyncio
+async def test_stream_closed_early_restores_timeout():
+    connection = FakeConnection([[1], [2]])
+    rows = deadlines.stream(connection, None, timeout=5)
+    assert await anext(rows) == 1
+    assert connection.setting != "0"
+
+    await rows.aclose()
+
+    assert connection.setting == "0"
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not database_available(), reason="PostgreSQL недоступен")
+async def test_untimed_statement_after_timed_one_in_same_transaction():
+    bind = create_async_engine(database_url_async, poolclass=NullPool)
+    try:
+        async with bind.connect() as connection:
+            default = await connection.scalar(text("SHOW statement_timeout"))
+            await deadlines.execute(connection, select(func.pg_sleep(0)), timeout=0.5)
+            assert await connection.scalar(text("SHOW statement_timeout")) == default
+            # Под statement_timeout 500 мс прошлого запроса этот был бы прерван
+            await deadlines.execute(connection, select(func.pg_sleep(0.7)))
+            await connection.execute(select(func.pg_sleep(0.7)))
+    finally:
+        await bind.dispose()
@@ -0,0 +1,80 @@
+"""Скетчи KLL fare_sketches: ошибка ранга, слияние и сохранение"""
+
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from fare_sketches import KLLSketch, SketchStore
+
+QS = np.linspace(0.01, 0.99, 99)
+# Ошибка ранга порядка 1/k; для k=200 с запасом
+MAX_RANK_ERROR = 0.02
+
+
+def _rank_error(sketch, values):
+    ordered = np.sort(values)
+    estimates = sketch.quantiles(QS)
+    ranks = np.searchsorted(ordered, estimates, side="right") / len(ordered)
+    return float(np.max(np.abs(ranks - QS)))
+
+
+def test_rank_error_is_bounded():
+    values = np.random.default_rng(1).lognormal(10, 1, 200_000)
+    sketch = KLLSketch(seed=1)
+    for chunk in np.array_split(values, 50):
+        sketch.update(chunk)
+
+    assert sketch.n == len(values)
+    assert sum(len(items) * 2 ** level for level, items in enumerate(sketch.levels)) == len(values)
+    assert sum(len(items) for items in sketch.levels) < 3 * sketch.k
+    assert _rank_error(sketch, values) < MAX_RANK_ERROR
+    assert sketch.quantiles([0.0, 1.0]).tolist() == [values.min(), values.max()]
+
+
+def test_merged_shards_rank_error_is_bounded():
+    values = np.random.default_rng(2).uniform(0, 1_000, 100_000)
+    merged = KLLSketch(seed=0)
+    for shard, chunk in enumerate(np.array_split(values, 16)):
+        merged.merge(KLLSketch(seed=shard + 1).update(chunk))
+
+    assert merged.n == len(values)
+    assert _rank_error(merged, values) < MAX_RANK_ERROR
+
+
+def test_sketches_without_seed_compact_independently():
+    values = np.arange(10_000, dtype=np.float64)
+    first, second = KLLSketch().update(values), KLLSketch().update(values)
+    assert any(not np.array_equal(a, b) for a, b in zip(first.levels, second.levels))
+
+
+def test_store_save_load_round_trip(tmp_path):
+    rng = np.random.default_rng(3)
+    sketches = {
+        ("Economy", "PG0001"): KLLSketch(seed=1).update(rng.integers(100_000, 500_000, 5_000)),
+        ("Business", "PG0001"): KLLSketch(seed=2).update(rng.integers(500_000, 2_000_000, 300)),
+        ("Comfort", "PG0002"): KLLSketch(seed=3),
+    }
+    covered_until = datetime(2026, 10, 1, tzinfo=timezone.utc)
+    path = SketchStore(sketches, covered_until).save(tmp_path / "sketches.npz")
+
+    loaded = SketchStore.load(path)
+
+    assert loaded.covered_until == covered_until
+    assert loaded.k == SketchStore().k
+    assert loaded.sketches.keys() == sketches.keys()
+    for key, sketch in sketches.items():
+        restored = loaded.sketches[key]
+        assert (restored.n, restored.min, restored.max) == (sketch.n, sketch.min, sketch.max)
+        assert [len(items) for items in restored.levels] == [len(items) for items in sketch.levels]
+        np.testing.assert_array_equal(restored.quantiles(QS), sketch.quantiles(QS))
+
+
+def test_load_missing_store_is_empty(tmp_path):
+    store = SketchStore.load(tmp_path / "missing.npz")
+    assert store.sketches == {} and store.covered_until is None
+
+
+@pytest.mark.parametrize("qs", [[0.5], [0.1, 0.9]])
+def test_empty_sketch_quantiles_are_nan(qs):
+    assert np.isnan(KLLSketch().quantiles(qs)).all()
@@ -0,0 +1,90 @@
+"""Пакетные выборки fast_lookup: объединение ключей BatchLoader и порции MAX_BATCH_KEYS"""
+
+import asyncio
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+
+from fast_lookup import BOOKINGS_SQL, MAX_BATCH_KEYS, BatchLoader, BookingRow, Loaders, LookupRepository, chunks
+
+
+class FakePool:
+    """Пул asyncpg, отвечающий на запросы = ANY($1) по словарю строк"""
+
+    def __init__(self, records):
+        self.records = records
+        self.calls = []
+
+    async def fetch(self, sql, keys):
+        self.calls.append((sql, list(keys)))
+        await asyncio.sleep(0)
+        return [self.records[key] for key in keys if key in self.records]
+
+
+def _booking(book_ref):
+    return (book_ref, datetime(2026, 10, 1, tzinfo=timezone.utc), Decimal("100.00"))
+
+
+@pytest.fixture
+def pool():
+    return FakePool({f"B{i:05d}": _booking(f"B{i:05d}") for i in range(3 * MAX_BATCH_KEYS)})
+
+
+@pytest.mark.asyncio
+async def test_same_tick_loads_are_one_query(pool):
+    loader = Loaders(LookupRepository(pool)).booking
+
+    rows = await asyncio.gather(loader.load("B00001"), loader.load("B00002"), loader.load("B00001"))
+
+    assert pool.calls == [(BOOKINGS_SQL, ["B00001", "B00002"])]
+    assert "= ANY($1)" in BOOKINGS_SQL
+    assert rows == [BookingRow._make(_booking("B00001")), BookingRow._make(_booking("B00002")),
+                    BookingRow._make(_booking("B00001"))]
+
+    # Загруженный ключ берётся из кэша загрузчика
+    assert await loader.load("B00002") == rows[1]
+    assert len(pool.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_batch_is_split_at_max_keys(pool):
+    keys = [f"B{i:05d}" for i in range(2 * MAX_BATCH_KEYS + 10)]
+
+    rows = await Loaders(LookupRepository(pool)).booking.load_many(keys)
+
+    assert [len(call_keys) for _, call_keys in pool.calls] == [MAX_BATCH_KEYS, MAX_BATCH_KEYS, 10]
+    assert [key for _, call_keys in pool.calls for key in call_keys] == keys
+    assert [row.book_ref for row in rows] == keys
+
+
+@pytest.mark.asyncio
+async def test_missing_keys_are_none(pool):
+    loader = Loaders(LookupRepository(pool)).booking
+
+    assert await loader.load_many(["B00003", "MISSING", "B00004"]) == [
+        BookingRow._make(_booking("B00003")), None, BookingRow._make(_booking("B00004"))]
+    assert len(pool.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_error_is_not_cached():
+    calls = []
+
+    async def batch(keys):
+        calls.append(keys)
+        if len(calls) == 1:
+            raise ConnectionError("обрыв соединения")
+        return {key: key.lower() for key in keys}
+
+    loader = BatchLoader(batch)
+    with pytest.raises(ConnectionError):
+        await loader.load_many(["A", "B"])
+
+    assert await loader.load_many(["A", "B"]) == ["a", "b"]
+    assert calls == [["A", "B"], ["A", "B"]]
+
+
+def test_chunks_drop_repeats():
+    assert chunks(["a", "b", "a", "c", "b"], size=2) == [["a", "b"], ["c"]]
+    assert chunks([]) == []
@@ -0,0 +1,80 @@
+"""Пространственный индекс geo: k-d дерево против перебора по формуле гаверсинусов"""
+
+import numpy as np
+import pytest
+
+from geo import AirportIndex, KDTree, haversine_km, parse_coordinates, unit_vectors
+
+POINTS = 2_000
+
+
+@pytest.fixture(scope="module")
+def airports():
+    rng = np.random.default_rng(7)
+    lon = rng.uniform(-180, 180, POINTS)
+    # Равномерно по сфере, а не по широте
+    lat = np.degrees(np.arcsin(rng.uniform(-1, 1, POINTS)))
+    codes = np.array([f"{i:03X}" for i in range(POINTS)], dtype="U3")
+    return AirportIndex(codes, lon, lat)
+
+
+def _brute_force(airports, lon, lat):
+    return haversine_km(lon, lat, airports.lon, airports.lat)
+
+
+@pytest.mark.parametrize("where", [(37.41, 55.97), (-0.45, 51.47), (179.9, -89.0), (0.0, 0.0)])
+def test_nearest_matches_brute_force(airports, where):
+    distances = _brute_force(airports, *where)
+    expected = np.argsort(distances, kind="stable")[:10]
+
+    found = airports.nearest(where, 10)
+
+    assert [code for code, _ in found] == airports.codes[expected].tolist()
+    np.testing.assert_allclose([km for _, km in found], distances[expected], rtol=1e-9, atol=1e-6)
+
+
+def test_nearest_by_code_excludes_itself(airports):
+    code = str(airports.codes[42])
+    distances = _brute_force(airports, airports.lon[42], airports.lat[42])
+    distances[42] = np.inf
+
+    found = airports.nearest(code, 5)
+
+    assert code not in [found_code for found_code, _ in found]
+    assert [found_code for found_code, _ in found] == airports.codes[np.argsort(distances)[:5]].tolist()
+    assert airports.nearest(code, 1, include_self=True)[0] == (code, pytest.approx(0.0, abs=1e-6))
+
+
+@pytest.mark.parametrize("radius_km", [0.0, 300.0, 1_500.0, 25_000.0])
+def test_within_matches_brute_force(airports, radius_km):
+    where = (37.41, 55.97)
+    distances = _brute_force(airports, *where)
+    expected = np.flatnonzero(distances <= radius_km)
+    expected = expected[np.argsort(distances[expected], kind="stable")]
+
+    found = airports.within(where, radius_km)
+
+    assert sorted(code for code, _ in found) == sorted(airports.codes[expected].tolist())
+    np.testing.assert_allclose([km for _, km in found], distances[expected], rtol=1e-9, atol=1e-6)
+
+
+@pytest.mark.parametrize("k", [1, 3, 50])
+def test_kdtree_nearest_euclidean(k):
+    points = np.random.default_rng(k).normal(size=(500, 3))
+    point = np.zeros(3)
+    distances = np.sqrt(((points - point) ** 2).sum(axis=1))
+
+    found = KDTree(points, leaf_size=4).nearest(point, k)
+
+    assert [i for i, _ in found] == np.argsort(distances)[:k].tolist()
+
+
+def test_empty_tree():
+    tree = KDTree(np.empty((0, 3)))
+    assert tree.nearest(np.zeros(3), 3) == [] and tree.within(np.zeros(3), 1.0) == []
+
+
+def test_parse_coordinates():
+    lon, lat = parse_coordinates(["(37.4146,55.9726)", " ( -0.4619 , 51.47 ) "])
+    assert lon.tolist() == [37.4146, -0.4619] and lat.tolist() == [55.9726, 51.47]
+    np.testing.assert_allclose(np.linalg.norm(unit_vectors(lon, lat), axis=1), 1.0)
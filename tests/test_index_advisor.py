@@ -0,0 +1,31 @@
+"""Покрытие индексов-кандидатов index_advisor существующими индексами"""
+
+import pytest
+
+from index_advisor import Candidate, ExistingIndex, is_covered
+
+INDEXES = {
+    "bookings_pkey": ExistingIndex("btree", (("book_ref", False),)),
+    "tickets_passenger_name_trgm_idx": ExistingIndex("gin", (("passenger_name", False),)),
+    "bookings_total_amount_book_date_idx": ExistingIndex("btree", (("total_amount", False), ("book_date", True))),
+    "flights_status_idx": ExistingIndex("btree", (("status", False),), partial=True),
+}
+
+
+@pytest.mark.parametrize("columns, covered", [
+    ((("book_ref", False),), True),
+    # Префикс ключа в прямом и обратном порядке обхода
+    ((("total_amount", False),), True),
+    ((("total_amount", True),), True),
+    ((("total_amount", False), ("book_date", True)), True),
+    ((("total_amount", True), ("book_date", False)), True),
+    # Смешанные направления не совпадают ни с прямым, ни с обратным обходом
+    ((("total_amount", True), ("book_date", True)), False),
+    ((("book_date", True),), False),
+    # GIN с gin_trgm_ops не заменяет B-дерево
+    ((("passenger_name", False),), False),
+    # Частичный индекс подходит не для всех запросов
+    ((("status", False),), False),
+])
+def test_is_covered(columns, covered):
+    assert is_covered(Candidate("bookings", columns), INDEXES) is covered
@@ -0,0 +1,56 @@
+"""Индекс имён NameIndex: префиксный поиск и сходство триграмм против перебора"""
+
+import numpy as np
+import pytest
+
+from name_search import NameIndex, trigrams
+
+NAMES = ["IVAN IVANOV", "IVAN PETROV", "IVANNA SIDOROVA", "PETR IVANOV", "OLGA SMIRNOVA", "ivan ivanovich"]
+
+
+@pytest.fixture(scope="module")
+def index():
+    # По два билета на каждое имя, в перемешанном порядке
+    codes = np.array([0, 1, 2, 3, 4, 5, 5, 4, 3, 2, 1, 0])
+    ticket_nos = np.array([f"{i:013d}".encode() for i in range(len(codes))])
+    return NameIndex(NAMES, codes, ticket_nos)
+
+
+def _similarity(a, b):
+    a, b = trigrams(a), trigrams(b)
+    return len(a & b) / len(a | b)
+
+
+def test_trigrams_like_pg_trgm():
+    assert trigrams("Ivan") == {"  i", " iv", "iva", "van", "an "}
+    assert trigrams("a-b") == {"  a", " a ", "  b", " b "}
+
+
+def test_tickets_grouped_by_name(index):
+    assert index.tickets(0) == ["0000000000000", "0000000000011"]
+    assert index.tickets(5) == ["0000000000005", "0000000000006"]
+
+
+def test_prefix_is_case_insensitive_and_sorted(index):
+    assert [match.name for match in index.prefix("ivan")] == [
+        "IVAN IVANOV", "ivan ivanovich", "IVAN PETROV", "IVANNA SIDOROVA"]
+    assert [match.name for match in index.prefix("Ivan ", limit=2)] == ["IVAN IVANOV", "ivan ivanovich"]
+    assert index.prefix("ZZZ") == []
+    assert all(match.similarity == 1.0 for match in index.prefix("P"))
+
+
+@pytest.mark.parametrize("query", ["IVAN IVANOV", "ivanov", "SMIRNOVA OLGA", "PETER"])
+@pytest.mark.parametrize("threshold", [0.0, 0.3, 0.6])
+def test_similar_matches_brute_force(index, query, threshold):
+    similarity = {name: _similarity(query, name) for name in NAMES}
+    expected = sorted((name for name in NAMES if similarity[name] >= threshold and similarity[name] > 0),
+                      key=lambda name: (-similarity[name], name))[:3]
+
+    found = index.similar(query, limit=3, threshold=threshold)
+
+    assert [match.name for match in found] == expected
+    assert [match.similarity for match in found] == pytest.approx([similarity[name] for name in expected])
+
+
+def test_similar_without_shared_trigrams(index):
+    assert index.similar("XYZ") == []
@@ -0,0 +1,32 @@
+"""Реестр именованных запросов queries.py"""
+
+from pathlib import Path
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+import query_tickets
+from queries import NAMED_QUERIES, get_query
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_names_are_unique():
+    names = [query.name for query in NAMED_QUERIES]
+    assert len(names) == len(set(names))
+
+
+@pytest.mark.parametrize("query", NAMED_QUERIES, ids=lambda query: query.name)
+def test_query_builds_and_source_exists(query):
+    assert (ROOT / query.source.split()[0]).exists()
+    assert str(query.build().compile(dialect=postgresql.dialect()))
+
+
+@pytest.mark.parametrize("name, builder", [
+    ("tickets_count", query_tickets.tickets_count),
+    ("tickets_with_amounts", query_tickets.tickets_with_amounts),
+    ("top_bookings_by_amount", query_tickets.top_bookings_by_amount),
+])
+def test_query_tickets_statements_are_registered(name, builder):
+    # Реестр и скрипт строят запрос одной функцией - расхождение невозможно
+    assert get_query(name).build is builder
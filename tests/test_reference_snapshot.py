@@ -0,0 +1,78 @@
+"""Снимок справочных данных: чтение, повреждённые файлы и пересборка"""
+
+import numpy as np
+import pytest
+
+import reference_snapshot
+from reference_snapshot import FORMAT_VERSION, ReferenceSnapshot, _StringTableBuilder, write_snapshot
+
+
+def _write(path, version="v1", statistics="s1"):
+    strings = _StringTableBuilder()
+    tables = {
+        "airports": {
+            "airport_code": np.array([b"SVO", b"LED"]),
+            "city": strings.encode(["Москва", "Санкт-Петербург"]),
+            "lon": np.array([37.41, 30.26]),
+        },
+    }
+    write_snapshot(path, tables, strings.arrays(), version, statistics)
+    return path
+
+
+def test_round_trip(tmp_path):
+    path = _write(tmp_path / "reference.snap")
+
+    with ReferenceSnapshot(path) as snapshot:
+        assert (snapshot.format, snapshot.version, snapshot.statistics) == (FORMAT_VERSION, "v1", "s1")
+        assert snapshot["airports"]["airport_code"].tolist() == [b"SVO", b"LED"]
+        assert snapshot.text("airports", "city") == ["Москва", "Санкт-Петербург"]
+        assert snapshot["airports"]["lon"].tolist() == [37.41, 30.26]
+
+
+@pytest.mark.parametrize("content", [b"", b"BKREF", b"NOTASNAP" + bytes(64), None])
+def test_unreadable_snapshot_is_not_current(tmp_path, content):
+    path = tmp_path / "reference.snap"
+    if content is None:
+        # Обрезанный снимок: заголовок цел, секций нет
+        content = _write(path).read_bytes()[:60]
+    path.write_bytes(content)
+
+    assert not reference_snapshot._is_current(path, {})
+
+
+def test_is_current_compares_expected_fields(tmp_path):
+    path = _write(tmp_path / "reference.snap")
+    assert reference_snapshot._is_current(path, {})
+    assert reference_snapshot._is_current(path, {"statistics": "s1"})
+    assert not reference_snapshot._is_current(path, {"statistics": "s2"})
+    assert not reference_snapshot._is_current(path, {"version": "v2"})
+    assert not reference_snapshot._is_current(tmp_path / "missing.snap", {})
+
+
+def test_load_snapshot_rebuilds_corrupt_file(tmp_path, monkeypatch):
+    path = tmp_path / "reference.snap"
+    path.write_bytes(b"\0" * 10)
+    built = []
+    monkeypatch.setattr(reference_snapshot, "build_snapshot", lambda path, bind: built.append(_write(path)))
+
+    with reference_snapshot.load_snapshot(path, check=False) as snapshot:
+        assert snapshot.version == "v1"
+    assert built == [path]
+
+    # Исправный снимок без проверки версии открывается как есть
+    reference_snapshot.load_snapshot(path, check=False).close()
+    assert len(built) == 1
+
+
+def test_check_uses_statistics_unless_verify(tmp_path, monkeypatch):
+    path = _write(tmp_path / "reference.snap")
+    monkeypatch.setattr(reference_snapshot, "statistics_version", lambda bind: "s1")
+    monkeypatch.setattr(reference_snapshot, "database_version", lambda bind: "v2")
+    monkeypatch.setattr(reference_snapshot, "build_snapshot",
+                        lambda path, bind: _write(path, version="v2"))
+
+    with reference_snapshot.load_snapshot(path) as snapshot:
+        assert snapshot.version == "v1"
+    with reference_snapshot.load_snapshot(path, verify=True) as snapshot:
+        assert snapshot.version == "v2"
@@ -0,0 +1,130 @@
+"""Вывод отчётов report: экранирование csv/tsv, ширина колонок, закрытый канал"""
+
+import asyncio
+import csv
+import io
+import json
+
+import pytest
+
+from report import MAX_INFERRED_WIDTH, Column, OutputClosed, ReportRenderer
+
+ROWS = [
+    ("PG0001", 'с "кавычками", и запятой', None),
+    ("PG0002", "две\nстроки\tи таб", 1.5),
+    ("PG0003", "обратный \\ слеш\r", 0),
+]
+
+
+def _render(fmt, rows=ROWS, columns=("route_no", "comment", "value"), **kwargs):
+    out = io.StringIO()
+    count = ReportRenderer(list(columns), fmt, out, **kwargs).render(rows)
+    return out.getvalue(), count
+
+
+class BrokenPipe(io.StringIO):
+    """Поток, читатель которого закрылся после limit записей"""
+
+    def __init__(self, limit=0, fail_flush=False):
+        super().__init__()
+        self.limit = limit
+        self.fail_flush = fail_flush
+
+    def write(self, text):
+        if self.limit <= 0:
+            raise BrokenPipeError()
+        self.limit -= 1
+        return super().write(text)
+
+    def flush(self):
+        if self.fail_flush:
+            raise BrokenPipeError()
+
+
+def test_csv_round_trip():
+    text, count = _render("csv")
+
+    assert count == len(ROWS)
+    header, *rows = csv.reader(io.StringIO(text))
+    assert header == ["route_no", "comment", "value"]
+    assert rows == [["" if value is None else str(value) for value in row] for row in ROWS]
+
+
+def test_tsv_escapes_separators():
+    text, _ = _render("tsv")
+
+    lines = text.split("\n")
+    assert lines[-1] == "" and len(lines) == len(ROWS) + 2
+    assert lines[0] == "route_no\tcomment\tvalue"
+    assert lines[2] == "PG0002\tдве\\nстроки\\tи таб\t1.5"
+    assert lines[3] == "PG0003\tобратный \\\\ слеш\\r\t0"
+    assert all(line.count("\t") == 2 for line in lines[:-1])
+
+
+def test_jsonl_lines():
+    text, _ = _render("jsonl")
+    records = [json.loads(line) for line in text.splitlines()]
+    assert records[1] == {"route_no": "PG0002", "comment": "две\nстроки\tи таб", "value": 1.5}
+
+
+def test_table_width_inferred_from_sample():
+    rows = [("a", "x" * 5), ("bbb", "y" * (MAX_INFERRED_WIDTH + 10)), ("cccccccc", "z")]
+    columns = [Column("code", "Код"), Column("text", "Текст")]
+
+    text, _ = _render("table", rows, columns, sample_size=2)
+
+    header, rule, *lines = text.splitlines()
+    # Ширина "code" - по двум первым строкам (3 символа), третья строка обрезается
+    assert header == "Код " + "Текст".ljust(MAX_INFERRED_WIDTH)
+    assert rule == "-" * (3 + 1 + MAX_INFERRED_WIDTH)
+    assert lines[1] == "bbb " + "y" * MAX_INFERRED_WIDTH
+    assert lines[2].startswith("ccc z")
+
+
+def test_table_explicit_width_and_alignment():
+    columns = [Column("code", width=6), Column("amount", "Сумма", width=8, align=">")]
+    text, _ = _render("table", [("PG0001", 12.5), (None, 7)], columns)
+
+    assert text.splitlines() == [
+        "code      Сумма",
+        "-" * 15,
+        "PG0001     12.5",
+        "              7",
+    ]
+
+
+def test_chunks_are_written_in_blocks():
+    out = BrokenPipe(limit=10)
+    ReportRenderer(["n"], "csv", out, chunk_rows=4).render((i,) for i in range(10))
+    # Заголовок, первая строка (образец не нужен) и блоки по 4, 4 и 1 строке
+    assert out.limit == 10 - 5
+    assert out.getvalue().splitlines() == ["n"] + [str(i) for i in range(10)]
+
+
+def test_broken_pipe_raises_output_closed():
+    out = BrokenPipe(limit=3)
+    renderer = ReportRenderer(["n"], "csv", out, chunk_rows=3)
+
+    with pytest.raises(OutputClosed):
+        renderer.render((i,) for i in range(100))
+    assert renderer.rows_written == 4
+
+
+def test_broken_pipe_on_flush_raises_output_closed():
+    with pytest.raises(OutputClosed):
+        ReportRenderer(["n"], "tsv", BrokenPipe(limit=10, fail_flush=True)).render([(1,)])
+
+
+def test_render_async():
+    async def rows():
+        for row in ROWS:
+            yield row
+
+    out = io.StringIO()
+    count = asyncio.run(ReportRenderer(["route_no", "comment", "value"], "jsonl", out).render_async(rows()))
+    assert count == len(ROWS) and len(out.getvalue().splitlines()) == len(ROWS)
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        ReportRenderer(["n"], "xml")
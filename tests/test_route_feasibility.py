@@ -0,0 +1,57 @@
+"""Проверка выполнимости маршрутов route_feasibility"""
+
+from collections import namedtuple
+from datetime import timedelta
+
+import numpy as np
+import pytest
+
+from geo import AirportIndex
+from route_feasibility import COLUMNS, Airplanes, route_feasibility
+
+Route = namedtuple("Route", "route_no departure_airport arrival_airport airplane_code duration")
+
+# Москва (SVO) - Санкт-Петербург (LED): около 600 км
+AIRPORTS = AirportIndex(np.array(["SVO", "LED"]), np.array([37.4146, 30.2625]), np.array([55.9726, 59.8003]))
+AIRPLANES = Airplanes(np.array(["320", "CR2"]), np.array([5_700.0, 300.0]), np.array([830.0, 800.0]))
+
+
+def _problems(routes):
+    return {(row[0], row[COLUMNS.index("problem")]) for row in route_feasibility(AIRPORTS, AIRPLANES, routes)}
+
+
+def test_feasible_route_has_no_violations():
+    assert _problems([Route("PG0001", "SVO", "LED", "320", timedelta(hours=1, minutes=20))]) == set()
+
+
+def test_range_and_duration_violations():
+    routes = [
+        Route("PG0002", "SVO", "LED", "CR2", timedelta(hours=1, minutes=20)),
+        Route("PG0003", "SVO", "LED", "320", timedelta(minutes=20)),
+        Route("PG0004", "LED", "SVO", "320", timedelta(hours=5)),
+    ]
+    assert _problems(routes) == {("PG0002", "out_of_range"), ("PG0003", "too_fast"), ("PG0004", "too_slow")}
+
+
+def test_unknown_codes_are_reported_and_other_routes_checked():
+    routes = [
+        Route("PG0005", "SVO", "XXX", "320", timedelta(hours=1)),
+        Route("PG0006", "SVO", "LED", "ZZZ", timedelta(hours=1)),
+        Route("PG0007", "SVO", "LED", "CR2", timedelta(hours=1, minutes=20)),
+    ]
+
+    violations = route_feasibility(AIRPORTS, AIRPLANES, routes)
+
+    assert {(row[0], row[4]) for row in violations} == {
+        ("PG0005", "unknown_airport"), ("PG0006", "unknown_airplane"), ("PG0007", "out_of_range"),
+    }
+    unknown = next(row for row in violations if row[0] == "PG0006")
+    assert unknown[5:] == (None, None, 1.0, None)
+
+
+def test_airplanes_lookup():
+    position, known = AIRPLANES.lookup(["CR2", "ZZZ", "320"])
+    assert known.tolist() == [True, False, True]
+    assert AIRPLANES.codes[position[known]].tolist() == ["CR2", "320"]
+    with pytest.raises(KeyError):
+        AIRPLANES.positions(["ZZZ"])
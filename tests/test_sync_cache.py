@@ -0,0 +1,117 @@
+"""Кэш sync_cache: водяной знак, границы порций, повтор прерванного запуска и чтение частей"""
+
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from sqlalchemy import insert
+
+import sync_cache
+from db_fixtures import database_available
+from models import Bookings, Tickets
+from sync_cache import SCHEMAS, SyncCache, _arrow_array
+
+requires_database = pytest.mark.skipif(not database_available(), reason="PostgreSQL недоступен")
+
+BOOK_DATE = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def _write_part(cache, name, part, rows):
+    schema = SCHEMAS[name]
+    arrays = [_arrow_array(list(values), field.type) for field, values in zip(schema, zip(*rows))]
+    path = cache.part_path(name, part)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pq.write_table(pa.table(arrays, schema=schema), path)
+
+
+def test_load_segments_unifies_part_dictionaries(tmp_path):
+    cache = SyncCache(tmp_path)
+    _write_part(cache, "segments", 0, [
+        ("T1", 1, "Economy", Decimal("100.00")),
+        ("T2", 1, "Business", Decimal("250.50")),
+    ])
+    _write_part(cache, "segments", 1, [
+        ("T3", 2, "Comfort", Decimal("150.00")),
+        ("T4", 2, "Economy", Decimal("99.99")),
+    ])
+    # Часть незавершённого запуска водяным знаком не учтена
+    _write_part(cache, "segments", 2, [("T5", 3, "Business", Decimal("1.00"))])
+    cache.state["parts"] = 2
+
+    segments = cache.load_segments()
+
+    assert segments["flight_id"].tolist() == [1, 1, 2, 2]
+    assert segments.decode("fare_conditions").tolist() == ["Economy", "Business", "Comfort", "Economy"]
+    assert segments["price_cents"].tolist() == [10_000, 25_050, 15_000, 9_999]
+
+
+def test_empty_cache(tmp_path):
+    cache = SyncCache(tmp_path)
+    assert cache.watermark is None
+    assert cache.read_table("bookings").num_rows == 0
+    assert len(cache.load_segments()) == 0
+
+
+@pytest.fixture
+def bookings(db_engine):
+    """Пять бронирований с одинаковой датой и по билету на каждое"""
+    book_refs = [f"T0000{i}" for i in range(5)]
+    with db_engine.begin() as connection:
+        connection.execute(insert(Bookings.__table__), [
+            {"book_ref": book_ref, "book_date": BOOK_DATE, "total_amount": Decimal("100.00")}
+            for book_ref in book_refs
+        ])
+        connection.execute(insert(Tickets.__table__), [
+            {"ticket_no": f"T00000000000{i}", "book_ref": book_ref, "passenger_id": str(i),
+             "passenger_name": f"PASSENGER {i}", "outbound": True}
+            for i, book_ref in enumerate(book_refs)
+        ])
+    return book_refs
+
+
+def _book_refs(cache, name):
+    return cache.read_table(name, ["book_ref"])["book_ref"].to_pylist()
+
+
+@requires_database
+def test_chunks_split_equal_book_dates(tmp_path, db_engine, bookings):
+    cache = SyncCache(tmp_path)
+
+    added = cache.sync(db_engine, chunk_size=2)
+
+    # Порции 2 + 2 + 1 делятся по book_ref внутри одной book_date
+    assert added == {"bookings": 5, "tickets": 5, "segments": 0}
+    assert cache.state["parts"] == 3
+    assert [pq.read_table(path).num_rows for path in cache.parts("bookings")] == [2, 2, 1]
+    assert sorted(_book_refs(cache, "bookings")) == bookings
+    assert sorted(_book_refs(cache, "tickets")) == bookings
+    assert cache.watermark == (BOOK_DATE, bookings[-1])
+
+    # Новых бронирований нет - повторный запуск ничего не дописывает
+    assert cache.sync(db_engine, chunk_size=2) == {"bookings": 0, "tickets": 0, "segments": 0}
+    assert cache.state["parts"] == 3
+
+
+@requires_database
+def test_interrupted_run_rewrites_same_part(tmp_path, db_engine, bookings, monkeypatch):
+    def interrupted(self):
+        raise KeyboardInterrupt
+
+    with monkeypatch.context() as patch:
+        patch.setattr(SyncCache, "_save_state", interrupted)
+        with pytest.raises(KeyboardInterrupt):
+            SyncCache(tmp_path).sync(db_engine, chunk_size=3)
+    # Файлы первой порции записаны, но водяной знак не сдвинут
+    assert SyncCache(tmp_path).part_path("bookings", 0).exists()
+    assert not (tmp_path / sync_cache.STATE_FILE).exists()
+
+    cache = SyncCache(tmp_path)
+    added = cache.sync(db_engine, chunk_size=3)
+
+    assert added["bookings"] == 5
+    assert cache.state["parts"] == 2
+    assert cache.state["rows"] == {"bookings": 5, "tickets": 5, "segments": 0}
+    assert sorted(_book_refs(cache, "bookings")) == bookings
+    assert sorted(_book_refs(cache, "tickets")) == bookings
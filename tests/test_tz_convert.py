@@ -0,0 +1,57 @@
+"""Перевод времени tz_convert против построчного astimezone, включая переходы на летнее время"""
+
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from tz_convert import get_zone, to_local_by_airport, utc_offsets, utc_to_local
+
+
+def _astimezone(timestamps, zone_name):
+    zone = get_zone(zone_name)
+    return np.array([
+        np.datetime64(moment.astype(datetime).replace(tzinfo=timezone.utc).astimezone(zone).replace(tzinfo=None))
+        for moment in timestamps.astype("datetime64[us]")
+    ]).astype(timestamps.dtype)
+
+
+def _around_transitions(year=2026):
+    # Каждые 7 минут в течение двух суток вокруг обоих переходов в Европе и США
+    moments = []
+    for day in ("03-07", "03-28", "10-24", "10-31", "11-01"):
+        start = np.datetime64(f"{year}-{day}T00:00", "s")
+        moments.append(start + np.arange(0, 2 * 86_400, 7 * 60).astype("timedelta64[s]"))
+    return np.concatenate(moments)
+
+
+@pytest.mark.parametrize("zone_name", ["Europe/Berlin", "America/New_York", "Europe/Moscow", "Asia/Kolkata", "UTC"])
+def test_utc_to_local_matches_astimezone(zone_name):
+    timestamps = _around_transitions()
+    np.testing.assert_array_equal(utc_to_local(timestamps, zone_name), _astimezone(timestamps, zone_name))
+
+
+def test_utc_offsets_on_transition_day():
+    # 2026-03-29 01:00 UTC - переход Европы на летнее время
+    seconds = np.array(["2026-03-29T00:59:59", "2026-03-29T01:00:00", "2026-03-30T12:00:00"],
+                       dtype="datetime64[s]").astype(np.int64)
+    assert utc_offsets(seconds, "Europe/Berlin").tolist() == [3_600, 7_200, 7_200]
+
+
+def test_nat_and_unit_are_kept():
+    timestamps = np.array(["2026-07-01T12:00:00.250", "NaT"], dtype="datetime64[ms]")
+    local = utc_to_local(timestamps, "Europe/Berlin")
+    assert local.dtype == timestamps.dtype
+    assert str(local[0]) == "2026-07-01T14:00:00.250" and np.isnat(local[1])
+
+
+def test_to_local_by_airport_keeps_positions():
+    timestamps = np.array(["2026-01-15T12:00", "2026-07-15T12:00", "2026-01-15T12:00", "2026-07-15T12:00"],
+                          dtype="datetime64[s]")
+    codes = np.array([b"SVO", b"JFK", b"JFK", b"LED"])
+    zones = {b"SVO": "Europe/Moscow", b"LED": "Europe/Moscow", b"JFK": "America/New_York"}
+
+    local = to_local_by_airport(timestamps, codes, zones)
+
+    assert local.astype(str).tolist() == [
+        "2026-01-15T15:00:00", "2026-07-15T08:00:00", "2026-01-15T07:00:00", "2026-07-15T15:00:00"]
@@ -0,0 +1,256 @@
+"""
+Запросы по временным окнам для бронирований и рейсов
+
+Все фильтры строятся как полуоткрытые диапазоны `start <= колонка < end`
+по самой колонке, без функций над ней (date(), extract() и т.п.). Такие
+условия «sargable»: PostgreSQL использует по ним индексы и отсекает лишние
+секции секционированной таблицы (partition pruning), поэтому дневной отчёт
+читает данные только за один день.
+"""
+
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import CHAR, Column, DateTime, MetaData, Numeric, Table, and_, func, select, text
+from sqlalchemy.dialects.postgresql import insert
+
+from database import Session, engine, explain_plan, plan_nodes
+from models import Bookings, Flights, Tickets
+
+# Секционированная по месяцам копия bookings.bookings.
+# Первичный ключ секционированной таблицы обязан включать ключ секционирования,
+# поэтому он составной (book_ref, book_date) и на неё нельзя сослаться внешним
+# ключом из tickets - исходная таблица bookings остаётся на месте.
+PARTITIONED_SCHEMA = "bookings"
+PARTITIONED_TABLE = "bookings_part"
+
+partition_metadata = MetaData()
+
+t_bookings_part = Table(
+    PARTITIONED_TABLE, partition_metadata,
+    Column('book_ref', CHAR(6), nullable=False, comment='Booking number'),
+    Column('book_date', DateTime(True), nullable=False, comment='Booking date'),
+    Column('total_amount', Numeric(10, 2), nullable=False, comment='Total booking amount'),
+    schema=PARTITIONED_SCHEMA,
+    comment='Bookings partitioned by month of book_date'
+)
+
+
+@dataclass(frozen=True)
+class TimeWindow:
+    """Полуоткрытый интервал времени [start, end) с обязательной временной зоной"""
+
+    start: datetime
+    end: datetime
+
+    def __post_init__(self):
+        if self.start.tzinfo is None or self.end.tzinfo is None:
+            raise ValueError("Границы окна должны содержать временную зону (timestamptz)")
+        if self.start >= self.end:
+            raise ValueError(f"Начало окна {self.start} должно быть раньше конца {self.end}")
+
+    @classmethod
+    def day(cls, day, tz="UTC"):
+        """Окно за календарные сутки в заданной временной зоне"""
+        zone = ZoneInfo(tz)
+        start = datetime(day.year, day.month, day.day, tzinfo=zone)
+        following = day + timedelta(days=1)
+        end = datetime(following.year, following.month, following.day, tzinfo=zone)
+        return cls(start, end)
+
+    @classmethod
+    def month(cls, year, month, tz="UTC"):
+        """Окно за календарный месяц в заданной временной зоне"""
+        zone = ZoneInfo(tz)
+        next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return cls(datetime(year, month, 1, tzinfo=zone), datetime(next_year, next_month, 1, tzinfo=zone))
+
+    @classmethod
+    def last(cls, delta, now=None):
+        """Окно длиной delta, заканчивающееся в момент now (по умолчанию - сейчас)"""
+        end = now or datetime.now(timezone.utc)
+        return cls(end - delta, end)
+
+    def months(self):
+        """Разбивает окно на месячные окна (UTC), покрывающие его целиком"""
+        start = self.start.astimezone(timezone.utc)
+        end = self.end.astimezone(timezone.utc)
+        year, month = start.year, start.month
+        windows = []
+        while True:
+            window = TimeWindow.month(year, month)
+            if window.start >= end:
+                break
+            windows.append(window)
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return windows
+
+
+def in_window(column, window):
+    """Sargable-условие `window.start <= column < window.end`"""
+    return and_(column >= window.start, column < window.end)
+
+
+def bookings_in(window, partitioned=False):
+    """Бронирования, оформленные в заданном окне"""
+    if partitioned:
+        return select(t_bookings_part).where(in_window(t_bookings_part.c.book_date, window))
+    return select(Bookings).where(in_window(Bookings.book_date, window))
+
+
+def tickets_in(window):
+    """Билеты бронирований, оформленных в заданном окне"""
+    return (
+        select(Tickets)
+        .join(Bookings, Bookings.book_ref == Tickets.book_ref)
+        .where(in_window(Bookings.book_date, window))
+    )
+
+
+def flights_departing_in(window):
+    """Рейсы с плановым вылетом в заданном окне"""
+    return select(Flights).where(in_window(Flights.scheduled_departure, window))
+
+
+def daily_bookings_summary(window, partitioned=False):
+    """Количество и сумма бронирований в окне - основа дневного отчёта"""
+    table = t_bookings_part if partitioned else Bookings.__table__
+    return (
+        select(func.count().label("bookings"), func.coalesce(func.sum(table.c.total_amount), 0).label("amount"))
+        .where(in_window(table.c.book_date, window))
+    )
+
+
+def partition_name(year, month):
+    """Имя месячной секции, например bookings_part_y2025m01"""
+    return f"{PARTITIONED_TABLE}_y{year}m{month:02d}"
+
+
+def create_partitioned_table_ddl():
+    """DDL родительской секционированной таблицы"""
+    return (
+        f"CREATE TABLE IF NOT EXISTS {PARTITIONED_SCHEMA}.{PARTITIONED_TABLE} ("
+        "book_ref char(6) NOT NULL, "
+        "book_date timestamptz NOT NULL, "
+        "total_amount numeric(10,2) NOT NULL, "
+        "PRIMARY KEY (book_ref, book_date)"
+        ") PARTITION BY RANGE (book_date)"
+    )
+
+
+def monthly_partition_ddl(window):
+    """DDL месячной секции для окна, полученного из TimeWindow.month()"""
+    start = window.start.astimezone(timezone.utc)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {PARTITIONED_SCHEMA}.{partition_name(start.year, start.month)} "
+        f"PARTITION OF {PARTITIONED_SCHEMA}.{PARTITIONED_TABLE} "
+        f"FOR VALUES FROM ('{window.start.isoformat()}') TO ('{window.end.isoformat()}')"
+    )
+
+
+def ensure_monthly_partitions(window, bind=engine):
+    """
+    Создаёт секционированную таблицу и месячные секции, покрывающие окно
+
+    Args:
+        window (TimeWindow): Период, для которого нужны секции
+        bind: Движок SQLAlchemy
+
+    Returns:
+        list: Имена секций, покрывающих окно
+    """
+    months = window.months()
+    with bind.begin() as connection:
+        connection.execute(text(create_partitioned_table_ddl()))
+        for month in months:
+            connection.execute(text(monthly_partition_ddl(month)))
+    return [partition_name(m.start.year, m.start.month) for m in months]
+
+
+def copy_bookings_to_partitions(window, bind=engine):
+    """
+    Переносит бронирования за окно в секционированную таблицу, по месяцу за транзакцию
+
+    Returns:
+        int: Количество скопированных строк
+    """
+    ensure_monthly_partitions(window, bind)
+    source = Bookings.__table__
+    copied = 0
+    for month in window.months():
+        # Пересечение месяца с исходным окном, чтобы не выйти за его границы
+        part = TimeWindow(max(month.start, window.start), min(month.end, window.end))
+        # ON CONFLICT DO NOTHING позволяет безопасно перезапускать перенос
+        stmt = (
+            insert(t_bookings_part)
+            .from_select(["book_ref", "book_date", "total_amount"],
+                         select(source.c.book_ref, source.c.book_date, source.c.total_amount)
+                         .where(in_window(source.c.book_date, part)))
+            .on_conflict_do_nothing()
+        )
+        with bind.begin() as connection:
+            copied += connection.execute(stmt).rowcount
+    return copied
+
+
+def scanned_relations(plan):
+    """Имена таблиц/секций, которые читает план EXPLAIN"""
+    return {node["Relation Name"] for node in plan_nodes(plan) if "Relation Name" in node}
+
+
+def existing_partitions(connection):
+    """Имена секций, которые сейчас присоединены к секционированной таблице"""
+    return set(connection.execute(
+        text("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+             "WHERE i.inhparent = CAST(:parent AS regclass)"),
+        {"parent": f"{PARTITIONED_SCHEMA}.{PARTITIONED_TABLE}"},
+    ).scalars())
+
+
+def verify_partition_pruning(window, bind=engine):
+    """
+    Проверяет через EXPLAIN, что запрос по окну читает только нужные секции
+
+    Пустой план (секций окна нет или имена в плане не совпали с секциями)
+    ничего не подтверждает и считается несработавшим отсечением.
+
+    Returns:
+        tuple: (bool - отсечение сработало, множество прочитанных секций, множество ожидаемых)
+    """
+    expected = {partition_name(m.start.year, m.start.month) for m in window.months()}
+    with bind.connect() as connection:
+        existing = existing_partitions(connection)
+        plan = explain_plan(connection, daily_bookings_summary(window, partitioned=True))
+    scanned = scanned_relations(plan)
+    return bool(scanned) and scanned <= expected & existing, scanned, expected
+
+
+def main():
+    """Дневной отчёт по бронированиям за вчерашний день (UTC)"""
+    window = TimeWindow.day(date.today() - timedelta(days=1))
+    print(f"Окно отчёта: {window.start.isoformat()} - {window.end.isoformat()}")
+
+    with Session() as session:
+        try:
+            bookings, amount = session.execute(daily_bookings_summary(window)).one()
+            print(f"Бронирований: {bookings}, сумма: {amount}")
+
+            flights = session.execute(
+                select(func.count()).select_from(flights_departing_in(window).subquery())
+            ).scalar_one()
+            print(f"Рейсов с вылетом в окне: {flights}")
+        except Exception as e:
+            print(f"Ошибка при выполнении запроса: {e}")
+            return
+
+    try:
+        ok, scanned, expected = verify_partition_pruning(window)
+        print(f"Секции в плане: {', '.join(sorted(scanned)) or 'нет'}")
+        print(f"Отсечение секций {'работает' if ok else 'НЕ работает'} (ожидались: {', '.join(sorted(expected))})")
+    except Exception as e:
+        print(f"Секционированная таблица недоступна: {e}")
+
+
+if __name__ == "__main__":
+    main()
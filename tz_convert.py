@@ -0,0 +1,183 @@
+"""
+Векторный перевод времени UTC в местное время аэропортов
+
+Представление timetable вычисляет колонки *_local построчно по
+AirportsData.timezone. Здесь то же самое делается на стороне клиента для
+массивов NumPy: метки времени группируются по часовому поясу аэропорта, и
+каждая группа переводится целиком. Смещение пояса вычисляется через zoneinfo
+только для уникальных суток (обычно их тысячи на миллионы рейсов); поточечно
+считаются лишь сутки, в которые меняется смещение (переход на летнее время).
+"""
+
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from sqlalchemy import BigInteger, cast, extract, select
+
+from columnar import load_columns
+from database import engine
+from models import AirportsData, t_timetable
+
+SECONDS_PER_DAY = 86_400
+
+
+@lru_cache(maxsize=None)
+def get_zone(name):
+    """Кэшированный объект часового пояса"""
+    return ZoneInfo(name)
+
+
+def _offsets(zone, seconds):
+    """Смещения пояса (в секундах) для моментов времени - поточечно, для небольших массивов"""
+    return np.fromiter(
+        (datetime.fromtimestamp(s, tz=zone).utcoffset().total_seconds() for s in seconds.tolist()),
+        dtype=np.int64, count=len(seconds),
+    )
+
+
+def utc_offsets(seconds, zone_name):
+    """
+    Смещения часового пояса для массива моментов времени (секунды UTC)
+
+    Смещение считается на начало и конец каждых уникальных суток; если они
+    совпадают, оно действует весь день. Сутки с переходом пересчитываются
+    поточечно.
+    """
+    zone = get_zone(zone_name)
+    days, inverse = np.unique(seconds // SECONDS_PER_DAY, return_inverse=True)
+    at_start = _offsets(zone, days * SECONDS_PER_DAY)
+    at_end = _offsets(zone, (days + 1) * SECONDS_PER_DAY)
+
+    offsets = at_start[inverse]
+    transition_days = np.flatnonzero(at_start != at_end)
+    if transition_days.size:
+        exact = np.flatnonzero(np.isin(inverse, transition_days))
+        offsets[exact] = _offsets(zone, seconds[exact])
+    return offsets
+
+
+def utc_to_local(timestamps, zone_name):
+    """
+    Переводит массив datetime64 (UTC, без пояса) в местное время пояса
+
+    Returns:
+        np.ndarray: datetime64 той же единицы, местное время без пояса; NaT сохраняются
+    """
+    timestamps = np.asarray(timestamps)
+    result = timestamps.copy()
+    present = ~np.isnat(timestamps)
+    seconds = timestamps[present].astype("datetime64[s]").astype(np.int64)
+    offsets = utc_offsets(seconds, zone_name).astype("timedelta64[s]")
+    result[present] = timestamps[present] + offsets
+    return result
+
+
+def group_by_zone(airport_codes, airport_timezones):
+    """
+    Группирует позиции массива по часовому поясу аэропорта
+
+    Returns:
+        list: Пары (имя пояса, индексы элементов)
+    """
+    codes, code_index = np.unique(np.asarray(airport_codes), return_inverse=True)
+    zone_names, zone_of_code = np.unique(
+        np.array([airport_timezones[code] for code in codes], dtype=object), return_inverse=True)
+    zone_index = zone_of_code[code_index]
+
+    order = np.argsort(zone_index, kind="stable")
+    bounds = np.flatnonzero(np.diff(zone_index[order])) + 1
+    groups = np.split(order, bounds)
+    return [(zone_names[zone_index[group[0]]], group) for group in groups if len(group)]
+
+
+def to_local_by_airport(timestamps, airport_codes, airport_timezones):
+    """
+    Переводит метки UTC в местное время аэропортов
+
+    Args:
+        timestamps (np.ndarray): datetime64 в UTC без пояса
+        airport_codes: Код аэропорта для каждой метки
+        airport_timezones (dict): Код аэропорта -> имя часового пояса
+    """
+    timestamps = np.asarray(timestamps)
+    result = np.empty_like(timestamps)
+    for zone_name, positions in group_by_zone(airport_codes, airport_timezones):
+        result[positions] = utc_to_local(timestamps[positions], zone_name)
+    return result
+
+
+def load_airport_timezones(bind=engine):
+    """Часовые пояса аэропортов: код -> имя пояса"""
+    with bind.connect() as connection:
+        return dict(connection.execute(select(AirportsData.airport_code, AirportsData.timezone)).all())
+
+
+def load_timetable(bind=engine):
+    """Рейсы из timetable: аэропорты и плановые времена (секунды UTC)"""
+    columns = t_timetable.c
+    stmt = select(
+        columns.flight_id,
+        columns.departure_airport,
+        columns.arrival_airport,
+        cast(extract("epoch", columns.scheduled_departure), BigInteger),
+        cast(extract("epoch", columns.scheduled_arrival), BigInteger),
+    )
+    spec = [
+        ("flight_id", np.int32),
+        ("departure_airport", "S3"),
+        ("arrival_airport", "S3"),
+        ("scheduled_departure", np.int64),
+        ("scheduled_arrival", np.int64),
+    ]
+    timetable = load_columns(stmt, spec, bind)
+    for name in ("scheduled_departure", "scheduled_arrival"):
+        timetable.arrays[name] = timetable[name].astype("datetime64[s]")
+    return timetable
+
+
+def local_schedule(timetable, airport_timezones):
+    """Местные плановые времена вылета и прилёта, как scheduled_*_local в timetable"""
+    zones = {code.encode(): zone for code, zone in airport_timezones.items()}
+    return {
+        "scheduled_departure_local": to_local_by_airport(
+            timetable["scheduled_departure"], timetable["departure_airport"], zones),
+        "scheduled_arrival_local": to_local_by_airport(
+            timetable["scheduled_arrival"], timetable["arrival_airport"], zones),
+    }
+
+
+def main():
+    """Расчёт местного расписания на клиенте и сравнение с построчным astimezone"""
+    try:
+        airport_timezones = load_airport_timezones()
+        timetable = load_timetable()
+    except Exception as e:
+        print(f"Ошибка при выполнении запроса: {e}")
+        return
+
+    started = time.perf_counter()
+    local = local_schedule(timetable, airport_timezones)
+    vectorized = time.perf_counter() - started
+
+    sample = min(len(timetable), 100_000)
+    started = time.perf_counter()
+    for i in range(sample):
+        moment = timetable["scheduled_departure"][i].astype(datetime).replace(tzinfo=timezone.utc)
+        moment.astimezone(get_zone(airport_timezones[timetable["departure_airport"][i].decode()]))
+    per_row = (time.perf_counter() - started) * len(timetable) / max(sample, 1)
+
+    print(f"Рейсов: {len(timetable)}")
+    print(f"Векторный расчёт: {vectorized:.3f} с, построчный astimezone (оценка): {per_row:.3f} с")
+    print(f"\n{'Рейс':<10} {'Откуда':<7} {'Вылет (местное)':<22} {'Куда':<7} {'Прилёт (местное)':<22}")
+    print("-" * 72)
+    for i in range(min(len(timetable), 10)):
+        print(f"{timetable['flight_id'][i]:<10} {timetable['departure_airport'][i].decode():<7} "
+              f"{str(local['scheduled_departure_local'][i]):<22} {timetable['arrival_airport'][i].decode():<7} "
+              f"{str(local['scheduled_arrival_local'][i]):<22}")
+
+
+if __name__ == "__main__":
+    main()